@@ -0,0 +1,214 @@
+"""
+Offline fixtures for the benchmark suite.
+
+Everything is generated deterministically from files already in the repository (the
+data/resource_names*.json lists and the data/training CSVs), so the benchmarks run without
+network access and produce comparable numbers between commits.
+"""
+
+import os
+import sys
+import glob
+import gzip
+import json
+import random
+import tempfile
+from xml.sax.saxutils import escape
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+data_dir = os.path.join(repo_dir, "data")
+utils_dir = os.path.join(repo_dir, "bin", "utils")
+
+def ensure_gbcutils_importable():
+    """Make `gbcutils` importable in this interpreter, linking bin/utils if it is not installed."""
+    try:
+        import gbcutils  # noqa: F401
+    except ImportError:
+        link_dir = tempfile.mkdtemp(prefix="gbcutils_")
+        os.symlink(utils_dir, os.path.join(link_dir, "gbcutils"))
+        sys.path.insert(0, link_dir)
+
+def load_resource_names(paths=None):
+    """
+    Load the bundled resource lists into the {resource: [aliases]} shape written by
+    fetch_resource_list.py (the first name of each entry is used as the resource name).
+    """
+    paths = paths or [os.path.join(data_dir, "resource_names.json"), os.path.join(data_dir, "resource_names.extra.json")]
+    resource_names = {}
+    for path in paths:
+        for entry in json.load(open(path)):
+            names = entry["names"]
+            resource_names.setdefault(names[0], [])
+            resource_names[names[0]].extend(n for n in names if n not in resource_names[names[0]])
+    return resource_names
+
+def load_training_candidates(path=None, limit=None):
+    """Return (sentence, alias, resource) candidates from a labelled training CSV."""
+    import pandas as pd
+
+    path = path or os.path.join(data_dir, "training", "training_set_sentences.v3.csv")
+    df = pd.read_csv(path)
+    df = df.rename(columns={"matched_alias": "matched_term"})
+    df = df.dropna(subset=["paragraph_text", "matched_term", "resource_name"])
+    candidates = list(zip(df["paragraph_text"], df["matched_term"], df["resource_name"]))
+    return candidates[:limit] if limit else candidates
+
+def load_training_paragraphs():
+    """All distinct paragraph texts from the bundled training CSVs, in a stable order."""
+    import pandas as pd
+
+    paragraphs = set()
+    for path in glob.glob(os.path.join(data_dir, "training", "*.csv")):
+        df = pd.read_csv(path)
+        if "paragraph_text" in df.columns:
+            paragraphs.update(p for p in df["paragraph_text"].dropna() if p != "paragraph_text")
+    return sorted(paragraphs)
+
+def _article_xml(pmcid, paragraphs, rng, sections=3, paragraphs_per_section=4):
+    """A JATS-like <article> with one element per line, as in the Europe PMC OA bundles."""
+    def para():
+        return f"<p>{escape(rng.choice(paragraphs))}</p>"
+
+    lines = [
+        '<article article-type="research-article">',
+        "<front>",
+        "<article-meta>",
+        f'<article-id pub-id-type="pmcid">PMC{pmcid}</article-id>',
+        f"<title-group><article-title>Synthetic article {pmcid}</article-title></title-group>",
+        f"<abstract>{para()}</abstract>",
+        f"<funding-statement>Funded by grant {pmcid}.</funding-statement>",
+        "</article-meta>",
+        "</front>",
+        "<body>",
+    ]
+    for s in range(sections):
+        lines.append(f'<sec id="s{s}">')
+        lines.append(f"<title>Section {s + 1}</title>")
+        lines.extend(para() for _ in range(paragraphs_per_section))
+        lines.append("</sec>")
+    lines += [
+        '<table-wrap id="t1">',
+        "<caption><p>Resources used in this study</p></caption>",
+        "<table><thead><tr><th>Resource</th><th>Version</th></tr></thead>",
+        f"<tbody><tr><td>{escape(rng.choice(paragraphs)[:40])}</td><td>{pmcid % 10}</td></tr></tbody></table>",
+        "</table-wrap>",
+        "</body>",
+        "</article>",
+    ]
+    return "\n".join(lines) + "\n"
+
+def build_oa_bundle(outdir, n_articles=200, first_pmcid=9000001, seed=0):
+    """
+    Write a synthetic Europe PMC OA bundle (PMC<first>_PMC<last>.xml.gz) built from the training
+    paragraphs. Returns (bundle_path, [pmcids]).
+    """
+    rng = random.Random(seed)
+    paragraphs = load_training_paragraphs()
+    pmcids = list(range(first_pmcid, first_pmcid + n_articles))
+    bundle = os.path.join(outdir, f"PMC{pmcids[0]}_PMC{pmcids[-1]}.xml.gz")
+    with gzip.open(bundle, "wt", encoding="utf-8") as out:
+        out.write('<?xml version="1.0" encoding="UTF-8"?>\n<articles>\n')
+        for pmcid in pmcids:
+            out.write(_article_xml(pmcid, paragraphs, rng))
+        out.write("</articles>\n")
+    return bundle, [f"PMC{p}" for p in pmcids]
+
+_surnames = ["Smith", "García", "Müller", "Nakamura", "Øster", "Kowalski", "Dubois", "Zhang", "O'Neill", "Silva"]
+_forenames = ["Anna", "José", "Wei", "Chloé", "Jürgen", "Priya", "Olusegun", "Ingrid", "Mateus", "Saoirse"]
+
+def _core_record(pmcid, paragraphs, rng):
+    """One `core` search result shaped like Europe PMC's (nested author, journal, grant and MeSH lists)."""
+    authors = []
+    for _ in range(rng.randint(2, 12)):
+        first, last = rng.choice(_forenames), rng.choice(_surnames)
+        authors.append({
+            "fullName": f"{last} {first[0]}", "firstName": first, "lastName": last, "initials": first[0],
+            "authorId": {"type": "ORCID", "value": f"0000-000{rng.randint(1, 9)}-{rng.randint(1000, 9999)}-{rng.randint(1000, 9999)}"},
+            "authorAffiliationDetailsList": {"authorAffiliation": [
+                {"affiliation": f"Department of Bioinformatics, University of {rng.choice(_surnames)}, {rng.choice(['Cambridge, UK', 'São Paulo, Brazil', 'Zürich, Switzerland', 'Kyoto, Japan'])}."}
+            ]},
+        })
+    year = rng.randint(2005, 2024)
+    return {
+        "id": str(30000000 + pmcid), "source": "MED", "pmid": str(30000000 + pmcid), "pmcid": f"PMC{pmcid}",
+        "doi": f"10.1000/bench.{pmcid}", "title": f"Synthetic article {pmcid}: {rng.choice(paragraphs)[:80]}",
+        "authorString": ", ".join(a["fullName"] for a in authors) + ".",
+        "authorList": {"author": authors},
+        "journalInfo": {
+            "issue": str(rng.randint(1, 12)), "volume": str(rng.randint(1, 60)), "journalIssueId": rng.randint(1, 10**7),
+            "dateOfPublication": f"{year} Mar", "monthOfPublication": 3, "yearOfPublication": year,
+            "printPublicationDate": f"{year}-03-01",
+            "journal": {"title": "Nucleic Acids Research", "medlineAbbreviation": "Nucleic Acids Res", "isoabbreviation": "Nucleic Acids Res", "nlmid": "0411011", "issn": "0305-1048", "essn": "1362-4962"},
+        },
+        "pubYear": str(year), "pageInfo": f"{rng.randint(1, 900)}-{rng.randint(901, 999)}",
+        "abstractText": " ".join(rng.choice(paragraphs) for _ in range(2)),
+        "affiliation": authors[0]["authorAffiliationDetailsList"]["authorAffiliation"][0]["affiliation"],
+        "language": "eng", "pubModel": "Print-Electronic",
+        "pubTypeList": {"pubType": ["research-article", "Journal Article"]},
+        "grantsList": {"grant": [
+            {"grantId": f"BB/{rng.randint(100000, 999999)}/1", "agency": rng.choice(["Wellcome Trust", "BBSRC", "NIH HHS", "European Research Council"]), "orderIn": i}
+            for i in range(rng.randint(0, 4))
+        ]},
+        "keywordList": {"keyword": [rng.choice(["database", "bioinformatics", "genomics", "proteomics", "ontology", "biocuration"]) for _ in range(5)]},
+        "meshHeadingList": {"meshHeading": [
+            {"majorTopic_YN": rng.choice("YN"), "descriptorName": rng.choice(["Databases, Genetic", "Software", "Humans", "Computational Biology"]),
+             "meshQualifierList": {"meshQualifier": [{"abbreviation": "MT", "qualifierName": "methods", "majorTopic_YN": "N"}]}}
+            for _ in range(rng.randint(3, 10))
+        ]},
+        "fullTextUrlList": {"fullTextUrl": [
+            {"availability": "Open access", "availabilityCode": "OA", "documentStyle": style, "site": "Europe_PMC", "url": f"https://europepmc.org/articles/PMC{pmcid}{suffix}"}
+            for style, suffix in (("html", ""), ("pdf", "?pdf=render"))
+        ]},
+        "isOpenAccess": "Y", "inEPMC": "Y", "inPMC": "Y", "hasPDF": "Y", "hasBook": "N", "hasSuppl": "Y",
+        "citedByCount": rng.randint(0, 3000), "hasReferences": "Y", "hasTextMinedTerms": "Y",
+        "hasDbCrossReferences": "N", "hasLabsLinks": "Y", "license": "cc by", "hasTMAccessionNumbers": "Y",
+        "dateOfCreation": f"{year}-02-10", "firstIndexDate": f"{year}-02-11", "firstPublicationDate": f"{year}-02-20",
+    }
+
+def build_core_pages(n_pages=3, page_size=1000, first_pmcid=9000001, seed=0):
+    """Europe PMC search response bodies (UTF-8 JSON bytes) with `page_size` `core` results each."""
+    rng = random.Random(seed)
+    paragraphs = load_training_paragraphs()
+    pages = []
+    for p in range(n_pages):
+        first = first_pmcid + p * page_size
+        page = {
+            "version": "6.9", "hitCount": n_pages * page_size, "nextCursorMark": f"AoIIQ{first:x}Kw==",
+            "request": {"queryString": "(HAS_FT:Y) AND (\"UniProt\")", "resultType": "core", "cursorMark": "*", "pageSize": page_size, "sort": ""},
+            "resultList": {"result": [_core_record(pmcid, paragraphs, rng) for pmcid in range(first, first + page_size)]},
+        }
+        pages.append(json.dumps(page, ensure_ascii=False).encode("utf-8"))
+    return pages
+
+def build_prediction_counts(outdir, resource_names, n_files=50, seed=0):
+    """Write `n_files` prediction count files shaped like classify_resource_mentions.py output."""
+    from gbcutils import prediction_counts
+
+    rng = random.Random(seed)
+    pairs = [(r, a) for r, aliases in resource_names.items() for a in aliases]
+    paths = []
+    for i in range(n_files):
+        counts = {}
+        for r, a in rng.sample(pairs, k=min(len(pairs), 60)):
+            for p in (0, 1):
+                if rng.random() < 0.7:
+                    counts.setdefault((r, a, "scibert"), [0, 0])[p] += rng.randint(1, 50)
+        path = os.path.join(outdir, f"prediction_counts_{i:03d}.json.gz")
+        prediction_counts.dump(counts, path)
+        paths.append(path)
+    return paths
+
+def build_metadata_shards(outdir, n_ids=20000, first_pmcid=9000001, shards=128):
+    """Write sharded metadata JSONL.gz files in the layout produced by query_europepmc.py."""
+    from gbcutils.metadata import shard_key, shard_path
+
+    ids = [f"PMC{p}" for p in range(first_pmcid, first_pmcid + n_ids)]
+    by_shard = {}
+    for pmcid in ids:
+        by_shard.setdefault(shard_key(pmcid, shards), []).append(pmcid)
+    for k, shard_ids in by_shard.items():
+        with gzip.open(shard_path(k, basepath=outdir, shards=shards), "wt", encoding="utf-8") as out:
+            for pmcid in shard_ids:
+                meta = {"pmcid": pmcid, "title": f"Synthetic article {pmcid}", "pubYear": "2024", "journalTitle": "J Bench"}
+                out.write(json.dumps({"id": pmcid, "meta": meta}) + "\n")
+    return ids
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+
+"""
+Offline throughput benchmarks for the main pipeline stages.
+
+Runs without network access against fixtures built from the repository (see fixtures.py) :
+  - fulltext      : get_fulltext_body on a synthetic OA XML bundle (bundle indexing included)
+  - mentions      : get_resource_mentions over the resulting article texts (one AliasMatcher, as a classifier task)
+  - mentions_match_first : get_resource_mentions_match_first over the same texts
+  - article_pack  : packing those texts into a chunk's article pack and streaming them back
+  - classify      : classify_mentions on candidates from the training CSVs
+  - specificity   : resource_specificity_scores.py aggregation over synthetic prediction counts
+  - metadata_sorted / metadata_random : get_article_metadata shard lookups, in shard order and shuffled
+  - json_core_pages : decoding Europe PMC `core` search pages (1000 records each) from bytes
+  - json_metadata_encode : encoding those records into metadata shard lines, as query_europepmc.py does
+    (both json stages report the active gbcutils.json_codec backend, and the throughput of plain stdlib
+    json.loads / json.dumps, as used before gbcutils.json_codec, to compare)
+
+Each stage reports the median of --repeats runs as JSON. Stages that cannot run in the current
+environment (e.g. missing nltk data) are reported as skipped with the reason.
+
+With --baseline, results are compared against a previous JSON file and any stage whose throughput
+dropped by more than --tolerance is flagged; the exit status is 1 if there are regressions.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import runpy
+import shutil
+import argparse
+import tempfile
+import statistics
+
+import fixtures
+
+parser = argparse.ArgumentParser(description="Offline throughput benchmarks for the pipeline stages.")
+parser.add_argument("--stages", type=str, default=None, help="Comma-separated list of stages to run (default: all)")
+parser.add_argument("--repeats", type=int, default=3, help="Number of runs per stage (the median is reported)")
+parser.add_argument("--articles", type=int, default=200, help="Number of articles in the synthetic OA bundle")
+parser.add_argument("--candidates", type=int, default=64, help="Number of training candidates to classify")
+parser.add_argument("--model", type=str, default=os.path.join(fixtures.data_dir, "models", "scibert_resource_classifier.v3"), help="Model directory for the classify stage")
+parser.add_argument("--token_window", type=int, default=None, help="Token window passed to classify_mentions")
+parser.add_argument("--prediction_files", type=int, default=50, help="Number of prediction-count pickles to aggregate")
+parser.add_argument("--metadata_ids", type=int, default=20000, help="Number of ids in the synthetic metadata shards")
+parser.add_argument("--core_pages", type=int, default=3, help="Number of 1000-record Europe PMC `core` pages for the json stages")
+parser.add_argument("--out", type=str, default=None, help="Output JSON file (default: stdout)")
+parser.add_argument("--results", type=str, default=None, help="Compare an existing results JSON instead of running the benchmarks")
+parser.add_argument("--baseline", type=str, default=None, help="Baseline JSON to compare against")
+parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed fractional throughput drop before a stage is flagged")
+args = parser.parse_args()
+
+fixtures.ensure_gbcutils_importable()
+
+def _median_run(fn, items, unit, setup=None):
+    """Run `fn` --repeats times (after an optional per-run `setup`) and summarise the median."""
+    timings = []
+    for _ in range(args.repeats):
+        state = setup() if setup else None
+        start = time.perf_counter()
+        fn(state)
+        timings.append(time.perf_counter() - start)
+    seconds = statistics.median(timings)
+    return {"items": items, "unit": unit, "seconds": round(seconds, 4), "throughput": round(items / seconds, 2) if seconds else None}
+
+def bench_fulltext(ctx):
+    from gbcutils import europepmc
+
+    bundle_dir = tempfile.mkdtemp(prefix="bench_bundle_", dir=ctx["tmp"])
+    _, pmcids = fixtures.build_oa_bundle(bundle_dir, n_articles=args.articles)
+    texts = {}
+
+    def setup():
+        europepmc.pmc_file_index_by_path.clear()
+        europepmc._bundle_indices.clear()
+        return tempfile.mkdtemp(prefix="bench_xml_", dir=ctx["tmp"])
+
+    def run(dest):
+        for pmcid in pmcids:
+            text_blocks, table_blocks = europepmc.get_fulltext_body(pmcid, path=bundle_dir, dest=dest)
+            if text_blocks is None:
+                raise RuntimeError(f"{pmcid} not found in the synthetic bundle")
+            texts[pmcid] = "\n\n".join(text_blocks) + "\n" + "\n\n".join(table_blocks) + "\n"
+        shutil.rmtree(dest)
+
+    result = _median_run(run, len(pmcids), "articles/s", setup=setup)
+    ctx["texts"] = texts
+    return result
+
+def _article_texts(ctx):
+    if "texts" not in ctx:
+        bench_fulltext(ctx)
+    return list(ctx["texts"].values())
+
+def _check_sentence_tokenizer():
+    from gbcutils.scibert_classify import sent_tokenize
+    sent_tokenize("Sentence tokenizer check. Second sentence.")
+
+def bench_mentions(ctx):
+    from gbcutils.scibert_classify import get_resource_mentions, AliasMatcher
+
+    _check_sentence_tokenizer()
+    texts = _article_texts(ctx)
+    resource_names = list(fixtures.load_resource_names().values())
+    matcher = AliasMatcher.build(resource_names)
+    return _median_run(lambda _: [get_resource_mentions(t, resource_names, matcher=matcher) for t in texts], len(texts), "articles/s")
+
+def bench_mentions_match_first(ctx):
+    from gbcutils.scibert_classify import get_resource_mentions_match_first, AliasMatcher
+
+    _check_sentence_tokenizer()
+    texts = _article_texts(ctx)
+    resource_names = list(fixtures.load_resource_names().values())
+    matcher = AliasMatcher.build(resource_names)
+    return _median_run(lambda _: [get_resource_mentions_match_first(t, resource_names, matcher=matcher) for t in texts], len(texts), "articles/s")
+
+def bench_article_pack(ctx):
+    from gbcutils import article_pack
+
+    _article_texts(ctx)
+    texts = list(ctx["texts"].items())
+
+    def setup():
+        return tempfile.mkdtemp(prefix="bench_pack_", dir=ctx["tmp"])
+
+    def run(outdir):
+        with article_pack.ArticlePackWriter(outdir) as pack:
+            for article_id, text in texts:
+                pack.add(article_id, text)
+        if sum(1 for _ in article_pack.iter_articles(pack.path)) != len(texts):
+            raise RuntimeError("article pack lost articles")
+        shutil.rmtree(outdir)
+
+    return _median_run(run, len(texts), "articles/s", setup=setup)
+
+def bench_classify(ctx):
+    from gbcutils.scibert_classify import load_model, classify_mentions
+
+    candidates = fixtures.load_training_candidates(limit=args.candidates)
+    weights = "trained"
+    try:
+        (tokenizer, model, device) = load_model(args.model)
+    except Exception:
+        # weights not fetched (e.g. git-lfs pointers) : throughput only depends on the architecture
+        import torch
+        from transformers import AutoConfig, AutoTokenizer, AutoModelForSequenceClassification
+        tokenizer = AutoTokenizer.from_pretrained(args.model)
+        model = AutoModelForSequenceClassification.from_config(AutoConfig.from_pretrained(args.model))
+        model.eval()
+        device = torch.device("cpu")
+        weights = "random"
+
+    result = _median_run(
+        lambda _: classify_mentions("bench", candidates, tokenizer=tokenizer, model=model, device=device, window=args.token_window),
+        len(candidates), "candidates/s",
+    )
+    result["weights"] = weights
+    return result
+
+def bench_specificity(ctx):
+    script = os.path.join(fixtures.repo_dir, "bin", "resource_specificity_scores.py")
+    counts_dir = tempfile.mkdtemp(prefix="bench_counts_", dir=ctx["tmp"])
+    pickles = fixtures.build_prediction_counts(counts_dir, fixtures.load_resource_names(), n_files=args.prediction_files)
+
+    def run(_):
+        argv, cwd = sys.argv, os.getcwd()
+        sys.argv = [script] + pickles
+        os.chdir(counts_dir)
+        try:
+            runpy.run_path(script, run_name="__main__")
+        finally:
+            sys.argv = argv
+            os.chdir(cwd)
+
+    return _median_run(run, len(pickles), "files/s")
+
+def _metadata_ids(ctx):
+    if "metadata" not in ctx:
+        shard_dir = tempfile.mkdtemp(prefix="bench_meta_", dir=ctx["tmp"])
+        ctx["metadata"] = (shard_dir, fixtures.build_metadata_shards(shard_dir, n_ids=args.metadata_ids))
+    return ctx["metadata"]
+
+def _bench_metadata(ctx, order):
+    from gbcutils import metadata
+
+    shard_dir, ids = _metadata_ids(ctx)
+    sample = random.Random(0).sample(ids, k=min(len(ids), 2000))
+    lookup_ids = metadata.sort_ids_by_shard(sample) if order == "sorted" else sample
+
+    def setup():
+        metadata._shard_cache = {}
+
+    def run(_):
+        for pmcid in lookup_ids:
+            if metadata.get_article_metadata(pmcid, basepath=shard_dir) is None:
+                raise RuntimeError(f"{pmcid} missing from the synthetic shards")
+
+    return _median_run(run, len(lookup_ids), "lookups/s", setup=setup)
+
+def _core_pages(ctx):
+    if "core_pages" not in ctx:
+        ctx["core_pages"] = fixtures.build_core_pages(n_pages=args.core_pages)
+    return ctx["core_pages"]
+
+def _with_stdlib(bench):
+    """Run `bench(loads, dumpb)` with gbcutils.json_codec, and with plain stdlib json for comparison."""
+    from gbcutils import json_codec
+
+    result = bench(json_codec.loads, json_codec.dumpb)
+    result["backend"] = json_codec.backend
+    result["stdlib_throughput"] = bench(json.loads, lambda obj: json.dumps(obj, ensure_ascii=False).encode("utf-8"))["throughput"]
+    return result
+
+def bench_json_core_pages(ctx):
+    pages = _core_pages(ctx)
+    records = sum(len(json.loads(page)["resultList"]["result"]) for page in pages)
+    return _with_stdlib(lambda loads, dumpb: _median_run(lambda _: [loads(page) for page in pages], records, "records/s"))
+
+def bench_json_metadata_encode(ctx):
+    records = [
+        {"id": r["pmcid"], "pmcid": r["pmcid"], "pmid": r.get("pmid"), "title": r.get("title"),
+         "firstPublicationDate": r["journalInfo"].get("printPublicationDate") or r.get("firstPublicationDate"),
+         "authorString": r.get("authorString", ""), "authorList": r.get("authorList", {}), "citedByCount": r.get("citedByCount", 0),
+         "grantsList": r.get("grantsList", {}), "keywordList": r.get("keywordList", {}), "meshHeadingList": r.get("meshHeadingList", {})}
+        for page in _core_pages(ctx) for r in json.loads(page)["resultList"]["result"]
+    ]
+    return _with_stdlib(lambda loads, dumpb: _median_run(lambda _: [dumpb(r) + b"\n" for r in records], len(records), "records/s"))
+
+stages = {
+    "fulltext": bench_fulltext,
+    "mentions": bench_mentions,
+    "mentions_match_first": bench_mentions_match_first,
+    "article_pack": bench_article_pack,
+    "classify": bench_classify,
+    "specificity": bench_specificity,
+    "metadata_sorted": lambda ctx: _bench_metadata(ctx, "sorted"),
+    "metadata_random": lambda ctx: _bench_metadata(ctx, "random"),
+    "json_core_pages": bench_json_core_pages,
+    "json_metadata_encode": bench_json_metadata_encode,
+}
+
+def run_benchmarks(selected):
+    results = {"python": sys.version.split()[0], "repeats": args.repeats, "stages": {}}
+    ctx = {"tmp": tempfile.mkdtemp(prefix="gbc_bench_")}
+    try:
+        for name in selected:
+            try:
+                results["stages"][name] = stages[name](ctx)
+            except Exception as e:
+                reason = next((l.strip() for l in str(e).splitlines() if any(c.isalnum() for c in l)), "")
+                results["stages"][name] = {"skipped": f"{type(e).__name__}: {reason}"}
+            print(f"⏱️ {name}: {results['stages'][name]}", file=sys.stderr)
+    finally:
+        shutil.rmtree(ctx["tmp"], ignore_errors=True)
+    return results
+
+def compare(results, baseline, tolerance):
+    """Return a {stage: {...}} comparison and the list of stages that regressed beyond `tolerance`."""
+    comparison, regressions = {}, []
+    for name, current in results["stages"].items():
+        previous = baseline.get("stages", {}).get(name)
+        if not previous or not current.get("throughput") or not previous.get("throughput"):
+            continue
+        ratio = current["throughput"] / previous["throughput"]
+        regressed = ratio < 1 - tolerance
+        comparison[name] = {"baseline": previous["throughput"], "current": current["throughput"], "ratio": round(ratio, 3), "regression": regressed}
+        if regressed:
+            regressions.append(name)
+    return comparison, regressions
+
+if args.results:
+    results = json.load(open(args.results))
+else:
+    selected = [s.strip() for s in args.stages.split(",")] if args.stages else list(stages)
+    unknown = [s for s in selected if s not in stages]
+    if unknown:
+        parser.error(f"unknown stage(s): {', '.join(unknown)} (choose from {', '.join(stages)})")
+    results = run_benchmarks(selected)
+
+regressions = []
+if args.baseline:
+    results["comparison"], regressions = compare(results, json.load(open(args.baseline)), args.tolerance)
+    for name, c in results["comparison"].items():
+        flag = "❌ REGRESSION" if c["regression"] else "✅"
+        print(f"{flag} {name}: {c['baseline']} → {c['current']} ({c['ratio']:.2f}x)", file=sys.stderr)
+
+if args.out:
+    json.dump(results, open(args.out, "w"), indent=2)
+else:
+    print(json.dumps(results, indent=2))
+
+sys.exit(1 if regressions else 0)
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark start-up time of the pipeline entry points and gbcutils modules.
+
+Each bin/*.py script is run with --help in a fresh interpreter, and each gbcutils module is imported
+in a fresh interpreter :
+  - cold : first run against an empty bytecode cache (a new PYTHONPYCACHEPREFIX)
+  - warm : median of --repeats further runs reusing that cache
+OS file caches are not dropped, so "cold" measures interpreter-level cold start only.
+
+Results are written as JSON so they can be compared between commits.
+"""
+
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+bin_dir = os.path.join(repo_dir, "bin")
+utils_dir = os.path.join(bin_dir, "utils")
+
+parser = argparse.ArgumentParser(description="Benchmark start-up time of pipeline entry points.")
+parser.add_argument("--repeats", type=int, default=5, help="Number of warm runs per script/module")
+parser.add_argument("--out", type=str, default=None, help="Output JSON file (default: stdout)")
+args = parser.parse_args()
+
+def _gbcutils_env(pycache_dir):
+    """Environment with `gbcutils` importable (linking bin/utils if it is not installed)."""
+    env = dict(os.environ, PYTHONPYCACHEPREFIX=pycache_dir)
+    probe = subprocess.run([sys.executable, "-c", "import gbcutils"], env=env, capture_output=True)
+    if probe.returncode != 0:
+        link_dir = tempfile.mkdtemp(prefix="gbcutils_")
+        os.symlink(utils_dir, os.path.join(link_dir, "gbcutils"))
+        env["PYTHONPATH"] = os.pathsep.join([link_dir] + [p for p in [env.get("PYTHONPATH")] if p])
+    return env
+
+def _time_run(cmd, env):
+    start = time.perf_counter()
+    result = subprocess.run(cmd, env=env, capture_output=True)
+    return time.perf_counter() - start, result.returncode
+
+def _benchmark(cmd):
+    env = _gbcutils_env(tempfile.mkdtemp(prefix="pycache_"))
+    cold, returncode = _time_run(cmd, env)
+    warm = [_time_run(cmd, env)[0] for _ in range(args.repeats)]
+    return {"cold_s": round(cold, 4), "warm_s": round(statistics.median(warm), 4), "returncode": returncode}
+
+results = {"python": sys.version.split()[0], "repeats": args.repeats, "scripts": {}, "modules": {}}
+for script in sorted(glob.glob(os.path.join(bin_dir, "*.py"))):
+    name = os.path.basename(script)
+    results["scripts"][name] = _benchmark([sys.executable, script, "--help"])
+    print(f"⏱️ {name}: {results['scripts'][name]}", file=sys.stderr)
+
+for module in sorted(glob.glob(os.path.join(utils_dir, "*.py"))):
+    name = "gbcutils." + os.path.basename(module)[:-3]
+    if name.endswith("__init__"):
+        continue
+    results["modules"][name] = _benchmark([sys.executable, "-c", f"import {name}"])
+    print(f"⏱️ {name}: {results['modules'][name]}", file=sys.stderr)
+
+if args.out:
+    json.dump(results, open(args.out, "w"), indent=2)
+else:
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+
+"""
+Merge the per-task JSON metrics files of a run (every chunk of every stage) into a single file :
+counters are summed, histograms are merged bucket by bucket, and rates are recomputed from the
+merged totals. A per-task summary (one entry per metrics file) is kept alongside.
+"""
+
+import json
+import argparse
+
+from gbcutils import metrics
+
+parser = argparse.ArgumentParser(description="Merge per-task metrics JSON files.")
+parser.add_argument("metrics_files", nargs="+", help="Metrics JSON files written by the pipeline tasks")
+parser.add_argument("--out", type=str, default="run_metrics.json", help="Output JSON file")
+parser.add_argument("--verbose", action="store_true", help="Print a summary of the merged metrics")
+args = parser.parse_args()
+
+snapshots = [json.load(open(f)) for f in args.metrics_files]
+merged = metrics.merge(snapshots)
+
+# also merge per task type, so e.g. all classify chunks can be compared with all preprocess chunks
+by_task = {}
+for snap in snapshots:
+    task = (snap.get("tasks") or [{}])[0].get("task") or "unknown"
+    by_task.setdefault(task, []).append(snap)
+merged["by_task"] = {task: metrics.merge(snaps) for task, snaps in sorted(by_task.items())}
+for task_metrics in merged["by_task"].values():
+    task_metrics["tasks"] = len(task_metrics["tasks"])
+
+json.dump(merged, open(args.out, "w"), indent=2)
+
+if args.verbose:
+    print(f"📊 Merged {len(snapshots)} metrics files into {args.out}")
+    for name, value in sorted(merged["rates"].items()):
+        print(f"\t‣ {name}: {value}")
+    for name, h in sorted(merged["histograms"].items()):
+        mean = h["sum"] / h["count"] if h["count"] else 0
+        print(f"\t‣ {name}: n={h['count']} mean={mean:.4g} min={h['min']} max={h['max']}")
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+
+"""
+Bulk load the per-chunk load files written by `write_mentions_to_db.py --bulk` into the database :
+every file is staged into temporary tables over a single connection, then publications and resource
+mentions are applied with set-based upserts and committed once.
+
+Use --db-url to load into a local stand-in instead of the GBC database (e.g. sqlite:///gbc.db,
+with --create-tables to create the target tables).
+
+The load stops before staging anything if the target tables do not have the columns and unique keys
+of gbcutils.bulk_load.target_tables. Publications are written as a reduced record : no affiliations
+or grants (see gbcutils.bulk_load).
+"""
+
+import os
+import json
+import time
+import argparse
+
+from gbcutils import bulk_load, metrics, profiling
+
+parser = argparse.ArgumentParser(description="Bulk load staged mention load files into the database.")
+parser.add_argument("load_files", nargs="+", help="Load files written by write_mentions_to_db.py --bulk")
+parser.add_argument("--db-credentials", help="Path to DB credentials JSON (for the GBC database)")
+parser.add_argument("--db-url", help="Load into this database instead : sqlite:///path.db, or a SQLAlchemy MySQL URL")
+parser.add_argument("--create-tables", action="store_true", help="Create the target tables if missing (for a local stand-in database)")
+parser.add_argument("--batch-size", type=int, default=5000, help="Rows sent per staging INSERT")
+parser.add_argument("--test", action="store_true", help="Use test database instead of production")
+parser.add_argument("--debug", action="store_true", help="Enable debug output")
+parser.add_argument("--profile", action="store_true", help="Sample the run and write a collapsed-stack flamegraph (.profile.folded) and hotspot summary (.profile.txt) next to the metrics file")
+parser.add_argument("--metrics-out", default="bulk_load_mentions.metrics.json", help="JSON file to write task metrics to")
+args = parser.parse_args()
+
+if args.profile:
+    profiling.start(profiling.prefix_for(args.metrics_out))
+
+bulk_load.VERBOSE = args.debug
+
+db_creds = {}
+if not args.db_url:
+    db_creds = json.load(open(args.db_credentials)) if args.db_credentials else None
+    if not db_creds:
+        raise ValueError("DB credentials are required for writing to the database.")
+
+conn, dialect, close = bulk_load.connect(db_url=args.db_url, test=args.test, sqluser=db_creds.get('user'), sqlpass=db_creds.get('pass'))
+metrics.define_rate("bulk.mentions_per_s", "bulk.mentions_staged", "bulk.load_s")
+try:
+    start = time.perf_counter()
+    loader = bulk_load.BulkLoader(conn, dialect, batch_size=args.batch_size)
+    if args.create_tables:
+        loader.create_target_tables()
+    loader.check_schema()
+    loader.create_staging_tables()
+
+    for path in args.load_files:
+        loader.stage(bulk_load.read_load_file(path))
+        print(f"[INFO] Staged {os.path.basename(path)}") if args.debug else None
+    print(f"[INFO] Staged {loader.staged['publication']} publications and {loader.staged['resource_mention']} mentions from {len(args.load_files)} files")
+
+    affected = loader.upsert()
+    loader.commit()
+    metrics.observe("bulk.load_s", time.perf_counter() - start)
+    for table, n in affected.items():
+        metrics.incr(f"bulk.{table}_rows_affected", n)
+    print(f"[INFO] Committed bulk load : {affected}")
+except Exception:
+    conn.rollback()
+    raise
+finally:
+    close()
+    metrics.dump(args.metrics_out, task="bulk_load_mentions")
@@ -11,10 +11,6 @@ import os
 import json
 import argparse
 
-import sqlalchemy as db
-from nltk.tokenize import sent_tokenize
-import pandas as pd
-
 from gbcutils.europepmc import query_europepmc, get_fulltext_body
 from gbcutils.scibert_classify import get_resource_mentions, classify_mentions, load_model
 
@@ -27,6 +23,11 @@ parser.add_argument("-aliases", type=str, help="JSON file containing any additio
 parser.add_argument("-outdir", type=str, help="Output directory for results", required=True)
 args = parser.parse_args()
 
+# imported after argument parsing to keep --help fast
+import sqlalchemy as db
+from nltk.tokenize import sent_tokenize
+import pandas as pd
+
 pmid = args.pmid
 pmcid = args.pmcid
 json_file = args.json
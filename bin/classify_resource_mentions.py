@@ -1,94 +1,175 @@
 #!/usr/bin/env python3
 
 """
-Given a text file or directory of text files containing publication text, identify resource mentions,
-classify them using a SciBERT model, and save the results to output files.
+Given a text file, a directory of text files or an article pack (see gbcutils.article_pack) containing
+publication text, identify resource mentions, classify them using a SciBERT model, and save the results
+to output files.
 """
 
 import os
 import json
 import argparse
 import glob
+from collections import Counter
 
-import pandas as pd
-from gbcutils.scibert_classify import get_resource_mentions, classify_mentions, load_model
+from gbcutils.scibert_classify import get_resource_mentions, get_resource_mentions_match_first, mentions_to_pairs
+from gbcutils.scibert_classify import classify_mentions, classify_mentions_cascade, load_model, load_cascade_model
+from gbcutils.scibert_classify import load_bypass_rules, route_bypass, load_matcher, summarise_predictions, summary_columns, routing_summary_columns
+from gbcutils.inference_server import inference_server_available, RemoteClassifier, default_socket_path
 import gbcutils.scibert_classify as utils
+import gbcutils.inference_server as inference_server
+from gbcutils import metrics, prediction_counts, article_pack, profiling
 
 parser = argparse.ArgumentParser(description="Classify resource mentions in a publication.")
 parser.add_argument("--txt", type=str, default=None, help="Text file containing publication text")
-parser.add_argument("--indir", type=str, default=None, help="Input directory containing text files (optional)")
+parser.add_argument("--indir", type=str, default=None, help="Input directory containing an article pack or text files (optional)")
+parser.add_argument("--pack", type=str, default=None, help="Article pack (articles.jsonl.gz) written by fetch_and_preprocess_article.py")
 
 parser.add_argument("--model", type=str, default="../data/models/scibert_resource_classifier.v2", required=True, help="Path to the SciBERT model")
 parser.add_argument("--resources", type=str, required=True, help="JSON file containing resources names and aliases")
 parser.add_argument("--case_sensitive_resources", type=str, default="", help="Comma-separated list of resources to search case-sensitively")
+parser.add_argument("--matcher", type=str, default=None, help="Alias matcher saved by fetch_resource_list.py --matcher_out (rebuilt if stale or missing)")
 parser.add_argument("--mentions_out", type=str, default="resource_mentions_summary.csv", help="Output file for resource mentions")
-parser.add_argument("--counts_out", type=str, default="prediction_counts.pkl", help="Output file for prediction counts")
+parser.add_argument("--counts_out", type=str, default="prediction_counts.json.gz", help="Output file for prediction counts, by routing (mergeable, see merge_prediction_counts.py)")
+parser.add_argument("--match_first", action="store_true", help="Search for aliases before sentence splitting (only sentence-split around matches)")
+parser.add_argument("--token_window", type=int, default=None, help="Limit model inputs to a window of this many tokens centred on the matched alias (e.g. 128 or 256)")
+parser.add_argument("--cascade_model", type=str, default=None, help="Cascade classifier (from train_cascade_classifier.py) to decide high-confidence candidates before SciBERT")
+parser.add_argument("--cascade_low", type=float, default=0.05, help="Cascade: accept as negative when the positive probability is at or below this")
+parser.add_argument("--cascade_high", type=float, default=0.95, help="Cascade: accept as positive when the positive probability is at or above this")
+parser.add_argument("--unambiguous_resources", type=str, default=None, help="Resource list with 'ambiguous' flags (e.g. data/resource_names.json) - mentions of unambiguous resources skip the model")
+parser.add_argument("--specificity_scores", type=str, default=None, help="resource_specificity_scores.csv from a previous run - high-specificity aliases skip the model (pass it to resource_specificity_scores.py --previous_scores too)")
+parser.add_argument("--specificity_cutoff", type=float, default=0.99, help="Minimum specificity for an alias to skip the model")
+parser.add_argument("--specificity_min_count", type=int, default=20, help="Minimum number of classified mentions behind an alias' specificity score")
+parser.add_argument("--bypass_confidence", type=float, default=1.0, help="Confidence assigned to mentions that skip the model")
+parser.add_argument("--inference_socket", type=str, default=default_socket_path, help="Unix socket of a local inference server (scibert_inference_server.py), used if present")
+parser.add_argument("--profile", action="store_true", help="Sample the run and write a collapsed-stack flamegraph (.profile.folded) and hotspot summary (.profile.txt) next to the metrics file")
+parser.add_argument("--metrics_out", type=str, default=None, help="JSON file to write task metrics to (default: next to --mentions_out, as <name>.classify.metrics.json)")
 parser.add_argument("--verbose", action="store_true", help="Enable verbose output")
 args = parser.parse_args()
 
+metrics_path = args.metrics_out or os.path.splitext(args.mentions_out)[0] + ".classify.metrics.json"
+if args.profile:
+    profiling.start(profiling.prefix_for(metrics_path))
+
+import pandas as pd # imported after argument parsing to keep --help fast
+
 model_path = args.model
 resource_aliases_path = args.resources
 
 VERBOSE = args.verbose
 utils.VERBOSE = VERBOSE
+inference_server.VERBOSE = VERBOSE
+metrics.VERBOSE = VERBOSE
 
 case_sensitive_resources = [x.strip() for x in args.case_sensitive_resources.split(',') if x.strip()]
 
-if not args.txt and not args.indir:
-    raise ValueError("You must provide either a text file (--txt) or an input directory (--indir).")
-filelist = glob.glob(os.path.join(args.indir, "*.txt")) if args.indir else [args.txt]
+if not args.txt and not args.indir and not args.pack:
+    raise ValueError("You must provide either a text file (--txt), an article pack (--pack) or an input directory (--indir).")
+pack_path = args.pack or (article_pack.find_pack(args.indir) if args.indir else None)
+filelist = [] if pack_path else (glob.glob(os.path.join(args.indir, "*.txt")) if args.indir else [args.txt])
+
+def articles():
+    """Yield (id, text) : streamed from the article pack if there is one, else read file by file."""
+    if pack_path:
+        print(f"📦 Streaming articles from {pack_path}") if args.verbose else None
+        yield from article_pack.iter_articles(pack_path)
+        return
+    for txt_file in filelist:
+        yield os.path.basename(txt_file).replace('.txt', ''), open(txt_file, 'r').read()
 
 
 # 📋 Load resource list
 resource_names = json.load(open(resource_aliases_path))
 resource_names = resource_names.values()
 print(f"\t📥 Loaded {len(resource_names)} resources") if args.verbose else None
-
-# 📦 Load Model
-print("📦 Loading SciBERT resource classifier model") if args.verbose else None
-(tokenizer, model, device) = load_model(model_path)
+matcher = load_matcher(args.matcher, list(resource_names), case_sensitive_resources)
+
+# 📦 Load Model (unless a local inference server is already serving it)
+if inference_server_available(args.inference_socket, model_path=model_path):
+    print(f"📦 Using inference server on {args.inference_socket}") if args.verbose else None
+    (tokenizer, model, device) = (None, None, None)
+    classify_fn = RemoteClassifier(model_path, socket_path=args.inference_socket) # falls back to in-process if the server goes away
+else:
+    print("📦 Loading SciBERT resource classifier model") if args.verbose else None
+    (tokenizer, model, device) = load_model(model_path)
+    classify_fn = classify_mentions
+cascade = load_cascade_model(args.cascade_model) if args.cascade_model else None
+routing = Counter()
+bypass_rules = None
+if args.unambiguous_resources or args.specificity_scores:
+    bypass_rules = load_bypass_rules(
+        resources_json=args.unambiguous_resources, specificity_csv=args.specificity_scores,
+        specificity_cutoff=args.specificity_cutoff, min_count=args.specificity_min_count
+    )
 
 # 🧠 Run Predictions
 print("🧠 Running predictions") if args.verbose else None
-class_df = pd.DataFrame(columns=['prediction', 'id', 'resource_name', 'matched_alias', 'sentence', 'confidence'])
-for txt_file in filelist:
-    text_body = open(txt_file, 'r').read()
-    mentions = get_resource_mentions(text_body, resource_names, case_sensitive_resources=case_sensitive_resources)
-    print(f"\t‣ 🔍 Found {len(mentions)} mentions of {len(set([x[2] for x in mentions]))} resources in {txt_file}.") if args.verbose else None
+class_df = pd.DataFrame(columns=['prediction', 'id', 'resource_name', 'matched_alias', 'sentence', 'confidence', 'routing'])
+metrics.define_rate("extract.articles_per_s", "extract.articles", "extract.article_s")
+metrics.define_rate("extract.sentences_per_s", "extract.sentences", "extract.article_s")
+metrics.define_rate("classify.candidates_per_s", "classify.inputs", "classify.article_s")
+metrics.define_rate("classify.model_candidates_per_s", "classify.candidates", "classify.forward_s")
+n_articles = 0
+for this_id, text_body in articles():
+    n_articles += 1
+    with metrics.timer("extract.article_s"):
+        if args.match_first:
+            sentences, mention_records = get_resource_mentions_match_first(text_body, resource_names, case_sensitive_resources=case_sensitive_resources, matcher=matcher)
+            mentions = mentions_to_pairs(sentences, mention_records)
+            spans = [(m.start, m.end) for m in mention_records]
+        else:
+            mentions = get_resource_mentions(text_body, resource_names, case_sensitive_resources=case_sensitive_resources, matcher=matcher)
+            spans = None
+    metrics.incr("extract.articles")
+    metrics.incr("extract.mentions", len(mentions))
+    print(f"\t‣ 🔍 Found {len(mentions)} mentions of {len(set([x[2] for x in mentions]))} resources in {this_id}.") if args.verbose else None
     if not mentions:
-        print(f"\t‣ ❌ No resource mentions found in {txt_file}. Skipping classification.") if args.verbose else None
+        print(f"\t‣ ❌ No resource mentions found in {this_id}. Skipping classification.") if args.verbose else None
         continue
 
     # @title 🧠 Classify resource mentions
-    this_id = os.path.basename(txt_file).replace('.txt', '')
-    classified_mentions = classify_mentions(this_id, mentions, tokenizer=tokenizer, model=model, device=device)
-    this_class_df = pd.DataFrame(classified_mentions)
+    bypassed_mentions = []
+    if bypass_rules:
+        bypassed_mentions, mentions, spans = route_bypass(this_id, mentions, bypass_rules, confidence=args.bypass_confidence, spans=spans, routing=routing)
+
+    metrics.incr("classify.inputs", len(mentions))
+    if not mentions:
+        classified_mentions = []
+    elif cascade:
+        with metrics.timer("classify.article_s"):
+            classified_mentions = classify_mentions_cascade(
+                this_id, mentions, cascade, tokenizer=tokenizer, model=model, device=device,
+                low=args.cascade_low, high=args.cascade_high, window=args.token_window, spans=spans, routing=routing,
+                classify_fn=classify_fn
+            )
+    else:
+        with metrics.timer("classify.article_s"):
+            classified_mentions = classify_fn(this_id, mentions, tokenizer=tokenizer, model=model, device=device, window=args.token_window, spans=spans)
+    if not cascade:
+        routing["scibert"] += len(classified_mentions)
+    this_class_df = pd.DataFrame(bypassed_mentions + classified_mentions)
     this_class_df.sort_values(by=['prediction', 'confidence'], ascending=[False, False], inplace=True)
     class_df = pd.concat([class_df, this_class_df], ignore_index=True)
 
 
 """## 🏁 Publication Classification Final Result"""
+if cascade or bypass_rules:
+    total_routed = sum(routing.values()) or 1
+    print("🪜 Routing: " + ", ".join(f"{stage} {routing[stage]} ({routing[stage] / total_routed:.1%})" for stage in ["bypass", "cascade_positive", "cascade_negative", "scibert"]))
 if args.verbose:
-    print(f"🏁 Publication Classification Final Result for {len(filelist)} files")
+    print(f"🏁 Publication Classification Final Result for {n_articles} articles")
     print(f"\t‣ Found {len(class_df)} classified mentions across {len(set(class_df['id']))} publications.")
 
-summary_df = (
-    class_df[(class_df['prediction'] == 1) & (class_df['confidence'] >= 0.9)]
-    .groupby(['id', 'resource_name', 'matched_alias'], as_index=False)
-    .agg({
-        'confidence': 'mean',
-        'prediction': 'count',
-        'sentence': lambda x: " || ".join(list(set(x)))  # unique sentences
-    })
-)
-summary_df.rename(columns={'confidence': 'mean_confidence', 'sentence':'token_matches', 'prediction': 'match_count'}, inplace=True)
+summary_df = summarise_predictions(class_df)
 
 # write files
-summary_df[['id', 'resource_name', 'matched_alias', 'match_count', 'mean_confidence']].to_csv(f"{args.mentions_out}", index=False)
-
-specificity_df = (
-    class_df
-    .groupby(['resource_name', 'matched_alias', 'prediction'], as_index=False)
-    .agg(count=('prediction', 'count'))
-)
-specificity_df.to_pickle(f"{args.counts_out}")
\ No newline at end of file
+summary_df[routing_summary_columns if (cascade or bypass_rules) else summary_columns].to_csv(f"{args.mentions_out}", index=False)
+
+# counted by routing : only the model's own predictions decide which aliases may bypass it next time
+counts = prediction_counts.count_predictions(zip(class_df['resource_name'], class_df['matched_alias'], class_df['prediction'], class_df['routing']))
+prediction_counts.dump(counts, args.counts_out)
+
+for stage, count in routing.items():
+    metrics.incr(f"routing.{stage}", count)
+metrics.incr("classify.mentions_out", len(summary_df))
+metrics.dump(metrics_path, task="classify_resource_mentions")
\ No newline at end of file
@@ -3,13 +3,22 @@
 """
 Fetch full text articles from Europe PMC by PMC ID(s), preprocess, and save as text files.
 Preprocessing extracts text and tables from XML, cleans tags, and formats output.
-Each article is saved as a single cleaned text file.
+The cleaned articles are packed into one compressed container in --outdir (see gbcutils.article_pack),
+or saved as one text file per article with --output_format txt.
+
+Fetching runs ahead of parsing : a few threads download and index the next distinct OA bundles,
+and a small pool streams upcoming articles out of them (or fetches them from the fullTextXML API),
+while the main thread parses the articles already fetched.
 """
 
 import os
+import time
 import argparse
-from gbcutils.europepmc import get_fulltext_body
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from gbcutils.europepmc import fetch_fulltext_xml, parse_fulltext_xml, article_text, enable_response_cache, enable_rate_limit
 import gbcutils.europepmc as epmc
+from gbcutils import metrics, article_pack, profiling
 
 VERBOSE = False
 
@@ -17,12 +26,44 @@ parser = argparse.ArgumentParser(description="Fetch and preprocess articles.")
 parser.add_argument('--pmcid', help='PMC ID of the article')
 parser.add_argument('--idlist', help='Path to file containing list of PMC IDs')
 parser.add_argument('--outdir', help='Directory to write output files', default='pmc_preprocessed')
+parser.add_argument('--output_format', choices=['pack', 'txt'], help='pack: one indexed articles.jsonl.gz per chunk ; txt: one <pmcid>.txt per article', default='pack')
 parser.add_argument('--local_xml_dir', help='Directory containing local XML files', default=None)
+parser.add_argument('--prefetch_workers', type=int, help='Number of threads fetching upcoming articles while earlier ones are parsed (0: fetch and parse in turn)', default=4)
+parser.add_argument('--prefetch_depth', type=int, help='Maximum number of articles fetched ahead of the parser (default: 2 x --prefetch_workers)', default=None)
+parser.add_argument('--prefetch_bundles', type=int, help='Number of upcoming OA bundles to download ahead, each on its own thread', default=2)
+parser.add_argument('--http_cache', help='Directory for an on-disk cache of Europe PMC API responses', default=None)
+parser.add_argument('--http_cache_ttl', type=float, help='Refetch cached responses older than this many hours (default: never expire)', default=None)
+parser.add_argument('--http_cache_max_mb', type=float, help='Evict least recently used responses once the cache exceeds this size', default=None)
+parser.add_argument('--http_cache_replay', action='store_true', help='Only replay responses from --http_cache (local bundles are still used) : never query Europe PMC')
+parser.add_argument('--rate_limit_dir', help='Directory holding Europe PMC rate limit state shared by concurrent tasks (default: no shared limit)', default=None)
+parser.add_argument('--api_rate', type=float, help='With --rate_limit_dir : maximum Europe PMC API requests per second, across all tasks', default=10)
+parser.add_argument('--ftp_rate', type=float, help='With --rate_limit_dir : maximum Europe PMC FTP requests per second, across all tasks', default=2)
+parser.add_argument('--profile', action='store_true', help='Sample the run and write a collapsed-stack flamegraph (.profile.folded) and hotspot summary (.profile.txt) next to the metrics file')
+parser.add_argument('--metrics_out', help='JSON file to write task metrics to (default: <outdir>.preprocess.metrics.json)', default=None)
 parser.add_argument('--verbose', action='store_true', help='Enable verbose output')
 args = parser.parse_args()
 
+metrics_path = args.metrics_out or f"{args.outdir.rstrip('/')}.preprocess.metrics.json"
+if args.profile:
+    profiling.start(profiling.prefix_for(metrics_path))
+
 VERBOSE = args.verbose
 epmc.VERBOSE = VERBOSE
+metrics.VERBOSE = VERBOSE
+article_pack.VERBOSE = VERBOSE
+
+if args.http_cache:
+    enable_response_cache(
+        args.http_cache,
+        ttl=args.http_cache_ttl * 3600 if args.http_cache_ttl is not None else None,
+        max_bytes=int(args.http_cache_max_mb * 1024 * 1024) if args.http_cache_max_mb else None,
+        replay_only=args.http_cache_replay,
+    )
+elif args.http_cache_replay:
+    parser.error("--http_cache_replay requires --http_cache")
+
+if args.rate_limit_dir:
+    enable_rate_limit(args.rate_limit_dir, api_rate=args.api_rate, ftp_rate=args.ftp_rate)
 
 if not os.path.exists(args.outdir):
     os.makedirs(args.outdir)
@@ -38,18 +79,114 @@ elif args.idlist:
 else:
     raise ValueError("You must provide either a PMC ID (--pmcid) or a file containing a list of PMC IDs (--idlist).")
 
-for pmcid in ids:
+def _fetch(pmcid):
+    with metrics.timer("preprocess.fetch_s"):
+        return fetch_fulltext_xml(pmcid, dest=local_xml_dir)
+
+def fetched_articles(ids):
+    """
+    Yield (pmcid, xml) in input order. With --prefetch_workers, up to --prefetch_depth articles are
+    fetched ahead on a thread pool; the time spent blocked on a fetch that is not ready yet is I/O wait.
+    """
+    if args.prefetch_workers <= 0:
+        for pmcid in ids:
+            with metrics.timer("preprocess.io_wait_s"):
+                xml = _fetch(pmcid)
+            yield pmcid, xml
+        return
+
+    # consecutive articles mostly share a bundle : download the next few distinct bundles in the
+    # background, so that article fetches only have to extract from them. Bundle names are resolved
+    # as the prefetch reaches each article, not all up front.
+    bundles = [] # bundle name of ids[k], for the ids resolved so far
+    bundle_order, bundle_position, bundle_first_id = [], {}, {}
+
+    def resolve_next():
+        pmcid = ids[len(bundles)]
+        b = epmc.bundle_name(pmcid, dest=local_xml_dir)
+        bundles.append(b)
+        if b and b not in bundle_position:
+            bundle_position[b] = len(bundle_order)
+            bundle_order.append(b)
+            bundle_first_id[b] = pmcid
+
+    depth = args.prefetch_depth or 2 * args.prefetch_workers
+    with ThreadPoolExecutor(max_workers=args.prefetch_workers) as pool, \
+         ThreadPoolExecutor(max_workers=max(1, args.prefetch_bundles)) as bundle_pool:
+        bundle_futures = []
+        bundles_checked = 0
+        current_bundle = 0
+
+        def check_bundles(wait=False):
+            # raise bundle download errors as soon as they happen (at the latest, once all articles are fetched)
+            nonlocal bundles_checked
+            while bundles_checked < len(bundle_futures) and (wait or bundle_futures[bundles_checked].done()):
+                bundle_futures[bundles_checked].result()
+                bundles_checked += 1
+
+        def submit(i):
+            nonlocal current_bundle
+            while len(bundles) <= i:
+                resolve_next()
+            current_bundle = bundle_position.get(bundles[i], current_bundle)
+            wanted = current_bundle + 1 + args.prefetch_bundles
+            while len(bundle_order) < wanted and len(bundles) < len(ids):
+                resolve_next()
+            while len(bundle_futures) < min(len(bundle_order), wanted):
+                b = bundle_order[len(bundle_futures)]
+                bundle_futures.append(bundle_pool.submit(epmc.prefetch_bundle, bundle_first_id[b], dest=local_xml_dir))
+            check_bundles()
+            return ids[i], pool.submit(_fetch, ids[i])
+
+        pending = deque(submit(i) for i in range(min(depth, len(ids))))
+        next_i = len(pending)
+        while pending:
+            pmcid, future = pending.popleft()
+            with metrics.timer("preprocess.io_wait_s"):
+                xml = future.result()
+            if next_i < len(ids):
+                pending.append(submit(next_i))
+                next_i += 1
+            yield pmcid, xml
+        check_bundles(wait=True)
+
+metrics.define_rate("preprocess.articles_per_s", "preprocess.articles", "preprocess.total_s")
+metrics.define_rate("preprocess.blocks_per_s", "preprocess.text_blocks", "preprocess.total_s")
+pack = article_pack.ArticlePackWriter(args.outdir) if args.output_format == 'pack' else None
+start = time.perf_counter()
+for pmcid, xml in fetched_articles(ids):
     if VERBOSE:
         print(f"\n-- Processing {pmcid} --")
-    this_outfile = open(f"{args.outdir}/{pmcid}.txt", 'w')
-    text_blocks, table_blocks = get_fulltext_body(pmcid, dest=local_xml_dir) # fetch and parse the full text body
-    if text_blocks:
-        this_outfile.write("\n\n".join(text_blocks) + "\n")
-    if table_blocks:
-        this_outfile.write("\n\n".join(table_blocks) + "\n")
-
-    this_outfile.close()
-
-    # sometimes we get no data, so we remove empty files
-    if os.path.getsize(this_outfile.name) == 0:
-        os.remove(this_outfile.name)
+    with metrics.timer("preprocess.parse_s"):
+        text_blocks, table_blocks = parse_fulltext_xml(xml) # parse the full text body
+
+    text = article_text(text_blocks, table_blocks)
+
+    metrics.incr("preprocess.articles")
+    metrics.incr("preprocess.text_blocks", len(text_blocks or []))
+    metrics.incr("preprocess.table_blocks", len(table_blocks or []))
+
+    # sometimes we get no data, so we skip empty articles
+    if not text:
+        metrics.incr("preprocess.articles_empty")
+        continue
+
+    with metrics.timer("preprocess.write_s"):
+        if pack:
+            metrics.incr("preprocess.bytes_packed", pack.add(pmcid, text))
+        else:
+            with open(f"{args.outdir}/{pmcid}.txt", 'w') as this_outfile:
+                this_outfile.write(text)
+    metrics.incr("preprocess.bytes_written", len(text.encode("utf-8")))
+
+if pack:
+    pack.close()
+
+total_s = time.perf_counter() - start
+metrics.observe("preprocess.total_s", total_s)
+snapshot = metrics.snapshot()["histograms"]
+io_wait_s = snapshot.get("preprocess.io_wait_s", {}).get("sum", 0)
+parse_s = snapshot.get("preprocess.parse_s", {}).get("sum", 0)
+print(f"⏱️ {len(ids)} articles in {total_s:.1f}s : {io_wait_s:.1f}s waiting on I/O, {parse_s:.1f}s parsing ({args.prefetch_workers} prefetch workers)") if VERBOSE else None
+
+metrics.dump(metrics_path, task="fetch_and_preprocess_article")
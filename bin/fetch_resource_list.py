@@ -5,20 +5,25 @@ Fetch resource list from the database and save to a JSON file.
 Optionally include additional aliases for resources from a provided JSON file.
 
 This will be used to load resource names and aliases for mention detection and classification.
+With --matcher_out, the alias matcher built from the list is saved too, so classifier tasks can load it
+instead of building it again (see gbcutils.scibert_classify.load_matcher).
 """
 
 import json
 import argparse
-import sqlalchemy as db
-from gbcutils.db import get_gbc_connection
 
 parser = argparse.ArgumentParser(description="Fetch resource list from the database.")
 parser.add_argument('--out', type=str, required=True, help='Output file for results')
 parser.add_argument("--aliases", type=str, help="JSON file containing any additional aliases for resources (optional)")
 parser.add_argument("--test", action="store_true", help="Use test database instead of production")
 parser.add_argument("--limit", type=int, help="Limit the number of resources fetched")
+parser.add_argument("--matcher_out", type=str, help="Also save the alias matcher for the resource list to this file (optional)")
+parser.add_argument("--case_sensitive_resources", type=str, default="", help="Comma-separated list of resources to search case-sensitively (as passed to the classifier)")
 args = parser.parse_args()
 
+import sqlalchemy as db # imported after argument parsing to keep --help fast
+from gbcutils.gbc_db import get_gbc_connection
+
 gcp_connector, db_engine, db_conn = get_gbc_connection(test=args.test, readonly=True)
 
 
@@ -49,4 +54,11 @@ for r in result:
 
 
 json.dump(resource_names, open(args.out, 'w'), indent=2)
-print(f"📥 Saved {len(resource_names)} resources to {args.out}")
\ No newline at end of file
+print(f"📥 Saved {len(resource_names)} resources to {args.out}")
+
+if args.matcher_out:
+    from gbcutils.scibert_classify import AliasMatcher
+    case_sensitive_resources = [x.strip() for x in args.case_sensitive_resources.split(',') if x.strip()]
+    matcher = AliasMatcher.build(list(resource_names.values()), case_sensitive_resources)
+    matcher.dump(args.matcher_out)
+    print(f"📥 Saved alias matcher ({len(matcher.entries)} aliases) to {args.matcher_out}")
\ No newline at end of file
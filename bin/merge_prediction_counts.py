@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+
+"""
+Merge prediction count files (written by classify_resource_mentions.py, or by an earlier merge) into
+a single count file. Merges can be nested, so counts from many chunks are reduced as a tree, and the
+output is itself a valid input to resource_specificity_scores.py or another merge.
+"""
+
+import argparse
+
+from gbcutils import prediction_counts
+
+parser = argparse.ArgumentParser(description="Merge prediction count files.")
+parser.add_argument("counts_files", nargs="+", help="Prediction count files (.json.gz, or legacy .pkl DataFrames)")
+parser.add_argument("--out", type=str, required=True, help="Output count file (.json.gz)")
+parser.add_argument("--verbose", action="store_true", help="Enable verbose output")
+args = parser.parse_args()
+
+prediction_counts.VERBOSE = args.verbose
+
+counts, chunks = prediction_counts.merge_files(args.counts_files)
+prediction_counts.dump(counts, args.out, chunks=chunks)
+
+print(f"🧮 Merged {len(args.counts_files)} files ({chunks} chunks, {len(counts)} aliases) into {args.out}") if args.verbose else None
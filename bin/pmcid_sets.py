@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+
+"""
+Combine PMC ID sets (pmc_ids.pmcset written by query_europepmc.py, or text files with one PMC ID per line) :
+  count      number of IDs in each set
+  union      IDs in any of the sets
+  intersect  IDs in all of the sets
+  diff       IDs in the first set but none of the others (e.g. "which IDs are new since last month")
+  bundles    number of IDs of the (first) set in each OA bundle, from --bundle_dir or the Europe PMC FTP listing
+
+union / intersect / diff write the result to --out : a .pmcset file, or a text list for any other name
+(stdout if --out is not given).
+"""
+
+import sys
+import argparse
+
+from gbcutils.pmcid_set import PMCIDSet
+import gbcutils.pmcid_set as pmcid_set
+
+parser = argparse.ArgumentParser(description="Combine and inspect PMC ID sets.")
+parser.add_argument("command", choices=["count", "union", "intersect", "diff", "bundles"], help="Operation on the sets")
+parser.add_argument("sets", nargs="+", help="PMC ID sets (.pmcset) or lists (one ID per line)")
+parser.add_argument("--out", type=str, default=None, help="Output file : .pmcset, or a text list (default: print IDs)")
+parser.add_argument("--bundle_dir", type=str, default=None, help="bundles: directory of local OA bundles (default: the Europe PMC FTP listing)")
+parser.add_argument("--verbose", action="store_true", help="Enable verbose output")
+args = parser.parse_args()
+
+pmcid_set.VERBOSE = args.verbose
+sets = [PMCIDSet.load(path) for path in args.sets]
+
+if args.command == "count":
+    for path, s in zip(args.sets, sets):
+        print(f"{path}\t{len(s)}")
+
+elif args.command == "bundles":
+    from gbcutils.europepmc import bundle_ranges
+    ranges = bundle_ranges(args.bundle_dir)
+    split = sets[0].split_by_ranges(ranges)
+    for bundle, ids in split:
+        print(f"{bundle}\t{len(ids)}")
+    outside = len(sets[0]) - sum(len(ids) for _, ids in split)
+    print(f"📦 {len(split)} of {len(ranges)} bundles hold IDs ; {outside} IDs are in no bundle") if args.verbose else None
+
+else:
+    result = sets[0]
+    for s in sets[1:]:
+        if args.command == "union":
+            result = result | s
+        elif args.command == "intersect":
+            result = result & s
+        else:
+            result = result - s
+
+    if args.out and args.out.endswith(".pmcset"):
+        result.dump(args.out)
+    else:
+        out = open(args.out, "w") if args.out else sys.stdout
+        for pmcid in result:
+            out.write(pmcid + "\n")
+        if args.out:
+            out.close()
+    print(f"{args.command}: {len(result)} IDs", file=sys.stderr) if args.verbose else None
@@ -2,20 +2,22 @@
 
 """
 Query Europe PMC searhch API for articles containing names/aliases of known biodata resources.
-Store article metadata in sharded JSONL files and a SQLite database of PMC IDs. Multiple threads
-are used to parallelize I/O-bound Europe PMC queries.
-
-The resulting PMC ID list is deduplicated (using an SQLite database), sorted and split into chunks
-for downstream processing.
+Store article metadata in sharded JSONL files and the set of PMC IDs found (pmc_ids.pmcset, see
+gbcutils.pmcid_set), replacing those of an earlier run in the same --outdir. Multiple threads are used
+to parallelize I/O-bound Europe PMC queries.
+
+The resulting PMC ID list is deduplicated (using a compact PMC ID set), sorted and split into chunks
+for downstream processing. With --exclude_ids (e.g. the pmc_ids.pmcset of a previous run), only IDs
+not in that set are chunked. With --work_queue, the sorted IDs are also queued in <outdir>/work_queue.sqlite
+for workers to claim in small batches (see gbcutils.work_queue).
 """
 
 
 import json
 import argparse
 import os
+import glob
 import gzip
-import sqlite3
-import time
 import math
 
 from concurrent.futures import ThreadPoolExecutor
@@ -24,16 +26,31 @@ import threading
 import queue
 import traceback
 
-from gbcutils.europepmc import epmc_search
+from gbcutils.europepmc import epmc_search, enable_response_cache, enable_rate_limit
 from gbcutils.metadata import shard_key, shard_path
+from gbcutils import metrics, profiling
+from gbcutils import json_codec
+from gbcutils.work_queue import WorkQueue
+from gbcutils.pmcid_set import PMCIDSet
 
 parser = argparse.ArgumentParser(description="Query Europe PMC for resource mentions.")
 parser.add_argument('--outdir', type=str, required=True, help='Output directory for results')
 parser.add_argument('--resources', type=str, required=True, help='JSON file containing resource names and aliases')
 parser.add_argument('--chunks', type=int, default=1, help='Number of chunks to split the work into')
+parser.add_argument('--work_queue', action='store_true', help='Also queue the sorted PMC IDs in <outdir>/work_queue.sqlite for dynamic scheduling')
+parser.add_argument('--exclude_ids', type=str, default=None, help='PMC ID set (.pmcset) or list of a previous run : only chunk IDs not in it')
 parser.add_argument('--epmc_limit', type=int, default=0, help='Limit for the number of results to fetch from Europe PMC')
 parser.add_argument('--page_size', type=int, default=1000, help='Page size for Europe PMC queries (mostly for testing. default: 1000)')
 parser.add_argument('--shards', type=int, default=128, help='Number of JSONL shards to write for metadata')
+parser.add_argument('--http_cache', type=str, default=None, help='Directory for an on-disk cache of Europe PMC responses (cached page by page)')
+parser.add_argument('--http_cache_ttl', type=float, default=None, help='Refetch cached responses older than this many hours (default: never expire)')
+parser.add_argument('--http_cache_max_mb', type=float, default=None, help='Evict least recently used responses once the cache exceeds this size')
+parser.add_argument('--http_cache_replay', action='store_true', help='Only replay responses from --http_cache : fail instead of querying Europe PMC')
+parser.add_argument('--rate_limit_dir', type=str, default=None, help='Directory holding Europe PMC rate limit state shared by concurrent tasks (default: no shared limit)')
+parser.add_argument('--api_rate', type=float, default=10, help='With --rate_limit_dir : maximum Europe PMC API requests per second, across all tasks')
+parser.add_argument('--ftp_rate', type=float, default=2, help='With --rate_limit_dir : maximum Europe PMC FTP requests per second, across all tasks')
+parser.add_argument('--profile', action='store_true', help='Sample the run and write a collapsed-stack flamegraph (.profile.folded) and hotspot summary (.profile.txt) next to the metrics file')
+parser.add_argument('--metrics_out', type=str, default=None, help='JSON file to write task metrics to (default: <outdir>/query_europepmc.metrics.json)')
 parser.add_argument('--verbose', action='store_true', help='Enable verbose output')
 parser.add_argument('--include_pmcids', type=str, default="", help='Comma-separated list of PMCIDs to include (for testing)')
 
@@ -42,16 +59,40 @@ parser.add_argument('--queue_size', type=int, default=1000, help='Max in-flight
 
 args = parser.parse_args()
 
+metrics_path = args.metrics_out or os.path.join(args.outdir, "query_europepmc.metrics.json")
+if args.profile:
+    profiling.start(profiling.prefix_for(metrics_path))
+
 os.makedirs(args.outdir, exist_ok=True)
 resource_aliases = json.load(open(args.resources))
 
 metadata_outdir = os.path.join(args.outdir, "metadata")
 os.makedirs(metadata_outdir, exist_ok=True)
-ids_db_path = os.path.join(args.outdir, "pmc_ids.sqlite")
+# every run writes the metadata of all the IDs it finds, deduplicated in memory : remove the shards of an
+# earlier run in the same outdir, which would otherwise get a second copy of each record
+for stale_shard in glob.glob(os.path.join(metadata_outdir, "metadata_shard_*.jsonl.gz")):
+    os.remove(stale_shard)
+ids_set_path = os.path.join(args.outdir, "pmc_ids.pmcset")
+pmc_ids = PMCIDSet()
 
 if args.verbose:
     import gbcutils.europepmc as epmc_utils
     epmc_utils.VERBOSE = True
+    metrics.VERBOSE = True
+    print(f"🧩 Using the {json_codec.backend} JSON backend")
+
+if args.http_cache:
+    enable_response_cache(
+        args.http_cache,
+        ttl=args.http_cache_ttl * 3600 if args.http_cache_ttl is not None else None,
+        max_bytes=int(args.http_cache_max_mb * 1024 * 1024) if args.http_cache_max_mb else None,
+        replay_only=args.http_cache_replay,
+    )
+elif args.http_cache_replay:
+    parser.error("--http_cache_replay requires --http_cache")
+
+if args.rate_limit_dir:
+    enable_rate_limit(args.rate_limit_dir, api_rate=args.api_rate, ftp_rate=args.ftp_rate)
 
 extra_pmcids = set(x.strip() for x in args.include_pmcids.split(",") if x.strip())
 if len(extra_pmcids) > 100:
@@ -70,35 +111,25 @@ def _get_writer(k: int) -> gzip.GzipFile:
     """Get or create a shard writer for the given shard key."""
     with writers_lock:
         if k not in writers:
-            writers[k] = gzip.open(shard_path(k, basepath=metadata_outdir, shards=args.shards), 'at', encoding='utf-8')
+            writers[k] = gzip.open(shard_path(k, basepath=metadata_outdir, shards=args.shards), 'wb')
         return writers[k]
 
 
 def _writer_thread_fn():
     """Thread function for writing metadata and PMC IDs."""
     try:
-        conn = sqlite3.connect(ids_db_path)
-        conn.execute("PRAGMA journal_mode=WAL;")
-        conn.execute("PRAGMA synchronous=NORMAL;")
-        conn.execute("CREATE TABLE IF NOT EXISTS pmc_ids (pmc_id TEXT PRIMARY KEY)")
-        conn.commit()
-        cur = conn.cursor()
-
-        last_commit = time.time()
         while True:
             item = work_q.get()
             if item is None:
                 work_q.task_done()
                 break
             this_pmcid, this_article_metadata = item
-            cur.execute("INSERT OR IGNORE INTO pmc_ids(pmc_id) VALUES (?)", (this_pmcid,))
-            if cur.rowcount == 1:
+            metrics.incr("query.records")
+            if pmc_ids.add(this_pmcid):
+                metrics.incr("query.unique_pmcids")
                 k = shard_key(this_pmcid, args.shards)
                 fh = _get_writer(k)
-                fh.write(json.dumps(this_article_metadata, ensure_ascii=False) + "\n")
-            if time.time() - last_commit > 5:
-                conn.commit()
-                last_commit = time.time()
+                fh.write(json_codec.dumpb(this_article_metadata) + b"\n")
             work_q.task_done()
     except Exception:
         # write a crash log to disk so you see it even if stdout is buffered
@@ -106,12 +137,6 @@ def _writer_thread_fn():
         with open(err_path, "a", encoding="utf-8") as lf:
             lf.write(traceback.format_exc())
         raise
-    finally:
-        try:
-            conn.commit()
-            conn.close()
-        except Exception:
-            pass
 
 
 writer_thread = threading.Thread(target=_writer_thread_fn, daemon=True)
@@ -307,17 +332,18 @@ for fh in list(writers.values()):
     fh.close()
 
 
-# Split the idlist into chunks by streaming IDs from SQLite (memory-light)
-con = sqlite3.connect(ids_db_path)
-cur = con.cursor()
+pmc_ids.dump(ids_set_path)
 
-# Count total IDs first (still memory-light)
-cur.execute("SELECT COUNT(*) FROM pmc_ids")
-(total_ids,) = cur.fetchone()
-per_chunk = int(math.ceil(total_ids / args.chunks)) if args.chunks > 0 else total_ids
+# Keep only the IDs new since a previous run, if asked
+chunk_ids = pmc_ids
+if args.exclude_ids:
+    chunk_ids = pmc_ids - PMCIDSet.load(args.exclude_ids)
+    metrics.incr("query.excluded_pmcids", len(pmc_ids) - len(chunk_ids))
+    print(f"Excluding {len(pmc_ids) - len(chunk_ids)} IDs already in {args.exclude_ids}") if args.verbose else None
 
-# Order by the numeric portion of the PMC ID to ensure true numeric order
-cur.execute("SELECT pmc_id FROM pmc_ids ORDER BY CAST(SUBSTR(pmc_id, 4) AS INTEGER)")
+# Split the idlist into chunks (the set iterates in numeric PMC ID order)
+total_ids = len(chunk_ids)
+per_chunk = int(math.ceil(total_ids / args.chunks)) if args.chunks > 0 else total_ids
 
 chunk_idx = 0
 written_in_chunk = 0
@@ -325,7 +351,7 @@ chunk_path = os.path.join(args.outdir, f"pmc_idlist.chunk_{chunk_idx+1}.txt")
 cf = open(chunk_path, 'w')
 try:
     total = 0
-    for (pmc_id,) in cur:
+    for pmc_id in chunk_ids:
         total += 1
         cf.write(pmc_id + "\n")
         written_in_chunk += 1
@@ -343,4 +369,12 @@ finally:
         cf.close()
     except Exception:
         pass
-    con.close()
+
+metrics.incr("query.chunks", chunk_idx + 1)
+
+if args.work_queue:
+    queue_path = os.path.join(args.outdir, "work_queue.sqlite")
+    queued = WorkQueue(queue_path).add(chunk_ids)
+    metrics.incr("query.queued", queued)
+    print(f"Queued {queued} IDs in {queue_path}") if args.verbose else None
+metrics.dump(metrics_path, task="query_europepmc")
@@ -1,52 +1,42 @@
 #!/usr/bin/env python3
 
 """
-For a list of prediction counts pickled DataFrames, merge them and compute
-specificity scores for each resource based on the proportion of positive predictions.
-
-The resulting specificity scores are saved to a CSV file.
+For a list of prediction count files (per chunk, or already merged by merge_prediction_counts.py),
+merge them and compute specificity scores for each resource alias based on the proportion of
+positive predictions.
+
+The resulting specificity scores are saved to a CSV file : over all predictions, and over the model's
+own predictions, which classify_resource_mentions.py --specificity_scores uses to pick the aliases that
+skip the model. With --previous_scores (the scores the run was classified with), aliases that skipped
+the model keep their earlier model counts, so they stay eligible on the next run.
 """
 
-import sys
-import pandas as pd
-
-pickle_files = sys.argv[1:]
-
-# load and concatenate
-dfs = [pd.read_pickle(f) for f in pickle_files]
-merged = pd.concat(dfs, ignore_index=True)
-
-# group by resource_name and prediction to sum counts
-all_prediction_counts = (
-    merged
-    .groupby(["resource_name", "matched_alias", "prediction"], as_index=False)['count']
-    .sum()
-)
-
-# Pivot prediction into columns
-specificity_score = all_prediction_counts.pivot_table(
-    index=['resource_name', 'matched_alias'],
-    columns='prediction',
-    values='count',
-    fill_value=0
-).reset_index()
-specificity_score.columns.name = None  # Remove the name of the columns index
-
-# Rename columns for clarity
-specificity_score.rename(columns={
-    1: 'positives',
-    0: 'negatives'
-}, inplace=True)
-
-# Calculate specificity score : proportion of positive predictions
-specificity_score['specificity'] = specificity_score['positives'] / (specificity_score['positives'] + specificity_score['negatives'])
-
-# Save the specificity score DataFrame to a CSV file
-specificity_score['positives'] = specificity_score['positives'].astype(int)
-specificity_score['negatives'] = specificity_score['negatives'].astype(int)
-specificity_score.sort_values(
-    by=['specificity', 'positives'],
-    ascending=[False, False],
-    inplace=True
-)
-specificity_score.to_csv('resource_specificity_scores.csv', index=False)
\ No newline at end of file
+import csv
+import argparse
+
+from gbcutils import prediction_counts
+
+parser = argparse.ArgumentParser(description="Compute resource alias specificity scores from prediction counts.")
+parser.add_argument("counts_files", nargs="+", help="Prediction count files (.json.gz, or legacy .pkl DataFrames)")
+parser.add_argument("--out", type=str, default="resource_specificity_scores.csv", help="Output CSV file")
+parser.add_argument("--counts_out", type=str, default=None, help="Also write the merged counts to this file (to fold into a later run)")
+parser.add_argument("--previous_scores", type=str, default=None, help="Specificity scores CSV the run was classified with : model counts carried over for bypassed aliases")
+parser.add_argument("--verbose", action="store_true", help="Enable verbose output")
+args = parser.parse_args()
+
+prediction_counts.VERBOSE = args.verbose
+
+# sum counts file by file : memory is bounded by the number of aliases, not of files
+counts, chunks = prediction_counts.merge_files(args.counts_files)
+if args.counts_out:
+    prediction_counts.dump(counts, args.counts_out, chunks=chunks)
+
+# Save the specificity scores, proportion of positive predictions first
+previous = prediction_counts.read_model_counts(args.previous_scores) if args.previous_scores else None
+scores = prediction_counts.specificity_scores(counts, previous=previous)
+with open(args.out, "w", newline="") as fh:
+    writer = csv.writer(fh, lineterminator="\n")
+    writer.writerow(prediction_counts.score_columns)
+    writer.writerows(scores)
+
+print(f"📈 Wrote specificity scores for {len(scores)} aliases from {chunks} chunk(s) to {args.out}") if args.verbose else None
@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+
+"""
+Start a long-lived local inference server for the SciBERT resource classifier.
+
+The model is loaded once, and classify_resource_mentions.py processes on the same node send their
+candidates over a Unix socket instead of loading their own copy. Candidates from concurrent clients
+are grouped into dynamic batches. Clients fall back to in-process inference if no server is running.
+"""
+
+import argparse
+
+from gbcutils.inference_server import serve, default_socket_path
+import gbcutils.inference_server as inference_server
+import gbcutils.scibert_classify as utils
+
+parser = argparse.ArgumentParser(description="Serve the SciBERT resource classifier on a local Unix socket.")
+parser.add_argument("--model", type=str, required=True, help="Path to the SciBERT model")
+parser.add_argument("--socket", type=str, default=default_socket_path, help=f"Unix socket path (default: {default_socket_path}, or $GBC_INFERENCE_SOCKET)")
+parser.add_argument("--max_batch_size", type=int, default=32, help="Maximum number of candidates per batch")
+parser.add_argument("--max_latency_ms", type=float, default=10, help="Maximum time to wait for a batch to fill up")
+parser.add_argument("--threads", type=int, default=1, help="Number of CPU threads for inference (CPU only)")
+parser.add_argument("--metrics_out", type=str, default=None, help="Write batch metrics as JSON to this file on shutdown")
+parser.add_argument("--verbose", action="store_true", help="Enable verbose output")
+args = parser.parse_args()
+
+inference_server.VERBOSE = args.verbose
+utils.VERBOSE = args.verbose
+
+serve(args.model, socket_path=args.socket, max_batch_size=args.max_batch_size, max_latency_ms=args.max_latency_ms, num_threads=args.threads, metrics_out=args.metrics_out)
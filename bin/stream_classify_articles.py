@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+
+"""
+Fetch, preprocess and classify a list of PMC IDs in a single process, without intermediate text files.
+
+The stages of fetch_and_preprocess_article.py and classify_resource_mentions.py run on their own
+threads, joined by bounded queues so that a slow stage holds back the ones before it :
+  - fetch    : --fetch_workers threads run get_fulltext_body on upcoming articles (bundle downloads, XML parsing)
+  - match    : one thread extracts candidate mentions (get_resource_mentions, or the --match_first variant)
+  - classify : the main thread classifies candidates with classify_mentions (or a local inference server)
+Downloads overlap alias matching and the forward passes. The --mentions_out summary and --counts_out
+prediction counts are the same as those of the two-step path.
+
+Suited to small deployments and re-processing runs ; cascade and bypass routing are only available in
+classify_resource_mentions.py.
+
+With --work_queue, the script is one of several workers sharing a queue of PMC IDs (see
+gbcutils.work_queue) : it claims batches of --batch_size articles until the queue is empty, and
+stores each batch's summary rows and counts in the queue as the batch completes (collect them with
+`work_queue.py export`). Its own --mentions_out / --counts_out cover the batches it completed.
+"""
+
+import os
+import json
+import time
+import queue
+import socket
+import argparse
+import threading
+import contextlib
+from functools import partial
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from gbcutils.europepmc import get_fulltext_body, article_text, enable_response_cache, enable_rate_limit
+from gbcutils.scibert_classify import get_resource_mentions, get_resource_mentions_match_first, mentions_to_pairs
+from gbcutils.scibert_classify import classify_mentions, load_model, load_matcher, summarise_predictions, summary_columns
+from gbcutils.inference_server import inference_server_available, RemoteClassifier, default_socket_path
+import gbcutils.europepmc as epmc
+import gbcutils.scibert_classify as utils
+import gbcutils.inference_server as inference_server
+from gbcutils import metrics, prediction_counts, profiling
+from gbcutils.work_queue import WorkQueue
+import gbcutils.work_queue as work_queue
+
+parser = argparse.ArgumentParser(description="Fetch, preprocess and classify articles in one streaming process.")
+parser.add_argument("--pmcid", type=str, default=None, help="PMC ID of the article")
+parser.add_argument("--idlist", type=str, default=None, help="Path to file containing list of PMC IDs")
+parser.add_argument("--work_queue", type=str, default=None, help="Claim PMC IDs from this work queue (query_europepmc.py --work_queue) until it is empty")
+parser.add_argument("--worker_id", type=str, default=None, help="Name of this worker in the work queue (default: <hostname>.<pid>)")
+parser.add_argument("--batch_size", type=int, default=10, help="Number of PMC IDs claimed from the work queue at a time")
+parser.add_argument("--prefetch_batches", type=int, default=2, help="Maximum number of work queue batches claimed by this worker and not yet classified")
+parser.add_argument("--lease_s", type=float, default=600, help="Seconds before a batch leased to a worker that stopped responding is claimed again")
+parser.add_argument("--max_attempts", type=int, default=3, help="Number of times a PMC ID is leased before it is marked failed")
+parser.add_argument("--local_xml_dir", type=str, default=None, help="Directory containing local XML files or OA bundles")
+parser.add_argument("--xml_dir", type=str, default="xml", help="Directory to download OA bundles to")
+
+parser.add_argument("--model", type=str, required=True, help="Path to the SciBERT model")
+parser.add_argument("--resources", type=str, required=True, help="JSON file containing resources names and aliases")
+parser.add_argument("--case_sensitive_resources", type=str, default="", help="Comma-separated list of resources to search case-sensitively")
+parser.add_argument("--matcher", type=str, default=None, help="Alias matcher saved by fetch_resource_list.py --matcher_out (rebuilt if stale or missing)")
+parser.add_argument("--mentions_out", type=str, default="resource_mentions_summary.csv", help="Output file for resource mentions")
+parser.add_argument("--counts_out", type=str, default="prediction_counts.json.gz", help="Output file for prediction counts (mergeable, see merge_prediction_counts.py)")
+parser.add_argument("--match_first", action="store_true", help="Search for aliases before sentence splitting (only sentence-split around matches)")
+parser.add_argument("--token_window", type=int, default=None, help="Limit model inputs to a window of this many tokens centred on the matched alias (e.g. 128 or 256)")
+parser.add_argument("--inference_socket", type=str, default=default_socket_path, help="Unix socket of a local inference server (scibert_inference_server.py), used if present")
+
+parser.add_argument("--fetch_workers", type=int, default=4, help="Number of threads fetching and parsing articles")
+parser.add_argument("--queue_size", type=int, default=16, help="Maximum number of articles waiting between two stages")
+parser.add_argument("--http_cache", type=str, default=None, help="Directory for an on-disk cache of Europe PMC API responses")
+parser.add_argument("--rate_limit_dir", type=str, default=None, help="Directory holding Europe PMC rate limit state shared by concurrent tasks (default: no shared limit)")
+parser.add_argument("--api_rate", type=float, default=10, help="With --rate_limit_dir : maximum Europe PMC API requests per second, across all tasks")
+parser.add_argument("--ftp_rate", type=float, default=2, help="With --rate_limit_dir : maximum Europe PMC FTP requests per second, across all tasks")
+parser.add_argument("--profile", action="store_true", help="Sample the run and write a collapsed-stack flamegraph (.profile.folded) and hotspot summary (.profile.txt) next to the metrics file")
+parser.add_argument("--metrics_out", type=str, default=None, help="JSON file to write task metrics to (default: next to --mentions_out, as <name>.stream.metrics.json)")
+parser.add_argument("--verbose", action="store_true", help="Enable verbose output")
+args = parser.parse_args()
+
+metrics_path = args.metrics_out or os.path.splitext(args.mentions_out)[0] + ".stream.metrics.json"
+if args.profile:
+    profiling.start(profiling.prefix_for(metrics_path))
+
+import pandas as pd # imported after argument parsing to keep --help fast
+
+VERBOSE = args.verbose
+epmc.VERBOSE = VERBOSE
+utils.VERBOSE = VERBOSE
+inference_server.VERBOSE = VERBOSE
+metrics.VERBOSE = VERBOSE
+work_queue.VERBOSE = VERBOSE
+
+if args.http_cache:
+    enable_response_cache(args.http_cache)
+if args.rate_limit_dir:
+    enable_rate_limit(args.rate_limit_dir, api_rate=args.api_rate, ftp_rate=args.ftp_rate)
+
+wq, worker_id = None, None
+if args.work_queue:
+    wq = WorkQueue(args.work_queue, lease_s=args.lease_s, max_attempts=args.max_attempts)
+    worker_id = args.worker_id or f"{socket.gethostname()}.{os.getpid()}"
+elif args.pmcid:
+    ids = [args.pmcid]
+elif args.idlist:
+    with open(args.idlist, 'r') as f:
+        ids = [line.strip() for line in f if line.strip()]
+else:
+    raise ValueError("You must provide a PMC ID (--pmcid), a file containing a list of PMC IDs (--idlist) or a work queue (--work_queue).")
+os.makedirs(args.xml_dir, exist_ok=True)
+
+case_sensitive_resources = [x.strip() for x in args.case_sensitive_resources.split(',') if x.strip()]
+
+# 📋 Load resource list
+resource_names = list(json.load(open(args.resources)).values())
+print(f"\t📥 Loaded {len(resource_names)} resources") if VERBOSE else None
+matcher = load_matcher(args.matcher, resource_names, case_sensitive_resources)
+
+# 📦 Load Model (unless a local inference server is already serving it)
+if inference_server_available(args.inference_socket, model_path=args.model):
+    print(f"📦 Using inference server on {args.inference_socket}") if VERBOSE else None
+    (tokenizer, model, device) = (None, None, None)
+    classify_fn = RemoteClassifier(args.model, socket_path=args.inference_socket) # falls back to in-process if the server goes away
+else:
+    print("📦 Loading SciBERT resource classifier model") if VERBOSE else None
+    (tokenizer, model, device) = load_model(args.model)
+    classify_fn = classify_mentions
+
+# -----------------------
+# Pipeline stages
+# -----------------------
+
+_done = object()
+
+class _StageFailed:
+    def __init__(self, error):
+        self.error = error
+
+class _BatchEnd:
+    """Passed down the stages after the last article of a batch."""
+    def __init__(self, items):
+        self.items = items
+
+def _get(q, wait_metric):
+    """Take the next item from `q`, recording the time spent waiting on the previous stage."""
+    with metrics.timer(wait_metric):
+        item = q.get()
+    if isinstance(item, _StageFailed):
+        raise item.error
+    return item
+
+def _run_stage(fn, out_q):
+    """Run `fn(out_q)` on a daemon thread, passing any error on to the next stage."""
+    def run():
+        try:
+            fn(out_q)
+            out_q.put(_done)
+        except BaseException as e:
+            out_q.put(_StageFailed(e))
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+def _fetch_text(pmcid):
+    with metrics.timer("stream.fetch_s"):
+        text_blocks, table_blocks = get_fulltext_body(pmcid, path=args.local_xml_dir, dest=args.xml_dir)
+    metrics.incr("preprocess.articles")
+    return article_text(text_blocks, table_blocks)
+
+# with a work queue, at most --prefetch_batches claimed batches are in this worker at a time : claiming
+# further ahead would hold back articles that idle workers could take
+batches_in_flight = threading.Semaphore(args.prefetch_batches) if wq else None
+
+def fetch_stage(out_q):
+    """
+    Put (pmcid, text) on `out_q` in input order, with up to --queue_size articles fetched ahead, and
+    (_BatchEnd, None) after each batch.
+    """
+    def put(pmcid, future):
+        out_q.put((pmcid, future.result() if future else None))
+
+    def flush():
+        while pending:
+            put(*pending.popleft())
+
+    batches = wq.batches(worker_id, args.batch_size) if wq else iter([ids])
+    with ThreadPoolExecutor(max_workers=max(1, args.fetch_workers)) as pool:
+        pending = deque()
+        while True:
+            if batches_in_flight and not batches_in_flight.acquire(blocking=False):
+                flush() # pass on the batches in hand before waiting for one to be classified
+                batches_in_flight.acquire()
+            batch = next(batches, None)
+            if batch is None:
+                break
+            if not batch: # the work queue is waiting on other workers : pass on everything fetched so far
+                batches_in_flight.release()
+                flush()
+                continue
+            for pmcid in batch:
+                pending.append((pmcid, pool.submit(_fetch_text, pmcid)))
+                if len(pending) >= args.queue_size:
+                    put(*pending.popleft())
+            pending.append((_BatchEnd(batch), None))
+        flush()
+
+def match_stage(in_q, out_q):
+    """Put (pmcid, mentions, spans) on `out_q` for each article with at least one candidate mention."""
+    for pmcid, text in iter(lambda: _get(in_q, "stream.match_wait_s"), _done):
+        if isinstance(pmcid, _BatchEnd):
+            out_q.put((pmcid, None, None))
+            continue
+        if not text:
+            metrics.incr("preprocess.articles_empty")
+            continue
+        with metrics.timer("extract.article_s"):
+            if args.match_first:
+                sentences, mention_records = get_resource_mentions_match_first(text, resource_names, case_sensitive_resources=case_sensitive_resources, matcher=matcher)
+                mentions = mentions_to_pairs(sentences, mention_records)
+                spans = [(m.start, m.end) for m in mention_records]
+            else:
+                mentions = get_resource_mentions(text, resource_names, case_sensitive_resources=case_sensitive_resources, matcher=matcher)
+                spans = None
+        metrics.incr("extract.articles")
+        metrics.incr("extract.mentions", len(mentions))
+        print(f"\t‣ 🔍 Found {len(mentions)} mentions of {len(set([x[2] for x in mentions]))} resources in {pmcid}.") if VERBOSE else None
+        if mentions:
+            out_q.put((pmcid, mentions, spans))
+
+def finish_batch(batch_records, items):
+    """Complete a work queue batch with its summary rows and counts. Returns False if its lease was lost."""
+    if not wq:
+        return True
+    batch_df = pd.DataFrame(batch_records, columns=record_columns)
+    counts = prediction_counts.count_predictions(zip(batch_df['resource_name'], batch_df['matched_alias'], batch_df['prediction'], batch_df['routing']))
+    return wq.complete(worker_id, items, result={
+        "mentions": summarise_predictions(batch_df)[summary_columns].values.tolist(),
+        "counts": prediction_counts.to_rows(counts),
+    })
+
+# 🧠 Run the stages
+print(f"🧠 Streaming articles from {args.work_queue} as {worker_id}" if wq else f"🧠 Streaming {len(ids)} articles") if VERBOSE else None
+record_columns = ['prediction', 'id', 'resource_name', 'matched_alias', 'sentence', 'confidence', 'routing']
+metrics.define_rate("stream.articles_per_s", "preprocess.articles", "stream.total_s")
+metrics.define_rate("extract.articles_per_s", "extract.articles", "extract.article_s")
+metrics.define_rate("classify.model_candidates_per_s", "classify.candidates", "classify.forward_s")
+start = time.perf_counter()
+text_q = queue.Queue(maxsize=args.queue_size)
+mention_q = queue.Queue(maxsize=args.queue_size)
+_run_stage(fetch_stage, text_q)
+_run_stage(partial(match_stage, text_q), mention_q)
+
+records, batch_start = [], 0
+try:
+    with (wq.heartbeat(worker_id) if wq else contextlib.nullcontext()):
+        for pmcid, mentions, spans in iter(lambda: _get(mention_q, "stream.classify_wait_s"), _done):
+            if isinstance(pmcid, _BatchEnd):
+                if not finish_batch(records[batch_start:], pmcid.items):
+                    del records[batch_start:] # another worker completed this batch
+                batch_start = len(records)
+                if batches_in_flight:
+                    batches_in_flight.release()
+                continue
+            metrics.incr("classify.inputs", len(mentions))
+            with metrics.timer("classify.article_s"):
+                classified_mentions = classify_fn(pmcid, mentions, tokenizer=tokenizer, model=model, device=device, window=args.token_window, spans=spans)
+            records.extend(classified_mentions)
+except BaseException:
+    if wq:
+        wq.release(worker_id) # hand the batches in flight back to the other workers straight away
+    raise
+
+total_s = time.perf_counter() - start
+metrics.observe("stream.total_s", total_s)
+
+# 🏁 Write the same outputs as classify_resource_mentions.py
+class_df = pd.DataFrame(records, columns=record_columns)
+summary_df = summarise_predictions(class_df)
+summary_df[summary_columns].to_csv(args.mentions_out, index=False)
+
+counts = prediction_counts.count_predictions(zip(class_df['resource_name'], class_df['matched_alias'], class_df['prediction'], class_df['routing']))
+prediction_counts.dump(counts, args.counts_out)
+
+snapshot = metrics.snapshot()
+wait_s = {stage: snapshot["histograms"].get(f"stream.{stage}_wait_s", {}).get("sum", 0) for stage in ["match", "classify"]}
+print(f"⏱️ {snapshot['counters'].get('preprocess.articles', 0)} articles in {total_s:.1f}s : matching waited {wait_s['match']:.1f}s on fetching, classifying waited {wait_s['classify']:.1f}s on matching") if VERBOSE else None
+metrics.incr("routing.scibert", len(class_df))
+metrics.incr("classify.mentions_out", len(summary_df))
+metrics.dump(metrics_path, task="stream_classify_articles")
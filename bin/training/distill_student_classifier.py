@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+
+"""
+Distil the fine-tuned SciBERT resource classifier (the teacher) into a smaller student model with
+fewer layers and/or a narrower hidden size.
+
+The student is trained on a mix of the teacher's softened predictions and the true labels from the
+labelled training CSVs, then saved in the same directory layout as the teacher (config, safetensors
+weights and tokenizer files) so it can be used anywhere a model path is accepted (`load_model`,
+classify_resource_mentions.py --model, ...).
+
+The student is trained on alias-centred windows of --max_length tokens (see `pretokenize_pairs`),
+the inputs it gets when classifying with `--token_window <max_length>`.
+
+Finally, teacher and student are compared on a held-out split of the training sentences, on those
+same windows ; the teacher is also scored on its production inputs (512 tokens, no window). An
+accuracy/throughput report is written to `distillation_report.json` in the output directory.
+"""
+
+import os
+import copy
+import json
+import time
+import random
+import argparse
+
+import pandas as pd
+import torch
+from sklearn.metrics import accuracy_score, f1_score
+from sklearn.model_selection import train_test_split
+from transformers import AutoModelForSequenceClassification
+
+from gbcutils.scibert_classify import load_model, pretokenize_pairs, pad_batch, classify_mentions
+
+parser = argparse.ArgumentParser(description="Distil the SciBERT resource classifier into a smaller student model.")
+parser.add_argument("--teacher", type=str, default="data/models/scibert_resource_classifier.v3", help="Path to the teacher model")
+parser.add_argument("--input", "-i", type=str, nargs="+", required=True, help="Labelled training CSV file(s)")
+parser.add_argument("--output", "-o", type=str, required=True, help="Output directory for the student model")
+parser.add_argument("--layers", type=int, default=4, help="Number of transformer layers in the student")
+parser.add_argument("--hidden_size", type=int, default=None, help="Hidden size of the student (default: same as teacher)")
+parser.add_argument("--temperature", type=float, default=2.0, help="Softmax temperature for the teacher's soft labels")
+parser.add_argument("--alpha", type=float, default=0.5, help="Weight of the soft-label loss (1 - alpha for the true labels)")
+parser.add_argument("--epochs", type=int, default=4, help="Number of training epochs")
+parser.add_argument("--batch_size", type=int, default=16, help="Training batch size")
+parser.add_argument("--learning_rate", type=float, default=5e-5, help="Learning rate")
+parser.add_argument("--max_length", type=int, default=256, help="Token window centred on the alias, for training and evaluation (classify with the same --token_window)")
+parser.add_argument("--test_size", type=float, default=0.2, help="Fraction of sentences held out for the report")
+args = parser.parse_args()
+if args.hidden_size is not None and args.hidden_size < 1:
+    parser.error("--hidden_size must be a positive number")
+
+def attention_heads(hidden_size, head_size=64):
+    """Number of attention heads for `hidden_size` : about `head_size` dimensions each, and dividing it exactly."""
+    heads = max(1, hidden_size // head_size)
+    while hidden_size % heads:
+        heads -= 1
+    return heads
+
+random.seed(42)
+torch.manual_seed(42)
+
+# Load labelled sentences (dropping duplicates shared between training set versions)
+dfs = []
+for f in args.input:
+    df = pd.read_csv(f)
+    df = df.rename(columns={"matched_alias": "matched_term"})
+    df["label"] = pd.to_numeric(df["label"], errors="coerce") # some files contain stray header rows
+    dfs.append(df[["resource_name", "matched_term", "label", "paragraph_text"]])
+df = pd.concat(dfs, ignore_index=True).dropna().drop_duplicates(subset=["matched_term", "paragraph_text"])
+print(f"📥 Loaded {len(df)} unique labelled sentences from {len(args.input)} file(s)")
+
+candidate_pairs = list(zip(df["paragraph_text"].astype(str), df["matched_term"].astype(str), df["resource_name"]))
+labels = df["label"].astype(int).tolist()
+train_idx, test_idx = train_test_split(list(range(len(labels))), test_size=args.test_size, random_state=42, stratify=labels)
+
+# 📦 Teacher & soft labels
+print(f"📦 Loading teacher model from {args.teacher}")
+(tokenizer, teacher, device) = load_model(args.teacher)
+# the same alias-centred windows as classify_mentions(window=args.max_length), used for the report
+encoded = pretokenize_pairs(tokenizer, candidate_pairs, window=args.max_length)
+
+def _batch_inputs(indices):
+    inputs = pad_batch(tokenizer, [encoded["input_ids"][i] for i in indices], [encoded["token_type_ids"][i] for i in indices])
+    return {k: v.to(device) for k, v in inputs.items()}
+
+def _batches(indices, size):
+    for b in range(0, len(indices), size):
+        yield indices[b:b + size]
+
+teacher_logits = torch.zeros((len(labels), teacher.config.num_labels))
+with torch.no_grad():
+    for batch in _batches(train_idx, args.batch_size):
+        teacher_logits[batch] = teacher(**_batch_inputs(batch)).logits.float().cpu()
+print(f"🧠 Computed teacher soft labels for {len(train_idx)} training sentences")
+
+# 🎓 Student : a copy of the teacher's config with fewer layers and/or a narrower hidden size
+student_config = copy.deepcopy(teacher.config)
+student_config.num_hidden_layers = args.layers
+if args.hidden_size and args.hidden_size != teacher.config.hidden_size:
+    student_config.hidden_size = args.hidden_size
+    student_config.intermediate_size = 4 * args.hidden_size
+    student_config.num_attention_heads = attention_heads(args.hidden_size)
+student = AutoModelForSequenceClassification.from_config(student_config)
+
+if student_config.hidden_size == teacher.config.hidden_size:
+    # initialise from the teacher : embeddings, pooler & classifier, plus evenly spaced encoder layers
+    t_layers, s_layers = teacher.config.num_hidden_layers, args.layers
+    layer_map = {j: round(j * (t_layers - 1) / max(1, s_layers - 1)) for j in range(s_layers)}
+    teacher_state = teacher.state_dict()
+    student_state = student.state_dict()
+    for key in student_state:
+        t_key = key
+        if ".layer." in key:
+            prefix, rest = key.split(".layer.", 1)
+            j, rest = rest.split(".", 1)
+            t_key = f"{prefix}.layer.{layer_map[int(j)]}.{rest}"
+        if t_key in teacher_state and teacher_state[t_key].shape == student_state[key].shape:
+            student_state[key] = teacher_state[t_key].clone()
+    student.load_state_dict(student_state)
+    print(f"🎓 Initialised {s_layers}-layer student from teacher layers {list(layer_map.values())}")
+else:
+    print(f"🎓 Initialised {args.layers}-layer student with hidden size {student_config.hidden_size} from scratch")
+
+student.to(device)
+teacher.to("cpu") # free GPU memory while training the student
+
+# 🏋️ Train
+optimizer = torch.optim.AdamW(student.parameters(), lr=args.learning_rate)
+T = args.temperature
+for epoch in range(args.epochs):
+    student.train()
+    random.shuffle(train_idx)
+    epoch_loss = 0.0
+    for batch in _batches(train_idx, args.batch_size):
+        student_logits = student(**_batch_inputs(batch)).logits
+        soft_targets = torch.nn.functional.softmax(teacher_logits[batch].to(device) / T, dim=-1)
+        soft_loss = torch.nn.functional.kl_div(
+            torch.nn.functional.log_softmax(student_logits / T, dim=-1), soft_targets, reduction="batchmean"
+        ) * (T * T)
+        hard_loss = torch.nn.functional.cross_entropy(student_logits, torch.tensor([labels[i] for i in batch], device=device))
+        loss = args.alpha * soft_loss + (1 - args.alpha) * hard_loss
+
+        optimizer.zero_grad()
+        loss.backward()
+        optimizer.step()
+        epoch_loss += loss.item() * len(batch)
+    print(f"\t‣ epoch {epoch + 1}/{args.epochs}: loss {epoch_loss / len(train_idx):.4f}")
+
+# 💾 Save in the same layout as the teacher
+os.makedirs(args.output, exist_ok=True)
+student.save_pretrained(args.output, safe_serialization=True)
+tokenizer.save_pretrained(args.output)
+print(f"✅ Saved student model to {args.output}")
+
+# 📊 Compare teacher & student on the held-out sentences, through the usual serving path : both on the
+# windows the student was trained on, and the teacher on its production inputs too (no window)
+held_out_pairs = [candidate_pairs[i] for i in test_idx]
+held_out_labels = [labels[i] for i in test_idx]
+report = {
+    "teacher": args.teacher,
+    "student": args.output,
+    "student_layers": student_config.num_hidden_layers,
+    "student_hidden_size": student_config.hidden_size,
+    "held_out_sentences": len(test_idx),
+    "window": args.max_length,
+}
+predicted, models = {}, {}
+for name, path, window in [("teacher", args.teacher, args.max_length), ("teacher_production", args.teacher, None), ("student", args.output, args.max_length)]:
+    if path not in models:
+        models[path] = load_model(path)
+    (m_tokenizer, m_model, m_device) = models[path]
+    start = time.time()
+    predictions = classify_mentions("distillation", held_out_pairs, tokenizer=m_tokenizer, model=m_model, device=m_device, window=window)
+    elapsed = time.time() - start
+    predicted[name] = [p["prediction"] for p in predictions]
+    report[name + "_metrics"] = {
+        "parameters": sum(p.numel() for p in m_model.parameters()),
+        "accuracy": accuracy_score(held_out_labels, predicted[name]),
+        "f1": f1_score(held_out_labels, predicted[name]),
+        "candidates_per_second": len(held_out_pairs) / elapsed if elapsed else None,
+    }
+report["agreement"] = accuracy_score(predicted["teacher"], predicted["student"])
+report["speedup"] = (report["student_metrics"]["candidates_per_second"] or 0) / (report["teacher_metrics"]["candidates_per_second"] or 1)
+
+json.dump(report, open(os.path.join(args.output, "distillation_report.json"), "w"), indent=2)
+print(json.dumps(report, indent=2))
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+
+"""
+Evaluate the mention-centred token window inference mode against labelled training sentences.
+
+Each input CSV needs `paragraph_text`, `label`, `resource_name` and `matched_term` (or `matched_alias`)
+columns, as in data/training/. Every sentence is classified with the full 512-token input and with
+each requested window size, and accuracy, F1 and mean input length are reported per mode.
+"""
+
+import argparse
+import time
+
+import pandas as pd
+from sklearn.metrics import accuracy_score, f1_score
+
+from gbcutils.scibert_classify import classify_mentions, load_model, pretokenize_pairs
+
+parser = argparse.ArgumentParser(description="Evaluate token window sizes for mention classification.")
+parser.add_argument("--model", type=str, required=True, help="Path to the SciBERT model")
+parser.add_argument("--input", "-i", type=str, nargs="+", required=True, help="Labelled training CSV file(s)")
+parser.add_argument("--windows", type=str, default="128,256", help="Comma-separated list of token window sizes to evaluate")
+parser.add_argument("--limit", type=int, default=0, help="Only evaluate the first N sentences (for testing)")
+parser.add_argument("--out", type=str, default=None, help="Optional CSV file for the results table")
+args = parser.parse_args()
+
+# Load labelled sentences
+dfs = []
+for f in args.input:
+    df = pd.read_csv(f)
+    df = df.rename(columns={"matched_alias": "matched_term"})
+    df["label"] = pd.to_numeric(df["label"], errors="coerce") # some files contain stray header rows
+    dfs.append(df[["resource_name", "matched_term", "label", "paragraph_text"]])
+df = pd.concat(dfs, ignore_index=True).dropna()
+if args.limit:
+    df = df.head(args.limit)
+print(f"📥 Loaded {len(df)} labelled sentences from {len(args.input)} file(s)")
+
+candidate_pairs = list(zip(df["paragraph_text"].astype(str), df["matched_term"].astype(str), df["resource_name"]))
+labels = df["label"].astype(int).tolist()
+
+(tokenizer, model, device) = load_model(args.model)
+
+results = []
+for window in [None] + [int(w) for w in args.windows.split(",") if w.strip()]:
+    mode = f"window_{window}" if window else "full_512"
+    lengths = pretokenize_pairs(tokenizer, candidate_pairs, window=window)["lengths"]
+
+    start = time.time()
+    predictions = classify_mentions("eval", candidate_pairs, tokenizer=tokenizer, model=model, device=device, window=window)
+    elapsed = time.time() - start
+
+    predicted = [p["prediction"] for p in predictions]
+    results.append({
+        "mode": mode,
+        "max_tokens": window or 512,
+        "mean_tokens": sum(lengths) / len(lengths),
+        "truncated": sum(1 for l in lengths if l >= (window or 512)),
+        "accuracy": accuracy_score(labels, predicted),
+        "f1": f1_score(labels, predicted),
+        "agreement_with_full": None if not results else accuracy_score(results[0]["_predicted"], predicted),
+        "seconds": elapsed,
+        "_predicted": predicted,
+    })
+    print(f"✅ {mode}: accuracy={results[-1]['accuracy']:.4f} f1={results[-1]['f1']:.4f} ({elapsed:.1f}s)")
+
+results_df = pd.DataFrame(results).drop(columns=["_predicted"])
+print(results_df.to_string(index=False))
+if args.out:
+    results_df.to_csv(args.out, index=False)
+    print(f"✅ Saved results to {args.out}")
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+
+"""
+Train the fast lexical classifier used as the first stage of the cascade in front of SciBERT
+(see `classify_mentions_cascade` in gbcutils.scibert_classify).
+
+A TF-IDF + logistic regression model is fitted to the words surrounding each matched alias in the
+labelled training CSVs. A held-out split is used to report, for a range of confidence thresholds,
+how many candidates the cascade would decide on its own and how accurate those decisions are.
+"""
+
+import argparse
+import pickle
+
+import pandas as pd
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import train_test_split
+from sklearn.pipeline import Pipeline
+
+from gbcutils.scibert_classify import cascade_features, cascade_format_version
+
+parser = argparse.ArgumentParser(description="Train the cascade (cheap-first) mention classifier.")
+parser.add_argument("--input", "-i", type=str, nargs="+", required=True, help="Labelled training CSV file(s)")
+parser.add_argument("--output", "-o", type=str, required=True, help="Output path for the pickled cascade model")
+parser.add_argument("--width", type=int, default=8, help="Number of context words either side of the alias")
+parser.add_argument("--thresholds", type=str, default="0.8,0.9,0.95,0.98", help="Comma-separated confidence thresholds to report on")
+parser.add_argument("--C", type=float, default=20.0, help="Inverse regularisation strength for the logistic regression")
+parser.add_argument("--test_size", type=float, default=0.2, help="Fraction of sentences held out for evaluation")
+args = parser.parse_args()
+
+# Load labelled sentences (dropping duplicates shared between training set versions)
+dfs = []
+for f in args.input:
+    df = pd.read_csv(f)
+    df = df.rename(columns={"matched_alias": "matched_term"})
+    df["label"] = pd.to_numeric(df["label"], errors="coerce") # some files contain stray header rows
+    dfs.append(df[["matched_term", "label", "paragraph_text"]])
+df = pd.concat(dfs, ignore_index=True).dropna().drop_duplicates(subset=["matched_term", "paragraph_text"])
+print(f"📥 Loaded {len(df)} unique labelled sentences from {len(args.input)} file(s)")
+
+features = [cascade_features(str(s), str(a), width=args.width) for s, a in zip(df["paragraph_text"], df["matched_term"])]
+labels = df["label"].astype(int).tolist()
+X_train, X_test, y_train, y_test = train_test_split(features, labels, test_size=args.test_size, random_state=42, stratify=labels)
+
+pipeline = Pipeline([
+    ("tfidf", TfidfVectorizer(token_pattern=r"\S+", ngram_range=(1, 2), sublinear_tf=True)),
+    ("clf", LogisticRegression(C=args.C, max_iter=1000, class_weight="balanced")),
+])
+pipeline.fit(X_train, y_train)
+
+# Report held-out routing & accuracy for each threshold pair (low = 1 - high)
+positive_probs = pipeline.predict_proba(X_test)[:, list(pipeline.classes_).index(1)]
+print(f"🔍 Held-out evaluation on {len(y_test)} sentences")
+for high in [float(t) for t in args.thresholds.split(",")]:
+    low = 1 - high
+    decided = [(p >= high, y) for p, y in zip(positive_probs, y_test) if p >= high or p <= low]
+    correct = sum(1 for pred, y in decided if int(pred) == y)
+    coverage = len(decided) / len(y_test)
+    accuracy = correct / len(decided) if decided else float("nan")
+    print(f"\t‣ high={high:.2f} low={low:.2f}: cascade decides {coverage:.1%} of candidates with {accuracy:.1%} accuracy")
+
+# Refit on all data and save
+pipeline.fit(features, labels)
+with open(args.output, "wb") as fh:
+    pickle.dump({"version": cascade_format_version, "width": args.width, "pipeline": pipeline}, fh)
+print(f"✅ Saved cascade classifier to {args.output}")
@@ -0,0 +1,94 @@
+"""
+Packed per-chunk article texts : one compressed container per chunk instead of one .txt file per article.
+
+fetch_and_preprocess_article.py writes each chunk's articles into its output directory as
+    articles.jsonl.gz    one JSON line per article, {"id": "PMC123", "text": "..."}, each line its own gzip member
+    articles.index.json  {"format": "article_pack", "version": 1, "articles": [[id, offset, length], ...]}
+so a chunk puts two files on the shared filesystem however many articles it holds. The pack is
+plain gzipped JSONL (`zcat articles.jsonl.gz` works) and is streamed front to back by
+classify_resource_mentions.py ; the offset table allows reading a single article without
+decompressing the rest (`read_article`).
+
+Both files are written under temporary names and renamed once complete, so a pack that is
+visible is always whole.
+"""
+
+import os
+import gzip
+import json
+
+VERBOSE = False
+format_name = "article_pack"
+format_version = 1
+pack_name = "articles.jsonl.gz"
+index_name = "articles.index.json"
+
+class ArticlePackWriter:
+    """Append articles to a pack in `outdir` ; the pack and its index are published on `close`."""
+    def __init__(self, outdir, compresslevel=6):
+        self.path = os.path.join(outdir, pack_name)
+        self.index_path = os.path.join(outdir, index_name)
+        self.compresslevel = compresslevel
+        self.articles = []
+        self.bytes_in = 0
+        self._fh = open(self.path + ".part", "wb")
+
+    def add(self, article_id, text):
+        """Write one article as its own gzip member. Returns the compressed size."""
+        line = json.dumps({"id": article_id, "text": text}, ensure_ascii=False) + "\n"
+        data = line.encode("utf-8")
+        member = gzip.compress(data, compresslevel=self.compresslevel, mtime=0)
+        self.articles.append([article_id, self._fh.tell(), len(member)])
+        self._fh.write(member)
+        self.bytes_in += len(data)
+        return len(member)
+
+    def close(self):
+        self._fh.close()
+        with open(self.index_path + ".part", "w") as fh:
+            json.dump({"format": format_name, "version": format_version, "articles": self.articles}, fh, separators=(",", ":"))
+        os.replace(self.path + ".part", self.path)
+        os.replace(self.index_path + ".part", self.index_path)
+        print(f"📦 Packed {len(self.articles)} articles into {self.path} ({os.path.getsize(self.path)} bytes)") if VERBOSE else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._fh.close()
+            os.remove(self.path + ".part")
+
+def find_pack(indir):
+    """Return the pack path in `indir`, or None if the directory holds loose .txt files."""
+    path = os.path.join(indir, pack_name)
+    return path if os.path.exists(path) else None
+
+def read_index(path):
+    """Return {article_id: (offset, length)} from the index next to the pack at `path`."""
+    index_path = os.path.join(os.path.dirname(path), index_name)
+    with open(index_path) as fh:
+        index = json.load(fh)
+    if index.get("format") != format_name or index.get("version") != format_version:
+        raise ValueError(f"{index_path} is not a version {format_version} {format_name} index")
+    return {article_id: (offset, length) for article_id, offset, length in index["articles"]}
+
+def iter_articles(path):
+    """Stream (article_id, text) from a pack, in the order they were written."""
+    with gzip.open(path, "rt", encoding="utf-8") as fh:
+        for line in fh:
+            article = json.loads(line)
+            yield article["id"], article["text"]
+
+def read_article(path, article_id, index=None):
+    """Read a single article's text from a pack using its offset table (None if absent)."""
+    index = read_index(path) if index is None else index
+    if article_id not in index:
+        return None
+    offset, length = index[article_id]
+    with open(path, "rb") as fh:
+        fh.seek(offset)
+        member = fh.read(length)
+    return json.loads(gzip.decompress(member))["text"]
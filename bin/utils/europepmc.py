@@ -6,7 +6,12 @@ import os
 import re
 import glob
 import gzip
-import shutil
+import zlib
+import hashlib
+import tempfile
+import threading
+from bisect import bisect_right
+from urllib.parse import urlencode
 
 import random
 from http.client import IncompleteRead
@@ -16,7 +21,12 @@ import time
 import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
-from bs4 import BeautifulSoup
+
+from gbcutils import metrics
+from gbcutils import rate_limit
+from gbcutils import json_codec
+from gbcutils import profiling
+from gbcutils.rate_limit import RateLimiter, parse_retry_after, throttle_statuses
 
 VERBOSE = False
 retry_strategy = Retry(
@@ -40,24 +50,203 @@ session.headers.update({"User-Agent": "gbc-mentions/1.0"})
 max_retries = 5
 epmc_base_url = "https://www.ebi.ac.uk/europepmc/webservices/rest"
 
+# -----------------------
+# Optional shared rate limits
+# -----------------------
+
+# "api" : REST API requests ; "ftp" : OA bundle listing and downloads
+rate_limiters = {}
+max_throttle_retries = 8
+
+def enable_rate_limit(state_dir, api_rate=10, ftp_rate=2):
+    """
+    Limit requests to the Europe PMC API and FTP to `api_rate` / `ftp_rate` per second, in total across
+    every process sharing `state_dir` (see gbcutils.rate_limit), backing off together on 429 / 503.
+    Throttled responses are then retried here, at the shared rate, instead of by the session adapter.
+    """
+    rate_limit.VERBOSE = VERBOSE
+    rate_limiters["api"] = RateLimiter(os.path.join(state_dir, "europepmc_api.rate"), api_rate, name="europepmc_api")
+    rate_limiters["ftp"] = RateLimiter(os.path.join(state_dir, "europepmc_ftp.rate"), ftp_rate, name="europepmc_ftp")
+    rate_limited_adapter = HTTPAdapter(max_retries=retry_strategy.new(
+        status_forcelist=[s for s in retry_strategy.status_forcelist if s not in throttle_statuses],
+        respect_retry_after_header=False, # urllib3 retries any 429 / 503 with a Retry-After otherwise
+    ))
+    session.mount("https://", rate_limited_adapter)
+    session.mount("http://", rate_limited_adapter)
+    if VERBOSE:
+        print(f"🚦 Sharing Europe PMC rate limits in {state_dir} (API {api_rate}/s, FTP {ftp_rate}/s)")
+    return rate_limiters
+
+def _http_get(bucket, url, **kwargs):
+    """session.get, within the shared rate limit of `bucket` if one is enabled."""
+    limiter = rate_limiters.get(bucket)
+    for attempt in range(max_throttle_retries):
+        if limiter is not None:
+            limiter.acquire()
+        start = time.perf_counter()
+        response = session.get(url, **kwargs)
+        _record_http(response, time.perf_counter() - start)
+        if limiter is None:
+            return response
+        if response.status_code in throttle_statuses and attempt < max_throttle_retries - 1:
+            limiter.throttled(parse_retry_after(response.headers.get("Retry-After")))
+            response.close()
+            continue
+        if response.status_code < 500:
+            limiter.succeeded()
+        return response
+
+def _record_http(response, seconds):
+    """Record latency, status and adapter-level retries of a completed request."""
+    metrics.incr("http.requests")
+    metrics.incr(f"http.status.{response.status_code}")
+    metrics.observe("http.latency_s", seconds)
+    retries = getattr(getattr(response, "raw", None), "retries", None)
+    if retries is not None and retries.history:
+        metrics.incr("http.retries", len(retries.history))
+
+# -----------------------
+# Optional on-disk response cache
+# -----------------------
+
+class ResponseCache:
+    """
+    On-disk cache of successful API responses, keyed by URL and normalised query parameters, with one
+    gzipped JSON file per response. Entries older than `ttl` seconds are refetched, and the least
+    recently used entries are evicted once the cache grows past `max_bytes`. In `replay_only` mode
+    nothing is fetched or expired : a miss is an error, so reruns are deterministic and offline.
+    """
+    def __init__(self, cache_dir, ttl=None, max_bytes=None, replay_only=False):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.replay_only = replay_only
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._size = sum(os.path.getsize(f) for f in self._entries()) if max_bytes else 0
+
+    @staticmethod
+    def key(url, params=None):
+        """Cache key : the URL plus its query parameters, sorted and with unset (None) values dropped."""
+        items = sorted((str(k), str(v)) for k, v in (params or {}).items() if v is not None)
+        return f"{url}?{urlencode(items)}" if items else url
+
+    def _path(self, key):
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, digest[:2], f"{digest}.json.gz")
+
+    def _entries(self):
+        return glob.glob(os.path.join(self.cache_dir, "*", "*.json.gz"))
+
+    def get(self, url, params=None):
+        """Return (content_type, body) for a cached response, or None."""
+        path = self._path(self.key(url, params))
+        try:
+            if not self.replay_only and self.ttl is not None and time.time() - os.path.getmtime(path) > self.ttl:
+                return None
+            with gzip.open(path, "rb") as fh:
+                entry = json_codec.loads(fh.read())
+            os.utime(path, (time.time(), os.path.getmtime(path))) # access time drives LRU eviction
+        except (OSError, ValueError, EOFError):
+            return None
+        return entry["content_type"], entry["body"]
+
+    def put(self, url, params, content_type, body):
+        key = self.key(url, params)
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write to a temporary file and rename, so concurrent readers never see partial entries
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with gzip.open(os.fdopen(fd, "wb"), "wb") as fh:
+            fh.write(json_codec.dumpb({"key": key, "fetched": time.time(), "content_type": content_type, "body": body}))
+        os.replace(tmp_path, path)
+        if self.max_bytes:
+            with self._lock:
+                self._size += os.path.getsize(path)
+                if self._size > self.max_bytes:
+                    self._evict()
+
+    def _evict(self):
+        """Remove least recently used entries until the cache is back under 90% of `max_bytes`."""
+        entries = []
+        for f in self._entries():
+            try:
+                st = os.stat(f)
+                entries.append((st.st_atime, st.st_size, f))
+            except OSError:
+                continue
+        self._size = sum(e[1] for e in entries)
+        for _, size, f in sorted(entries):
+            if self._size <= 0.9 * self.max_bytes:
+                break
+            try:
+                os.remove(f)
+                self._size -= size
+                metrics.incr("http.cache_evictions")
+            except OSError:
+                pass
+
+response_cache = None
+
+def enable_response_cache(cache_dir, ttl=None, max_bytes=None, replay_only=False):
+    """Cache Europe PMC API responses (searches, page by page, and fulltext XML) under `cache_dir`."""
+    global response_cache
+    response_cache = ResponseCache(cache_dir, ttl=ttl, max_bytes=max_bytes, replay_only=replay_only)
+    if VERBOSE:
+        print(f"🗄️ Caching Europe PMC responses in {cache_dir}" + (" (replay only)" if replay_only else ""))
+    return response_cache
+
+def _cached_response(url, params=None):
+    """Return a cached (content_type, body), or None on a miss (or when no cache is enabled)."""
+    if response_cache is None:
+        return None
+    cached = response_cache.get(url, params)
+    metrics.incr("http.cache_hits" if cached is not None else "http.cache_misses")
+    return cached
+
+def _decode_response(content_type, body):
+    return json_codec.loads(body) if 'json' in content_type else body
+
 def query_europepmc(endpoint, request_params=None, no_exit=False):
     """
     Query Europe PMC REST API endpoint with retries.
+    Successful responses are served from / stored in the response cache, if one is enabled.
     """
     if not endpoint.startswith("http"):
         endpoint = f"{epmc_base_url}/{endpoint}"
 
+    cached = _cached_response(endpoint, request_params)
+    if cached is not None:
+        return _decode_response(*cached)
+    if response_cache is not None and response_cache.replay_only:
+        if no_exit:
+            return None
+        sys.exit(f"Error: {endpoint} ({ResponseCache.key(endpoint, request_params)}) is not in the response cache (replay only)")
+
     for attempt in range(max_retries):
         try:
-            response = session.get(endpoint, params=request_params, timeout=15)
+            response = _http_get("api", endpoint, params=request_params, timeout=15)
             if response.status_code == 200:
-                return response.json() if 'json' in response.headers.get('Content-Type', '') else response.text
+                content_type = response.headers.get('Content-Type', '')
+                if 'json' not in content_type:
+                    if response_cache is not None:
+                        response_cache.put(endpoint, request_params, content_type, response.text)
+                    return response.text
+                # decode the raw bytes : no intermediate str (or charset detection) for 1000-record pages
+                body = response.content
+                with metrics.timer("http.json_decode_s"):
+                    data = json_codec.loads(body)
+                if response_cache is not None:
+                    response_cache.put(endpoint, request_params, content_type, body.decode("utf-8"))
+                return data
             else:
                 if no_exit:
                     return None
                 else:
                     sys.exit(f"Error: {response.status_code} for {endpoint}")
-        except requests.RequestException as e:
+        except (requests.RequestException, ValueError) as e: # ValueError : a truncated or garbled JSON body
+            metrics.incr("http.errors")
+            metrics.incr("http.retries")
             print(f"⚠️ Request failed: {e}. Retrying ({attempt + 1}/{max_retries})...")
     sys.exit("Max retries exceeded.")
 
@@ -101,107 +290,342 @@ def epmc_search(query, result_type='core', limit=0, cursor=None, returncursor=Fa
     return (all_results, cursor) if returncursor else all_results
 
 
-# Robust .gz downloader with retries and gzip verification
+# Robust .gz downloader with retries, resume and streaming gzip verification
+class _GzipDecoder:
+    """
+    Incrementally decode a (possibly multi-member) gzip stream. zlib checks each member's CRC32 and
+    length trailer as the bytes arrive, so a download is verified in a single pass, and `copy` takes a
+    checkpoint of the decoder state to resume inflating from later (see _BundleIndex).
+    """
+    def __init__(self):
+        self._decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        self._in_member = False
+        self.members = 0
+        self.size = 0 # decompressed bytes
+
+    def feed(self, data):
+        """Decode `data`, returning the decompressed bytes (raises zlib.error on corrupt data)."""
+        out = []
+        while True:
+            if not self._in_member:
+                data = data.lstrip(b"\x00") # tolerate zero padding between/after members, as gzip does
+            if not data:
+                break
+            self._in_member = True
+            out.append(self._decoder.decompress(data))
+            self.size += len(out[-1])
+            if not self._decoder.eof:
+                break
+            self.members += 1
+            data = self._decoder.unused_data
+            self._decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            self._in_member = False
+        return b"".join(out)
+
+    def finish(self):
+        if self._in_member or not self.members:
+            raise _IncompleteDownload(f"gzip stream is truncated after {self.size} decompressed bytes")
+
+    def copy(self):
+        other = _GzipDecoder.__new__(_GzipDecoder)
+        other.__dict__.update(self.__dict__)
+        other._decoder = self._decoder.copy()
+        return other
+
+class _IncompleteDownload(OSError):
+    """The transfer ended early : short of Content-Length, or mid gzip member (resumable)."""
+
+class _RestartDownload(Exception):
+    """The partial file cannot be resumed (e.g. 416 Range Not Satisfiable)."""
+
+def _parse_content_range(value):
+    """Parse 'bytes <first>-<last>/<total>' into (first, total), with total None if unknown ('*')."""
+    m = re.match(r'^bytes (\d+)-\d+/(\d+|\*)$', (value or "").strip())
+    if not m:
+        return None, None
+    return int(m.group(1)), (int(m.group(2)) if m.group(2) != "*" else None)
+
 def _download_gz_with_retry(url: str, dest_gz: str, max_attempts: int = 6, chunk_size: int = 1 << 20) -> str:
-    """Download a .gz to dest_gz with retries and verify gzip integrity. Returns dest_gz on success."""
+    """
+    Download a .gz to dest_gz with retries, verifying it as it streams. Returns dest_gz on success.
+
+    Bytes go to `<dest_gz>.part` and through an incremental gzip decoder (checking the CRC32 and size
+    trailers) as they arrive, and the received length is checked against Content-Length. An interrupted
+    transfer resumes from the end of the partial file with an HTTP Range request (restarting from zero if
+    the server ignores it); corrupt data restarts the download. The file is only renamed to `dest_gz`
+    once complete and verified.
+    """
     os.makedirs(os.path.dirname(dest_gz), exist_ok=True)
+    part = dest_gz + ".part"
+    verifier, have = _GzipDecoder(), 0
 
+    if os.path.exists(part):
+        # left over from an interrupted run : replay it through the decoder, then resume after it
+        try:
+            with open(part, "rb") as fh:
+                for chunk in iter(lambda: fh.read(chunk_size), b""):
+                    verifier.feed(chunk)
+                    have += len(chunk)
+        except zlib.error:
+            os.remove(part)
+            verifier, have = _GzipDecoder(), 0
+
+    start = time.perf_counter()
+    downloaded = 0
     for attempt in range(1, max_attempts + 1):
         try:
             if VERBOSE:
-                print(f"[ftp]\t⬇️ GET {url} → {dest_gz} (attempt {attempt}/{max_attempts})")
-            # jitter to avoid thundering herd
-            time.sleep(random.uniform(0, 0.25))
-
-            with session.get(url, stream=True, timeout=(10, 180)) as r:
-                r.raise_for_status()
-                with open(dest_gz, "wb") as out:
+                resume = f" from byte {have}" if have else ""
+                print(f"[ftp]\t⬇️ GET {url} → {dest_gz}{resume} (attempt {attempt}/{max_attempts})")
+            if "ftp" not in rate_limiters:
+                # jitter to avoid thundering herd (the shared rate limit paces requests otherwise)
+                time.sleep(random.uniform(0, 0.25))
+
+            headers = {"Range": f"bytes={have}-"} if have else None
+            with _http_get("ftp", url, stream=True, timeout=(10, 180), headers=headers) as r:
+                first, total = _parse_content_range(r.headers.get("Content-Range")) if r.status_code == 206 else (None, None)
+                if have and r.status_code == 206 and first == have:
+                    metrics.incr("bundle.download_resumes")
+                    mode = "ab"
+                else:
+                    if have and r.status_code == 416:
+                        raise _RestartDownload(f"range bytes={have}- not satisfiable")
+                    r.raise_for_status()
+                    if have:
+                        print(f"[ftp]\t⚠️ {url} does not support resuming - restarting download") if VERBOSE else None
+                    verifier, have, mode = _GzipDecoder(), 0, "wb"
+                    length = r.headers.get("Content-Length")
+                    total = int(length) if length and "Content-Encoding" not in r.headers else None
+
+                with open(part, mode) as out:
                     for chunk in r.iter_content(chunk_size=chunk_size):
                         if chunk:
+                            verifier.feed(chunk)
                             out.write(chunk)
-
-            # Verify gzip integrity by fully reading
-            with gzip.open(dest_gz, "rb") as gz:
-                for _ in iter(lambda: gz.read(1 << 20), b""):
-                    pass
+                            have += len(chunk)
+                            downloaded += len(chunk)
+
+            if total is not None and have != total:
+                raise _IncompleteDownload(f"received {have} of {total} bytes")
+            verifier.finish()
+            os.replace(part, dest_gz)
+
+            metrics.incr("bundle.downloads")
+            metrics.incr("bundle.bytes_downloaded", downloaded)
+            metrics.observe("bundle.download_bytes", have, buckets=metrics.byte_buckets)
+            metrics.observe("bundle.download_s", time.perf_counter() - start)
             if VERBOSE:
-                print(f"[ftp]\t✅ Downloaded and verified {dest_gz}")
+                print(f"[ftp]\t✅ Downloaded and verified {dest_gz} ({have} bytes, {verifier.members} gzip member(s))")
             return dest_gz
-        except (requests.RequestException, ProtocolError, IncompleteRead, OSError, gzip.BadGzipFile) as e:
+        except (zlib.error, _RestartDownload) as e:
+            # corrupt data (or an unresumable partial file) : start again from zero
+            error = e
+            verifier, have = _GzipDecoder(), 0
             try:
-                if os.path.exists(dest_gz):
-                    os.remove(dest_gz)
+                os.remove(part)
             except OSError:
                 pass
-            if attempt == max_attempts:
-                raise
-            sleep_s = min(120, (2 ** (attempt - 1)) + random.uniform(0, 0.5))
-            if VERBOSE:
-                print(f"[ftp][retry] download failed: {e} — sleeping {sleep_s:.1f}s")
-            time.sleep(sleep_s)
+        except (requests.RequestException, ProtocolError, IncompleteRead, OSError) as e:
+            # keep the partial file and resume from its end, unless it is out of step with the decoder
+            error = e
+            if not os.path.exists(part) or os.path.getsize(part) != have:
+                verifier, have = _GzipDecoder(), 0
+                try:
+                    os.remove(part)
+                except OSError:
+                    pass
+
+        metrics.incr("bundle.download_failures")
+        if attempt == max_attempts:
+            raise error
+        sleep_s = min(120, (2 ** (attempt - 1)) + random.uniform(0, 0.5))
+        if VERBOSE:
+            print(f"[ftp][retry] download failed: {error} — sleeping {sleep_s:.1f}s")
+        time.sleep(sleep_s)
+
+# one lock per bundle : concurrent fetches must not download or index the same bundle twice
+_bundle_locks = {}
+_bundle_locks_guard = threading.Lock()
+
+def _bundle_lock(path):
+    with _bundle_locks_guard:
+        return _bundle_locks.setdefault(os.path.abspath(path), threading.Lock())
+
+# <article-id pub-id-type="pmcid">PMC7616738</article-id>, <article-id pub-id-type="pmc">7616738</article-id>, ...
+_article_pmcid_pattern = re.compile(
+    rb'<article-id[^>]*pub-id-type="pmc(?:id)?"[^>]*>\s*(?:PMC)?(\d+)\s*</article-id>',
+    re.IGNORECASE | re.DOTALL,
+)
+
+# decompressed bytes between the decoder checkpoints of a .gz bundle index
+checkpoint_spacing = 1 << 21 # 2 MiB (each checkpoint holds ~40 KiB of zlib state)
+# bundle indices kept in memory (a chunk of articles rarely spans more than a few bundles)
+max_bundle_indices = 8
+
+class _BundleIndex:
+    """
+    Offsets of every article in a combined XML bundle (.xml or .xml.gz), built in one streaming pass.
+
+    For .gz bundles nothing is decompressed to disk : the pass also keeps a copy of the gzip decoder
+    state every `checkpoint_spacing` decompressed bytes, so an article is later extracted by seeking
+    to the nearest checkpoint before it and inflating from there, not from the start of the bundle.
+    Checkpoints are zlib objects and only live in memory (Python's zlib cannot restart inflating at an
+    arbitrary bit offset, which a persisted zran-style index would need).
+    """
+    read_size = 1 << 16 # checkpoints fall on read boundaries
+
+    def __init__(self, path):
+        self.path = path
+        self.compressed = path.endswith(".gz")
+        st = os.stat(path)
+        self.stat = (st.st_size, st.st_mtime)
+        self.articles = {} # { '7616738': (start, end) } offsets in the (decompressed) XML
+        self.checkpoint_offsets = [0] # XML offset of each checkpoint
+        self.checkpoints = [(0, _GzipDecoder())] # (file offset, decoder state) of each checkpoint
+        with metrics.timer("bundle.index_s"):
+            self._build()
+        metrics.incr("bundle.indexed")
+        metrics.incr("bundle.articles_indexed", len(self.articles))
+        print(f"[bundle]\t🗂️ Indexed {len(self.articles)} articles in {os.path.basename(path)}") if VERBOSE else None
+
+    def _read(self, fh):
+        """Yield the XML of the bundle in chunks, taking decoder checkpoints along the way (.gz only)."""
+        if not self.compressed:
+            yield from iter(lambda: fh.read(self.read_size), b"")
+            return
+        decoder, offset = _GzipDecoder(), 0
+        for data in iter(lambda: fh.read(self.read_size), b""):
+            xml = decoder.feed(data)
+            metrics.incr("bundle.bytes_inflated", len(xml))
+            yield xml
+            offset += len(xml)
+            if offset - self.checkpoint_offsets[-1] >= checkpoint_spacing:
+                self.checkpoint_offsets.append(offset)
+                self.checkpoints.append((fh.tell(), decoder.copy()))
+        if decoder._in_member:
+            raise EOFError(f"{self.path} is truncated")
+
+    def _lines(self, fh):
+        """Yield (offset, line) for each line of the XML."""
+        offset, tail = 0, b""
+        for data in self._read(fh):
+            lines = (tail + data).split(b"\n")
+            tail = lines.pop()
+            for line in lines:
+                yield offset, line
+                offset += len(line) + 1
+        if tail:
+            yield offset, tail
+
+    def _build(self):
+        # articles start on a line containing "<article" and end on a line containing "</article>"
+        inside_article, buffer, start = False, [], 0
+        with open(self.path, "rb") as fh:
+            for offset, line in self._lines(fh):
+                if not inside_article:
+                    if b"<article" in line:
+                        inside_article, buffer, start = True, [line], offset
+                    continue
+                buffer.append(line)
+                if b"</article>" in line:
+                    end = offset + len(line) + 1
+                    for m in _article_pmcid_pattern.finditer(b"\n".join(buffer)):
+                        self.articles.setdefault(m.group(1).decode(), (start, end))
+                    inside_article, buffer = False, []
+
+    def extract(self, pmcid_num):
+        """Return the <article> XML for `pmcid_num`, or None if it is not in this bundle."""
+        span = self.articles.get(str(pmcid_num))
+        if span is None:
+            return None
+        start, end = span
+        with metrics.timer("bundle.extract_s"), open(self.path, "rb") as fh:
+            if not self.compressed:
+                fh.seek(start)
+                return fh.read(end - start).decode("utf-8")
+            i = bisect_right(self.checkpoint_offsets, start) - 1
+            offset = self.checkpoint_offsets[i]
+            file_offset, decoder = self.checkpoints[i]
+            decoder = decoder.copy()
+            fh.seek(file_offset)
+            parts = []
+            while offset < end:
+                data = fh.read(self.read_size)
+                if not data:
+                    raise EOFError(f"{self.path} is truncated")
+                xml = decoder.feed(data)
+                metrics.incr("bundle.bytes_inflated", len(xml))
+                parts.append(xml[max(start - offset, 0):max(end - offset, 0)])
+                offset += len(xml)
+        return b"".join(parts).decode("utf-8")
+
+_bundle_indices = {}
+_bundle_indices_guard = threading.Lock()
+
+def _bundle_index(path):
+    """The (cached) _BundleIndex of the bundle at `path`, rebuilt if the file has changed."""
+    key = os.path.abspath(path)
+    st = os.stat(path)
+    with _bundle_lock(re.sub(r'\.gz$', '', path)):
+        index = _bundle_indices.get(key)
+        if index is None or index.stat != (st.st_size, st.st_mtime):
+            index = _BundleIndex(path)
+            with _bundle_indices_guard:
+                _bundle_indices[key] = index
+                while len(_bundle_indices) > max_bundle_indices:
+                    _bundle_indices.pop(next(iter(_bundle_indices)))
+    return index
 
 def _extract_article_from_combined_xml(big_xml, pmcid):
     """
-    Given a combined XML path, extract the <article> block for the matching PMCID.
+    Given a combined XML path (.xml or .xml.gz), extract the <article> block for the matching PMCID.
     Matches either of the following (whitespace/newlines tolerated):
       <article-id pub-id-type="pmcid">PMC7616738</article-id>
       <article-id pub-id-type="pmc">PMC7616738</article-id>
       <article-id pub-id-type="pmcid">7616738</article-id>
+    The bundle is indexed on first use, so further articles from it are extracted without a full scan.
     """
     pmcid_num = str(pmcid[3:] if str(pmcid).startswith("PMC") else pmcid)
-    pmcid_full = f"PMC{pmcid_num}"
-    # Regex that tolerates attributes in any order and newlines/whitespace inside the tag.
-    # We compile two patterns: one that expects the PMC prefix and one without, then test both.
-    patt_with_prefix = re.compile(
-        rf"<article-id[^>]*pub-id-type=\"pmc(?:id)?\"[^>]*>\s*{re.escape(pmcid_full)}\s*</article-id>",
-        re.IGNORECASE | re.DOTALL,
-    )
-    patt_no_prefix = re.compile(
-        rf"<article-id[^>]*pub-id-type=\"pmc(?:id)?\"[^>]*>\s*{re.escape(pmcid_num)}\s*</article-id>",
-        re.IGNORECASE | re.DOTALL,
-    )
-
-    inside_article = False
-    buffer = []
-    with open(big_xml, "r", encoding="utf-8") as infile:
-        for line in infile:
-            if not inside_article and "<article" in line:
-                inside_article = True
-                buffer = [line]
-                continue
-            if inside_article:
-                buffer.append(line)
-                if "</article>" in line:
-                    article_xml = "".join(buffer)
-                    if patt_with_prefix.search(article_xml) or patt_no_prefix.search(article_xml):
-                        if VERBOSE:
-                            print(f"\t✅ Matched PMCID {pmcid_full} in {os.path.basename(big_xml)}")
-                        return article_xml
-                    inside_article = False
-                    buffer = []
-
-    sys.stderr.write(f"PMCID {pmcid_num} not found in {big_xml}\n")
-    return None
-
-def _safe_samefile(a, b):
-    try:
-        return os.path.samefile(a, b)
-    except FileNotFoundError:
-        return False
-
-def _ensure_decompressed(gz_path: str, xml_path: str):
-    """Decompress only if xml doesn't exist or gz is newer."""
-    if os.path.exists(xml_path) and os.path.getmtime(xml_path) >= os.path.getmtime(gz_path):
-        return xml_path
-    with gzip.open(gz_path, 'rb') as src, open(xml_path, 'wb') as out_f:
-        shutil.copyfileobj(src, out_f)
-    return xml_path
+    article_xml = _bundle_index(big_xml).extract(pmcid_num)
+    if article_xml is None:
+        sys.stderr.write(f"PMCID {pmcid_num} not found in {big_xml}\n")
+    elif VERBOSE:
+        print(f"\t✅ Matched PMCID PMC{pmcid_num} in {os.path.basename(big_xml)}")
+    return article_xml
+
+# cache of per-path indices: { path: [(12345, 12399, '/path/PMC12345_PMC12399.xml[.gz]'), ...] } sorted by range
+pmc_file_index_by_path = {}
 
+def _find_range(ranges, pmcid_num):
+    """The (first, last, name) entry of sorted, non-overlapping `ranges` holding `pmcid_num`, or None."""
+    i = bisect_right(ranges, (pmcid_num, float("inf"))) - 1
+    if i >= 0 and ranges[i][0] <= pmcid_num <= ranges[i][1]:
+        return ranges[i]
+    return None
 
-# cache of per-path indices: { path: { 'PMC12345': '/path/PMC12345_PMC12399.xml[.gz]' } }
-pmc_file_index_by_path = {}
+def _local_bundle_ranges(path):
+    ranges = []
+    for f in glob.glob(os.path.join(path, "PMC*_PMC*.xml*")):
+        base = os.path.basename(f)
+        m = re.match(r'^PMC(\d+)_PMC(\d+)\.xml(?:\.gz)?$', base)
+        if not m:
+            print(f"[local]\t❌ Skipping {base} - does not match expected pattern") if VERBOSE else None
+            continue
+        start, end = map(int, m.groups())
+        ranges.append((start, end, f))
+    ranges.sort()
+    return ranges
+
+def bundle_ranges(path=None):
+    """
+    Sorted (first, last, bundle) PMCID ranges of the OA bundles under `path` (bundle paths), or of the
+    Europe PMC FTP listing (bundle file names) if no path is given. See PMCIDSet.split_by_ranges.
+    """
+    if path:
+        return _local_bundle_ranges(path)
+    return _get_epmc_index()[1]
 
-def _find_local_fulltext(pmcid, path, dest='/tmp'):
+def _find_local_fulltext(pmcid, path):
     """
     Given a path to a directory containing Europe PMC XML files,
     find the full text XML for a given PMCID.
@@ -210,76 +634,66 @@ def _find_local_fulltext(pmcid, path, dest='/tmp'):
     as provided by Europe PMC : <https://europepmc.org/ftp/oa/>
 
     Identify the correct file by checking the PMCID range in the filename,
-    then extract and return the matching article.
+    then extract and return the matching article (streamed from the bundle, compressed or not).
+    """
+    f = _local_bundle_file(pmcid, path)
+    if not f:
+        return None
+    pmcid_num = int(pmcid[3:] if str(pmcid).startswith("PMC") else pmcid)
+    return _extract_article_from_combined_xml(f, pmcid_num)
+
+def _local_bundle_file(pmcid, path, rescan=True):
+    """
+    Return the local bundle (.xml or .xml.gz) under `path` whose PMCID range holds `pmcid`, or None.
+    `path` is indexed on first use, and indexed again on a miss unless `rescan` is False.
     """
     global pmc_file_index_by_path
-    pmcid = f"PMC{pmcid[3:]}" if str(pmcid).startswith("PMC") else f"PMC{pmcid}"
+    pmcid_num = int(pmcid[3:] if str(pmcid).startswith("PMC") else pmcid)
+    pmcid = f"PMC{pmcid_num}"
 
     # ensure we have an index for this path, and index both .xml and .xml.gz bundles
     index = pmc_file_index_by_path.get(path)
-    print(f"[local] files indexed for {path}:", set(index.values()) if index else []) if VERBOSE else None
-    f = index.get(pmcid) if index else None
+    print(f"[local] files indexed for {path}:", [r[2] for r in index] if index else []) if VERBOSE else None
+    found = _find_range(index, pmcid_num) if index else None
 
-    if not index or not f:
+    if not found and (rescan or index is None):
+        # (re)build : bundles may have been downloaded since the index was built
         print(f"[local] Building index for {path}") if VERBOSE else None
-        index = {}
-        for f in glob.glob(os.path.join(path, "PMC*_PMC*.xml*")):
-            base = os.path.basename(f)
-            m = re.match(r'^PMC(\d+)_PMC(\d+)\.xml(?:\.gz)?$', base)
-            if not m:
-                print(f"[local]\t❌ Skipping {base} - does not match expected pattern") if VERBOSE else None
-                continue
-            start, end = map(int, m.groups())
-            for x in range(start, end + 1):
-                index[f"PMC{x}"] = f
+        index = _local_bundle_ranges(path)
         pmc_file_index_by_path[path] = index
-
-        f = index.get(pmcid)
+        found = _find_range(index, pmcid_num)
+    f = found[2] if found else None
 
     if not f:
         print(f"[local]\t❌ No matching file found for PMCID {pmcid} in {path}") if VERBOSE else None
         return None
     else:
         print(f"[local]\t✅ Found bundle {os.path.basename(f)} for {pmcid}") if VERBOSE else None
-
-    # If it's a .gz, decompress into dest only if needed
-    if f.endswith('.gz'):
-        gz_dest = f if os.path.dirname(f) == dest else os.path.join(dest, os.path.basename(f))
-        if not _safe_samefile(f, gz_dest):
-            os.makedirs(dest, exist_ok=True)
-            print(f"[local]\t📥 Caching {f} → {gz_dest}") if VERBOSE else None
-            if os.path.exists(f) and os.path.dirname(f) != dest:
-                shutil.copy2(f, gz_dest)
-            else:
-                # if f is already in dest, just keep gz_dest = f
-                pass
-        xml_path = os.path.join(dest, os.path.basename(f)[:-3])
-        f_xml = _ensure_decompressed(gz_dest, xml_path)
-    else:
-        # plain .xml: copy only if different location
-        if os.path.dirname(f) != dest:
-            copied = os.path.join(dest, os.path.basename(f))
-            if not _safe_samefile(f, copied):
-                os.makedirs(dest, exist_ok=True)
-                if VERBOSE: print(f"[local]\t📥 Copying {f} → {copied}")
-                shutil.copy2(f, copied)
-            f_xml = copied
-        else:
-            f_xml = f
-
-    pmcid_num = int(pmcid[3:])
-    return _extract_article_from_combined_xml(f_xml, pmcid_num)
-
+    return f
 
 _epmc_index = None
+_epmc_index_lock = threading.Lock()
 
 def _get_epmc_index(ftp_address="https://europepmc.org/pub/databases/pmc/oa/"):
+    with _epmc_index_lock: # fetch the listing once, even with several fetches in flight
+        return _load_epmc_index(ftp_address)
+
+def _load_epmc_index(ftp_address):
     global _epmc_index
     if _epmc_index is not None:
         return _epmc_index
-    r = session.get(ftp_address, timeout=30)
-    r.raise_for_status()
-    soup = BeautifulSoup(r.text, "html.parser")
+    from bs4 import BeautifulSoup
+
+    cached = _cached_response(ftp_address)
+    if cached is not None:
+        listing = cached[1]
+    else:
+        r = _http_get("ftp", ftp_address, timeout=30)
+        r.raise_for_status()
+        listing = r.text
+        if response_cache is not None:
+            response_cache.put(ftp_address, None, r.headers.get('Content-Type', ''), listing)
+    soup = BeautifulSoup(listing, "html.parser")
     idx = []
     for a in soup.find_all("a"):
         href = a.get("href")
@@ -298,37 +712,85 @@ def _find_europepmc_ftp_fulltext(pmcid, ftp_address="https://europepmc.org/pub/d
     as provided by Europe PMC : <https://europepmc.org/pub/databases/pmc/oa/>
 
     Identify the correct file by checking the PMCID range in the filename,
-    then extract and return the matching article.
+    then extract and return the matching article (streamed from the compressed bundle).
     """
-    pmcid_num = pmcid[3:] if str(pmcid).startswith("PMC") else pmcid  # remove 'PMC' prefix
+    gz_path = _ftp_bundle(pmcid, ftp_address=ftp_address, dest=dest)
+    if not gz_path:
+        return None
+    pmcid_num = int(pmcid[3:] if str(pmcid).startswith("PMC") else pmcid)
+    return _extract_article_from_combined_xml(gz_path, pmcid_num)
+
+def _ftp_bundle_file(pmcid, ftp_address="https://europepmc.org/pub/databases/pmc/oa/"):
+    """Return (base_url, bundle file name) of the FTP bundle whose PMCID range holds `pmcid`, or None."""
     pmcid_num = int(pmcid[3:] if str(pmcid).startswith("PMC") else pmcid)
     base, idx = _get_epmc_index(ftp_address)
 
     # pick the single bundle containing pmcid_num
-    pmc_file = None
-    # binary search would be nicer, but linear is fine once per task
-    for start, end, fname in idx:
-        if start <= pmcid_num <= end:
-            pmc_file = fname
-            break
+    found = _find_range(idx, pmcid_num)
+    pmc_file = found[2] if found else None
     if not pmc_file:
         print(f"[ftp]\t❌ No matching file found for PMCID {pmcid}") if VERBOSE else None
         return None
+    return base, pmc_file
+
+def _ftp_bundle(pmcid, ftp_address="https://europepmc.org/pub/databases/pmc/oa/", dest='/tmp'):
+    """Download the FTP bundle holding `pmcid` into `dest` (once) and return its .xml.gz path, or None."""
+    found = _ftp_bundle_file(pmcid, ftp_address)
+    if not found:
+        return None
+    base, pmc_file = found
 
     gz_dest  = os.path.join(dest, pmc_file)
     xml_dest = os.path.join(dest, pmc_file[:-3])
     os.makedirs(dest, exist_ok=True)
 
-    # download only if missing
-    if not os.path.exists(gz_dest) or os.path.getsize(gz_dest) == 0:
-        if VERBOSE: print(f"[ftp]\t📥 Downloading {base}/{pmc_file} → {gz_dest}")
-        _download_gz_with_retry(f"{base}/{pmc_file}", gz_dest)
+    with _bundle_lock(xml_dest):
+        # a bundle decompressed by an earlier version of this pipeline
+        if os.path.exists(xml_dest) and not os.path.exists(gz_dest):
+            return xml_dest
+
+        # download only if missing (another thread may have fetched it while we waited for the lock) ;
+        # the bundle stays compressed : articles are streamed out of it
+        if not os.path.exists(gz_dest) or os.path.getsize(gz_dest) == 0:
+            if VERBOSE: print(f"[ftp]\t📥 Downloading {base}/{pmc_file} → {gz_dest}")
+            _download_gz_with_retry(f"{base}/{pmc_file}", gz_dest)
+
+    return gz_dest
 
-    # decompress only if needed
-    xml_path = _ensure_decompressed(gz_dest, xml_dest)
-    os.remove(gz_dest)  # remove the .gz file after decompression
+def _ftp_allowed():
+    return not (response_cache is not None and response_cache.replay_only)
+
+def bundle_name(pmcid, path=None, dest='/tmp'):
+    """
+    Name of the OA bundle expected to hold `pmcid` (checking local bundles, then the FTP listing),
+    or None if the article will come from the fullTextXML API. Used to group articles by bundle.
+    Local bundles are not indexed again for each miss : bundles downloaded since are in the FTP listing.
+    """
+    f = _local_bundle_file(pmcid, path or dest, rescan=False)
+    if f:
+        return re.sub(r'\.gz$', '', os.path.basename(f))
+    if _ftp_allowed():
+        try:
+            found = _ftp_bundle_file(pmcid)
+        except requests.RequestException as e:
+            print(f"[ftp]\t⚠️ Could not list FTP bundles: {e}") if VERBOSE else None
+            return None
+        if found:
+            return found[1][:-3]
+    return None
 
-    return _extract_article_from_combined_xml(xml_path, pmcid_num)
+def prefetch_bundle(pmcid, path=None, dest='/tmp'):
+    """
+    Make the bundle holding `pmcid` available (downloading it from the Europe PMC FTP into `dest` if
+    needed) and index its articles, so that later `fetch_fulltext_xml` calls only have to seek to them.
+    Returns the bundle path, or None if there is no bundle for `pmcid`.
+    """
+    bundle = _local_bundle_file(pmcid, path or dest)
+    if not bundle and _ftp_allowed():
+        bundle = _ftp_bundle(pmcid, dest=dest)
+    if bundle:
+        _bundle_index(bundle)
+    return bundle
 
 def get_fulltext_body(pmcid, path=None, dest='/tmp'):
     """
@@ -336,15 +798,32 @@ def get_fulltext_body(pmcid, path=None, dest='/tmp'):
     If a local path is provided, it will first check for a local XML file.
     If not found, it will download the XML from Europe PMC.
     """
+    return parse_fulltext_xml(fetch_fulltext_xml(pmcid, path=path, dest=dest))
+
+def article_text(text_blocks, table_blocks):
+    """Join parsed text and table blocks into the plain article text the classifier reads ("" if empty)."""
+    text = ""
+    if text_blocks:
+        text += "\n\n".join(text_blocks) + "\n"
+    if table_blocks:
+        text += "\n\n".join(table_blocks) + "\n"
+    return text
+
+def fetch_fulltext_xml(pmcid, path=None, dest='/tmp'):
+    """
+    The I/O half of `get_fulltext_body` : return the <article> XML for `pmcid` (or None), from a local
+    bundle, an Europe PMC FTP bundle or the fullTextXML API, in that order. Safe to call from several
+    threads at once (bundle downloads and indexing are serialised per bundle).
+    """
     xml = None
     path = path or dest # check for files downloaded from FTP or local XMLs
     if path:
         # find the matching record in the filesystem
         if VERBOSE: print(f"[local] Searching {path} for full text XML for {pmcid}")
-        xml = _find_local_fulltext(pmcid, path, dest=dest)
+        xml = _find_local_fulltext(pmcid, path)
 
-    if not xml:
-        # if not found locally, try the EuropePMC FTP
+    if not xml and _ftp_allowed():
+        # if not found locally, try the EuropePMC FTP (bundles are not held in the response cache)
         if VERBOSE: print(f"[ftp] Searching EuropePMC FTP for full text XML for {pmcid}")
         xml = _find_europepmc_ftp_fulltext(pmcid, dest=dest)
 
@@ -352,15 +831,36 @@ def get_fulltext_body(pmcid, path=None, dest='/tmp'):
         # 1. Download the XML
         if VERBOSE: print(f"[api] Querying EuropePMC's API for full text XML for {pmcid}")
         url = f"{epmc_base_url}/{pmcid}/fullTextXML"
-        response = requests.get(url)
-        if response.status_code != 200:
-            return (None, None)
-        xml = response.text
-
+        cached = _cached_response(url)
+        if cached is not None:
+            xml = cached[1]
+        elif response_cache is not None and response_cache.replay_only:
+            return None
+        else:
+            try:
+                response = _http_get("api", url, timeout=(10, 60))
+            except requests.RequestException as e:
+                print(f"⚠️ fullTextXML request failed for {pmcid}: {e}") if VERBOSE else None
+                return None
+            if response.status_code != 200:
+                return None
+            xml = response.text
+            if response_cache is not None:
+                response_cache.put(url, None, response.headers.get('Content-Type', ''), xml)
+
+    return xml or None
+
+def parse_fulltext_xml(xml):
+    """The CPU half of `get_fulltext_body` : parse article XML into (text_blocks, table_blocks)."""
     if not xml:
         return (None, None)
+    with profiling.section("xml_parse"):
+        return _parse_fulltext_xml(xml)
+
+def _parse_fulltext_xml(xml):
 
     # 2. Parse with BeautifulSoup
+    from bs4 import BeautifulSoup
     if VERBOSE:
         print("\n🎉 XML found! Parsing text and tables from XML body")
     soup = BeautifulSoup(xml, "lxml-xml")
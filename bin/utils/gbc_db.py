@@ -1,11 +1,11 @@
 #!/usr/bin/env python3
 
-from google.cloud.sql.connector import Connector
-import pymysql
-import sqlalchemy as db
-
-
 def get_gbc_connection(test=False, readonly=True, sqluser="gbcreader", sqlpass=None):
+    # imported here : the Cloud SQL connector is slow to import, and only needed once we connect
+    from google.cloud.sql.connector import Connector
+    import pymysql
+    import sqlalchemy as db
+
     if not readonly and not sqlpass:
         raise ValueError("You must provide a SQL user credentials if not in readonly mode.")
 
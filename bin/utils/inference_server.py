@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+
+"""
+Long-lived local inference server for the SciBERT resource classifier.
+
+The server loads the model once and listens on a Unix socket. Requests from many concurrent
+classifier processes are queued per candidate and grouped into dynamic batches : a batch is run as
+soon as it reaches `max_batch_size` candidates, or `max_latency_ms` after its first candidate arrived.
+
+The protocol is newline-delimited JSON :
+    {"op": "ping"}                                             -> {"ok": true, "model": "/path/to/model"}
+    {"op": "classify", "id": ..., "pairs": [[sentence, alias, resource], ...],
+     "window": null, "spans": null}                            -> {"ok": true, "predictions": [...]}
+Predictions are the same records returned by `classify_mentions`. Classifier processes use the
+server through `RemoteClassifier`, which falls back to in-process inference if the server goes away.
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import signal
+import socket
+import tempfile
+import threading
+import socketserver
+
+from gbcutils import metrics
+
+VERBOSE = False
+
+default_socket_path = os.environ.get(
+    "GBC_INFERENCE_SOCKET", os.path.join(tempfile.gettempdir(), f"gbc_scibert_{os.getuid()}.sock")
+)
+
+# -----------------------
+# Client
+# -----------------------
+
+def _request(payload, socket_path=None, timeout=600):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socket_path or default_socket_path)
+        with sock.makefile("rwb") as fh:
+            fh.write((json.dumps(payload) + "\n").encode("utf-8"))
+            fh.flush()
+            response = json.loads(fh.readline())
+    if not response.get("ok"):
+        raise RuntimeError(f"Inference server error: {response.get('error')}")
+    return response
+
+def inference_server_available(socket_path=None, model_path=None):
+    """
+    Return True if an inference server is listening on `socket_path` (and, if `model_path` is
+    given, is serving that model).
+    """
+    socket_path = socket_path or default_socket_path
+    if not os.path.exists(socket_path):
+        return False
+    try:
+        response = _request({"op": "ping"}, socket_path=socket_path, timeout=5)
+    except (OSError, ValueError, RuntimeError):
+        return False
+    if model_path and os.path.realpath(response.get("model", "")) != os.path.realpath(model_path):
+        print(f"⚠️ Inference server on {socket_path} is serving {response.get('model')}, not {model_path}") if VERBOSE else None
+        return False
+    return True
+
+def classify_mentions_remote(this_id, candidate_pairs, tokenizer=None, model=None, device=None, window=None, spans=None, socket_path=None):
+    """
+    Drop-in replacement for `classify_mentions` that sends the candidates to the inference server.
+    `tokenizer`, `model` and `device` are accepted for compatibility and ignored.
+    """
+    if not candidate_pairs:
+        return []
+    payload = {"op": "classify", "id": this_id, "pairs": [list(p) for p in candidate_pairs], "window": window, "spans": spans}
+    with metrics.timer("classify.remote_s"):
+        predictions = _request(payload, socket_path=socket_path)["predictions"]
+    metrics.incr("classify.candidates", len(candidate_pairs))
+    return predictions
+
+class RemoteClassifier:
+    """
+    Drop-in replacement for `classify_mentions` that uses the inference server while it answers. If a
+    request fails (the server stopped, restarted or returned an error), `model_path` is loaded and the
+    rest of the run is classified in-process instead.
+    """
+
+    def __init__(self, model_path, socket_path=None):
+        self.model_path = model_path
+        self.socket_path = socket_path or default_socket_path
+        self._local = None # (tokenizer, model, device), once fallen back
+        self._lock = threading.Lock()
+
+    def _fall_back(self, error):
+        from gbcutils.scibert_classify import load_model
+
+        with self._lock:
+            if self._local is None:
+                print(f"⚠️ Inference server on {self.socket_path} failed ({error}) - loading {self.model_path} to classify in-process", file=sys.stderr)
+                metrics.incr("classify.server_fallbacks")
+                self._local = load_model(self.model_path)
+        return self._local
+
+    def __call__(self, this_id, candidate_pairs, tokenizer=None, model=None, device=None, window=None, spans=None):
+        from gbcutils.scibert_classify import classify_mentions
+
+        local = self._local
+        if local is None:
+            try:
+                return classify_mentions_remote(this_id, candidate_pairs, window=window, spans=spans, socket_path=self.socket_path)
+            except (OSError, ValueError, RuntimeError) as e:
+                local = self._fall_back(e)
+        (tokenizer, model, device) = local
+        return classify_mentions(this_id, candidate_pairs, tokenizer=tokenizer, model=model, device=device, window=window, spans=spans)
+
+# -----------------------
+# Server
+# -----------------------
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                if request.get("op") == "ping":
+                    response = {"ok": True, "model": self.server.model_path}
+                elif request.get("op") == "classify":
+                    predictions = self.server.classify(request["id"], [tuple(p) for p in request["pairs"]], request.get("window"), request.get("spans"))
+                    response = {"ok": True, "predictions": predictions}
+                else:
+                    response = {"ok": False, "error": f"unknown op {request.get('op')!r}"}
+            except Exception as e:
+                response = {"ok": False, "error": repr(e)}
+            self.wfile.write((json.dumps(response) + "\n").encode("utf-8"))
+            self.wfile.flush()
+
+class _InferenceServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def serve(model_path, socket_path=None, max_batch_size=32, max_latency_ms=10, num_threads=1, metrics_out=None):
+    """
+    Load the model and serve classification requests on `socket_path` until interrupted.
+    If `metrics_out` is given, batch metrics are written there on shutdown.
+    """
+    import torch
+    from gbcutils.scibert_classify import load_model, pretokenize_pairs, pad_batch, prediction_record
+
+    socket_path = socket_path or default_socket_path
+    (tokenizer, model, device) = load_model(model_path, num_threads=num_threads)
+    pending = queue.Queue()
+    tokenizer_lock = threading.Lock()
+    stats = {"batches": 0, "candidates": 0}
+
+    def _batcher():
+        while True:
+            batch = [pending.get()]
+            deadline = time.monotonic() + max_latency_ms / 1000
+            while len(batch) < max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(pending.get(timeout=timeout))
+                except queue.Empty:
+                    break
+
+            try:
+                inputs = pad_batch(tokenizer, [b[0] for b in batch], [b[1] for b in batch])
+                inputs = {k: v.to(device) for k, v in inputs.items()}
+                metrics.observe("server.batch_size", len(batch), buckets=metrics.size_buckets)
+                with torch.no_grad(), metrics.timer("server.forward_s"):
+                    probs = torch.nn.functional.softmax(model(**inputs).logits, dim=-1).cpu()
+                for (_, _, slot), p in zip(batch, probs):
+                    slot["probs"] = p
+                    slot["done"].set()
+            except Exception as e:
+                for _, _, slot in batch:
+                    slot["error"] = e
+                    slot["done"].set()
+
+            stats["batches"] += 1
+            stats["candidates"] += len(batch)
+            metrics.incr("server.candidates", len(batch))
+            if VERBOSE and stats["batches"] % 100 == 0:
+                print(f"\t📊 {stats['batches']} batches, mean size {stats['candidates'] / stats['batches']:.1f}")
+
+    def _classify(this_id, candidate_pairs, window=None, spans=None):
+        with tokenizer_lock:
+            encoded = pretokenize_pairs(tokenizer, candidate_pairs, window=window, spans=spans)
+        slots = []
+        for ids, types in zip(encoded["input_ids"], encoded["token_type_ids"]):
+            slot = {"done": threading.Event()}
+            pending.put((ids, types, slot))
+            slots.append(slot)
+
+        predictions = []
+        for (sentence, alias, resource), slot in zip(candidate_pairs, slots):
+            slot["done"].wait()
+            if "error" in slot:
+                raise slot["error"]
+            pred = int(slot["probs"].argmax().item())
+            predictions.append(prediction_record(this_id, sentence, alias, resource, pred, slot["probs"][pred].item()))
+        return predictions
+
+    threading.Thread(target=_batcher, daemon=True).start()
+
+    if os.path.exists(socket_path):
+        if inference_server_available(socket_path):
+            sys.exit(f"An inference server is already listening on {socket_path}")
+        os.remove(socket_path) # stale socket from a previous server
+    server = _InferenceServer(socket_path, _RequestHandler)
+    server.model_path = os.path.realpath(model_path)
+    server.classify = _classify
+    metrics.define_rate("server.candidates_per_s", "server.candidates", "server.forward_s")
+    # shut down cleanly (removing the socket) when the task or scheduler sends SIGTERM
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    print(f"🚀 Serving {model_path} on {socket_path} (max batch {max_batch_size}, max latency {max_latency_ms}ms)", flush=True)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        if metrics_out:
+            metrics.dump(metrics_out, task="scibert_inference_server")
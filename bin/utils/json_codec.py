@@ -0,0 +1,83 @@
+"""
+JSON encoding and decoding for the hot paths : Europe PMC search pages, metadata shards and their lookups.
+
+Uses orjson when it is installed and the standard library `json` otherwise (or the backend named by
+the GBC_JSON environment variable, or `use()`). Both backends read UTF-8 bytes directly, so callers
+can hand over response bodies and binary file lines without decoding them to str first, and both
+write compact, non-ASCII-escaped UTF-8 : their outputs parse to the same values, whichever wrote them.
+
+Decoding a large document allocates hundreds of thousands of containers, and the cyclic garbage
+collector would run over and over while they are built (most of the time spent on a 1000-record
+`core` page) : `loads` pauses it for bodies over `gc_pause_size` bytes, and `gc_paused()` does so
+around other bulk decoding such as loading a metadata shard. Decoded JSON holds no reference cycles.
+
+`dumpb` follows orjson's rules with either backend : dict keys must be strings and integers must fit
+in 64 bits (both hold for Europe PMC records).
+"""
+
+import os
+import gc
+import json
+import threading
+from contextlib import contextmanager
+
+def _json_loads(data):
+    return json.loads(data)
+
+def _json_dumpb(obj):
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+backends = {"json": (_json_loads, _json_dumpb)}
+try:
+    import orjson
+    backends["orjson"] = (orjson.loads, orjson.dumps)
+except ImportError:
+    pass
+
+gc_pause_size = 1 << 16
+_gc_lock = threading.Lock()
+_gc_pauses = 0
+_gc_was_enabled = False
+
+@contextmanager
+def gc_paused():
+    """Pause the cyclic garbage collector in the block (nesting and across threads : the last one out resumes it)."""
+    global _gc_pauses, _gc_was_enabled
+    with _gc_lock:
+        if _gc_pauses == 0:
+            _gc_was_enabled = gc.isenabled()
+            gc.disable()
+        _gc_pauses += 1
+    try:
+        yield
+    finally:
+        with _gc_lock:
+            _gc_pauses -= 1
+            if _gc_pauses == 0 and _gc_was_enabled:
+                gc.enable()
+
+backend = None
+_loads = dumpb = None
+
+def loads(data):
+    """Decode JSON from bytes or str (UTF-8)."""
+    if len(data) < gc_pause_size:
+        return _loads(data)
+    with gc_paused():
+        return _loads(data)
+
+def use(name=None):
+    """Switch to backend `name` (default: GBC_JSON, else the fastest installed). Returns its name."""
+    global backend, _loads, dumpb
+    name = name or os.environ.get("GBC_JSON") or ("orjson" if "orjson" in backends else "json")
+    if name not in backends:
+        raise ValueError(f"JSON backend '{name}' is not available (installed: {', '.join(backends)})")
+    backend = name
+    _loads, dumpb = backends[name]
+    return name
+
+def dumps(obj):
+    """`dumpb`, as str."""
+    return dumpb(obj).decode("utf-8")
+
+use()
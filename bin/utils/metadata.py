@@ -2,9 +2,10 @@
 
 import os
 import gzip
-import json
 import hashlib
 
+from gbcutils import json_codec
+
 default_shard_count = 128
 
 def shard_key(article_id, shards=default_shard_count):
@@ -27,10 +28,10 @@ def get_article_metadata(article_id, basepath='', shards=default_shard_count):
         shard_file = shard_path(k, basepath=basepath, shards=shards)
         shard_map = {}
         if os.path.exists(shard_file):
-            with gzip.open(shard_file, 'rt', encoding='utf-8') as fh:
+            with gzip.open(shard_file, 'rb') as fh, json_codec.gc_paused():
                 for line in fh:
                     try:
-                        rec = json.loads(line)
+                        rec = json_codec.loads(line)
                         pid = rec.get('id')
                         if pid is not None:
                             shard_map[str(pid)] = rec.get('meta') or rec
@@ -0,0 +1,120 @@
+"""
+Lightweight per-task metrics : counters, histograms and timers collected in-process (thread-safe)
+and dumped as a JSON file next to a task's outputs. Files from every task of a run (e.g. all chunks)
+are combined with `merge` - see bin/aggregate_metrics.py.
+
+Names are dotted by stage, e.g. `http.latency_s`, `bundle.bytes_downloaded`, `classify.batch_size`.
+Timers are histograms of seconds; rates are derived at dump time as counter / total timer seconds,
+so they stay correct after merging.
+"""
+
+import os
+import json
+import time
+import socket
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+
+VERBOSE = False
+
+# histogram bucket upper bounds
+latency_buckets = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+size_buckets = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096)
+byte_buckets = tuple(1 << s for s in range(10, 36, 2)) # 1KiB → 16GiB
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_rates = {}
+_started = time.time()
+
+def _new_histogram(buckets):
+    return {"count": 0, "sum": 0.0, "min": None, "max": None, "buckets": {str(b): 0 for b in buckets} | {"inf": 0}}
+
+def incr(name, value=1):
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+def observe(name, value, buckets=latency_buckets):
+    with _lock:
+        h = _histograms.get(name)
+        if h is None:
+            h = _histograms[name] = _new_histogram(buckets)
+        h["count"] += 1
+        h["sum"] += value
+        h["min"] = value if h["min"] is None else min(h["min"], value)
+        h["max"] = value if h["max"] is None else max(h["max"], value)
+        i = bisect_left(buckets, value)
+        h["buckets"][str(buckets[i]) if i < len(buckets) else "inf"] += 1
+
+@contextmanager
+def timer(name, buckets=latency_buckets):
+    """Observe the wall time of the enclosed block (in seconds) into histogram `name`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, buckets=buckets)
+
+def define_rate(name, counter, timer_name):
+    """Report `name` as counter `counter` per second spent in timer `timer_name`."""
+    with _lock:
+        _rates[name] = [counter, timer_name]
+
+def _compute_rates(counters, histograms, rates):
+    values = {}
+    for name, (counter, timer_name) in rates.items():
+        seconds = histograms.get(timer_name, {}).get("sum")
+        values[name] = round(counters.get(counter, 0) / seconds, 3) if seconds else None
+    return values
+
+def snapshot(task=None):
+    with _lock:
+        snap = {
+            "tasks": [{"task": task, "host": socket.gethostname(), "pid": os.getpid(), "started": _started, "wall_s": round(time.time() - _started, 3)}],
+            "counters": dict(_counters),
+            "histograms": json.loads(json.dumps(_histograms)),
+            "rate_definitions": dict(_rates),
+        }
+    snap["rates"] = _compute_rates(snap["counters"], snap["histograms"], snap["rate_definitions"])
+    return snap
+
+def dump(path, task=None):
+    """Write the current metrics for this process to `path` as JSON."""
+    snap = snapshot(task=task)
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as fh:
+        json.dump(snap, fh, indent=2)
+    print(f"📊 Wrote metrics to {path}") if VERBOSE else None
+    return snap
+
+def reset():
+    global _started
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+        _rates.clear()
+        _started = time.time()
+
+def merge(snapshots):
+    """Merge metrics snapshots (e.g. loaded from the JSON files of every chunk) into one."""
+    merged = {"tasks": [], "counters": {}, "histograms": {}, "rate_definitions": {}}
+    for snap in snapshots:
+        merged["tasks"].extend(snap.get("tasks", []))
+        merged["rate_definitions"].update(snap.get("rate_definitions", {}))
+        for name, value in snap.get("counters", {}).items():
+            merged["counters"][name] = merged["counters"].get(name, 0) + value
+        for name, h in snap.get("histograms", {}).items():
+            m = merged["histograms"].setdefault(name, {"count": 0, "sum": 0.0, "min": None, "max": None, "buckets": {}})
+            m["count"] += h["count"]
+            m["sum"] += h["sum"]
+            m["min"] = h["min"] if m["min"] is None else min(m["min"], h["min"] if h["min"] is not None else m["min"])
+            m["max"] = h["max"] if m["max"] is None else max(m["max"], h["max"] if h["max"] is not None else m["max"])
+            for bound, count in h["buckets"].items():
+                m["buckets"][bound] = m["buckets"].get(bound, 0) + count
+    for m in merged["histograms"].values():
+        m["buckets"] = dict(sorted(m["buckets"].items(), key=lambda kv: float(kv[0])))
+    merged["rates"] = _compute_rates(merged["counters"], merged["histograms"], merged["rate_definitions"])
+    return merged
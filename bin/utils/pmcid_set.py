@@ -0,0 +1,157 @@
+"""
+Compact sets of PMC IDs, held as sorted unique PMCID numbers in a numpy uint32 array.
+
+A `PMCIDSet` costs 4 bytes per ID (against ~100 for a Python set of strings, or a TEXT primary key
+in SQLite) and iterates in numeric PMCID order. Union, intersection and difference run as numpy
+set operations, and `split_by_ranges` intersects a set with sorted PMCID ranges such as the Europe
+PMC OA bundles in one pass. IDs added one at a time (`add`, e.g. while deduplicating query results)
+go through a small buffer merged into the array in bulk.
+
+On disk (`dump` / `load`) a set is the magic bytes b"PMCSET", a format version byte, the number of
+IDs (uint64) and the zlib-compressed deltas between consecutive PMCID numbers (uint32), all
+little-endian : sorted PMCIDs are dense, so a million IDs take a few hundred kilobytes.
+"""
+
+import zlib
+import struct
+import numpy as np
+
+VERBOSE = False
+_magic = b"PMCSET"
+format_version = 1
+_buffer_size = 1 << 16
+
+def pmcid_number(pmcid):
+    """123 for 'PMC123', '123' or 123."""
+    if isinstance(pmcid, str) and pmcid.upper().startswith("PMC"):
+        pmcid = pmcid[3:]
+    return int(pmcid)
+
+def _unique_sorted(numbers):
+    """Sort uint32 `numbers` and drop duplicates (a sort and a mask : faster here than np.unique / np.union1d)."""
+    numbers = np.sort(np.asarray(numbers, dtype=np.uint32))
+    if len(numbers) < 2:
+        return numbers
+    keep = np.empty(len(numbers), dtype=bool)
+    keep[0] = True
+    np.not_equal(numbers[1:], numbers[:-1], out=keep[1:])
+    return numbers[keep]
+
+class PMCIDSet:
+    def __init__(self, ids=()):
+        self._numbers = np.empty(0, dtype=np.uint32)
+        self._pending = set()
+        self.update(ids)
+
+    @classmethod
+    def from_numbers(cls, numbers):
+        """Build a set from PMCID numbers (any order, duplicates allowed)."""
+        s = cls()
+        s._numbers = _unique_sorted(numbers)
+        return s
+
+    def _merge_pending(self):
+        if self._pending:
+            self._numbers = _unique_sorted(np.concatenate([self._numbers, np.fromiter(self._pending, dtype=np.uint32, count=len(self._pending))]))
+            self._pending = set()
+
+    def numbers(self):
+        """The sorted PMCID numbers, as a uint32 array (do not modify it)."""
+        self._merge_pending()
+        return self._numbers
+
+    def add(self, pmcid):
+        """Add one PMC ID. Returns True if it was not already in the set."""
+        n = pmcid_number(pmcid)
+        if n in self._pending or (len(self._numbers) and self._contains_number(n)):
+            return False
+        self._pending.add(n)
+        if len(self._pending) >= _buffer_size:
+            self._merge_pending()
+        return True
+
+    def update(self, ids):
+        """Add PMC IDs in bulk."""
+        numbers = [pmcid_number(pmcid) for pmcid in ids]
+        if numbers:
+            self._merge_pending()
+            self._numbers = _unique_sorted(np.concatenate([self._numbers, np.asarray(numbers, dtype=np.uint32)]))
+
+    def _contains_number(self, n):
+        # search with a uint32 scalar : a Python int would make numpy promote (copy) the whole array
+        i = self._numbers.searchsorted(np.uint32(n))
+        return bool(i < len(self._numbers) and self._numbers[i] == n)
+
+    def __contains__(self, pmcid):
+        n = pmcid_number(pmcid)
+        return n in self._pending or self._contains_number(n)
+
+    def __len__(self):
+        return len(self._numbers) + len(self._pending)
+
+    def __iter__(self):
+        """PMC IDs ('PMC123') in numeric order."""
+        for n in self.numbers().tolist():
+            yield f"PMC{n}"
+
+    def __eq__(self, other):
+        return isinstance(other, PMCIDSet) and np.array_equal(self.numbers(), other.numbers())
+
+    def __or__(self, other):
+        return PMCIDSet._sorted(_unique_sorted(np.concatenate([self.numbers(), other.numbers()])))
+
+    def __and__(self, other):
+        return PMCIDSet._sorted(np.intersect1d(self.numbers(), other.numbers(), assume_unique=True))
+
+    def __sub__(self, other):
+        return PMCIDSet._sorted(np.setdiff1d(self.numbers(), other.numbers(), assume_unique=True))
+
+    @classmethod
+    def _sorted(cls, numbers):
+        s = cls()
+        s._numbers = numbers.astype(np.uint32, copy=False)
+        return s
+
+    def between(self, first, last):
+        """The IDs from `first` to `last` (inclusive), e.g. the articles of one OA bundle."""
+        numbers = self.numbers()
+        lo = numbers.searchsorted(np.uint32(pmcid_number(first)), side="left")
+        hi = numbers.searchsorted(np.uint32(pmcid_number(last)), side="right")
+        return PMCIDSet._sorted(numbers[lo:hi])
+
+    def split_by_ranges(self, ranges):
+        """
+        For sorted, non-overlapping (first, last, name) PMCID ranges (e.g. from europepmc.bundle_ranges),
+        return [(name, PMCIDSet of the IDs in that range)] for the ranges holding at least one ID.
+        """
+        numbers = self.numbers()
+        if not ranges:
+            return []
+        firsts = np.array([pmcid_number(r[0]) for r in ranges], dtype=np.uint32)
+        lasts = np.array([pmcid_number(r[1]) for r in ranges], dtype=np.uint32)
+        lo = numbers.searchsorted(firsts, side="left")
+        hi = numbers.searchsorted(lasts, side="right")
+        return [(r[2], PMCIDSet._sorted(numbers[a:b])) for r, a, b in zip(ranges, lo.tolist(), hi.tolist()) if b > a]
+
+    def dump(self, path):
+        numbers = self.numbers()
+        deltas = np.diff(numbers, prepend=np.uint32(0)).astype("<u4")
+        with open(path, "wb") as fh:
+            fh.write(_magic + struct.pack("<BQ", format_version, len(numbers)))
+            fh.write(zlib.compress(deltas.tobytes(), 6))
+        print(f"💾 Saved {len(numbers)} PMC IDs to {path}") if VERBOSE else None
+
+    @classmethod
+    def load(cls, path):
+        """Load a set saved with `dump`, or read a text file with one PMC ID per line."""
+        with open(path, "rb") as fh:
+            data = fh.read()
+        if not data.startswith(_magic):
+            return cls(line.strip() for line in data.decode("utf-8").splitlines() if line.strip())
+        version, count = struct.unpack_from("<BQ", data, len(_magic))
+        if version != format_version:
+            raise ValueError(f"{path} is a version {version} PMC ID set (expected version {format_version})")
+        deltas = np.frombuffer(zlib.decompress(data[len(_magic) + struct.calcsize("<BQ"):]), dtype="<u4")
+        if len(deltas) != count:
+            raise ValueError(f"{path} is truncated : {len(deltas)} of {count} PMC IDs")
+        return cls._sorted(np.cumsum(deltas, dtype=np.uint32))
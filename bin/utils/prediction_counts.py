@@ -0,0 +1,145 @@
+"""
+Mergeable per-alias prediction counts : { (resource_name, matched_alias, routing): [negatives, positives] },
+where `routing` is the stage that decided the predictions ("scibert", "cascade" or "bypass", see
+gbcutils.scibert_classify).
+
+Each classifier chunk writes its counts with `dump`; `merge_files` sums any number of count files
+(chunk files or already-merged ones) holding only one file in memory at a time. Merging is associative
+and commutative, so counts can be reduced as a tree across tasks or folded in as chunks finish, and
+specificity scores derived from the merged counts at any point (see bin/merge_prediction_counts.py
+and bin/resource_specificity_scores.py).
+
+Specificity scores cover every prediction, so aliases and resources that skip the model are still
+published. Each score also carries the counts of the model's own predictions, which decide the aliases
+that may skip it next time (`load_bypass_rules`) : an alias never confirms itself through its own
+bypassed mentions. An alias the model did not see at all (because it was bypassed) keeps the model
+counts of the previous scores, so it stays eligible rather than alternating between runs.
+
+On disk a count file is gzipped JSON :
+    {"format": "prediction_counts", "version": 2, "chunks": 12, "counts": [[resource, alias, routing, neg, pos], ...]}
+where `chunks` is the number of classifier chunks summed into it. Version 1 files (without routing)
+and pickled DataFrames written by older versions of classify_resource_mentions.py (resource_name,
+matched_alias, prediction, count) are read too, as model predictions.
+"""
+
+import csv
+import gzip
+import json
+
+VERBOSE = False
+format_name = "prediction_counts"
+format_version = 2
+model_routing = "scibert" # predictions made by the model itself
+
+score_columns = [
+    "resource_name", "matched_alias", "negatives", "positives", "specificity",
+    "model_negatives", "model_positives", "model_specificity",
+]
+
+def count_predictions(rows):
+    """
+    Count (resource_name, matched_alias, prediction, routing) rows, with prediction 1 (positive) or 0
+    (negative). Rows without a routing are counted as model predictions.
+    """
+    counts = {}
+    for resource, alias, prediction, *routing in rows:
+        key = (resource, alias, routing[0] if routing else model_routing)
+        counts.setdefault(key, [0, 0])[1 if int(prediction) == 1 else 0] += 1
+    return counts
+
+def to_rows(counts):
+    return [[r, a, routing, n, p] for (r, a, routing), (n, p) in sorted(counts.items())]
+
+def from_rows(rows):
+    """Counts from `to_rows` rows, or from version 1 [resource, alias, neg, pos] rows."""
+    counts = {}
+    for row in rows:
+        r, a, routing, n, p = row if len(row) == 5 else (row[0], row[1], model_routing, row[2], row[3])
+        merge_into(counts, {(r, a, routing): [n, p]})
+    return counts
+
+def merge_into(total, counts):
+    """Add `counts` into `total` (in place) and return `total`."""
+    for key, (negatives, positives) in counts.items():
+        t = total.get(key)
+        if t is None:
+            total[key] = [negatives, positives]
+        else:
+            t[0] += negatives
+            t[1] += positives
+    return total
+
+def dump(counts, path, chunks=1):
+    with gzip.open(path, "wt", encoding="utf-8") as fh:
+        json.dump({
+            "format": format_name,
+            "version": format_version,
+            "chunks": chunks,
+            "counts": to_rows(counts),
+        }, fh, separators=(",", ":"))
+
+def load(path):
+    """Return (counts, chunks) from a count file, or from a legacy prediction counts pickle."""
+    if path.endswith(".pkl"):
+        import pandas as pd
+        df = pd.read_pickle(path)
+        counts = {}
+        for resource, alias, prediction, count in zip(df["resource_name"], df["matched_alias"], df["prediction"], df["count"]):
+            counts.setdefault((resource, alias, model_routing), [0, 0])[1 if int(prediction) == 1 else 0] += int(count)
+        return counts, 1
+
+    with gzip.open(path, "rt", encoding="utf-8") as fh:
+        data = json.load(fh)
+    if data.get("format") != format_name or data.get("version") not in (1, format_version):
+        raise ValueError(f"{path} is not a version {format_version} {format_name} file")
+    return from_rows(data["counts"]), data.get("chunks", 1)
+
+def merge_files(paths, total=None):
+    """Sum the count files in `paths` (into `total`, if given). Returns (counts, chunks)."""
+    total = {} if total is None else total
+    chunks = 0
+    for path in paths:
+        counts, n = load(path)
+        merge_into(total, counts)
+        chunks += n
+        print(f"\t‣ Merged {path} ({len(counts)} aliases, {n} chunk(s))") if VERBOSE else None
+    return total, chunks
+
+def specificity_scores(counts, previous=None):
+    """
+    Rows of `score_columns`, where specificity is the proportion of positive predictions : over all
+    predictions, and over the model's own predictions (None if there were none). Sorted by specificity
+    then positives (both descending).
+
+    `previous` ({(resource_name, matched_alias): (model_negatives, model_positives)}, see `read_model_counts`)
+    gives the model counts of aliases with no model predictions in `counts`.
+    """
+    totals = {}
+    for (r, a, routing), (n, p) in counts.items():
+        t = totals.setdefault((r, a), [0, 0, 0, 0])
+        t[0] += n
+        t[1] += p
+        if routing == model_routing:
+            t[2] += n
+            t[3] += p
+    rows = []
+    for (r, a), (n, p, model_n, model_p) in totals.items():
+        if not n + p:
+            continue
+        if not model_n + model_p and previous and (r, a) in previous:
+            model_n, model_p = previous[(r, a)]
+        rows.append((r, a, n, p, p / (n + p), model_n, model_p, model_p / (model_n + model_p) if model_n + model_p else None))
+    rows.sort(key=lambda row: (-row[4], -row[3], row[0], row[1]))
+    return rows
+
+def read_model_counts(path):
+    """
+    {(resource_name, matched_alias): (model_negatives, model_positives)} from a specificity scores CSV.
+    CSVs written before the model columns existed only counted model predictions : their totals are used.
+    """
+    model_counts = {}
+    with open(path, newline="") as fh:
+        for row in csv.DictReader(fh):
+            prefix = "model_" if "model_negatives" in row else ""
+            model_counts[(row["resource_name"], row["matched_alias"])] = (int(row[prefix + "negatives"]), int(row[prefix + "positives"]))
+    return model_counts
@@ -0,0 +1,205 @@
+"""
+On-demand sampling profiler for pipeline tasks (the --profile option of the bin/ scripts).
+
+A background thread samples the Python stack of every thread every `interval_s` (wall clock : time
+spent waiting on I/O, locks or queues shows up too, so idle worker threads are part of the picture).
+At exit it writes, next to the task's outputs :
+  <prefix>.folded : collapsed stacks ("frame;frame;frame <samples>" lines) for flamegraph.pl,
+                    speedscope or inferno ; each stack starts with its thread name
+  <prefix>.txt    : the hottest functions by self and total samples, samples per thread and the
+                    named sections below
+
+Named sections mark the known hot paths (`xml_parse`, `sentence_split`, `alias_match`, `tokenize`,
+`forward`, `db_write`). They appear as "[section]" frames in the collapsed stacks, at the point where
+they were entered, and the summary reports each one's calls, wall time and share of the samples.
+`section()` is a no-op unless profiling was started, so the hot paths pay nothing in normal runs.
+
+Samples of threads parked on a threading primitive (an idle pool worker, a queue or event wait) are
+counted as idle : they stay in the collapsed stacks but not in the hotspot lists.
+
+Sampling happens between bytecodes : time inside a long C call that holds the GIL (e.g. one big
+regex search) is attributed once the call returns, to the frame that made it.
+"""
+
+import os
+import re
+import sys
+import time
+import atexit
+import threading
+from collections import Counter
+
+VERBOSE = False
+
+_profiler = None
+
+class _NullSection:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_null_section = _NullSection()
+
+class _Section:
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        # depth of the frame entering the section : the sampler inserts "[name]" just below it
+        depth, frame = 0, sys._getframe(1)
+        while frame is not None:
+            depth += 1
+            frame = frame.f_back
+        self.profiler._sections.setdefault(threading.get_ident(), []).append((depth, self.name, time.perf_counter()))
+        return self
+
+    def __exit__(self, *exc):
+        stack = self.profiler._sections.get(threading.get_ident())
+        if stack:
+            _, name, start = stack.pop()
+            self.profiler._section_time(name, time.perf_counter() - start)
+        return False
+
+def section(name):
+    """Context manager marking a named section of the profile ; a no-op when not profiling."""
+    return _Section(_profiler, name) if _profiler is not None else _null_section
+
+def _frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+# leaf frames of a thread waiting on a lock, condition or work queue (the wait itself is in C)
+_idle_leaves = {("threading.py", "wait"), ("threading.py", "_wait_for_tstate_lock"), ("thread.py", "_worker"), ("queue.py", "get")}
+
+_thread_number = re.compile(r"(?:[-_]\d+)+$") # pool threads : ThreadPoolExecutor-0_3 -> ThreadPoolExecutor
+
+class Profiler:
+    def __init__(self, interval_s=0.005):
+        self.interval_s = interval_s
+        self.stacks = Counter()
+        self.threads = Counter()
+        self.idle = Counter()
+        self._idle_labels = set()
+        self._idents = set()
+        self.samples = 0
+        self.section_calls = Counter()
+        self.section_seconds = Counter()
+        self._sections = {} # thread ident -> [(depth, name, start)]
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._labels = {}
+
+    def _section_time(self, name, seconds):
+        with self._lock:
+            self.section_calls[name] += 1
+            self.section_seconds[name] += seconds
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = _frame_label(code)
+        return label
+
+    def _sample(self):
+        names = {t.ident: _thread_number.sub("", t.name) for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == self._thread.ident:
+                continue
+            thread = names.get(ident, f"thread-{ident}")
+            self._idents.add(ident)
+            self.threads[thread] += 1
+            code = frame.f_code
+            if (os.path.basename(code.co_filename), code.co_name) in _idle_leaves:
+                self.idle[thread] += 1
+                self._idle_labels.add(self._label(code))
+            stack = []
+            while frame is not None:
+                stack.append(self._label(frame.f_code))
+                frame = frame.f_back
+            stack.reverse()
+            for depth, name, _ in reversed(list(self._sections.get(ident, ()))):
+                stack.insert(min(depth, len(stack)), f"[{name}]")
+            self.stacks[";".join([thread] + stack)] += 1
+        self.samples += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            self._sample()
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.seconds = time.perf_counter() - self.started
+
+    def write_folded(self, path):
+        with open(path, "w") as fh:
+            for stack, count in sorted(self.stacks.items()):
+                fh.write(f"{stack} {count}\n")
+
+    def summary(self, top=30):
+        """The hotspot summary, as text."""
+        total = sum(self.stacks.values()) or 1
+        self_counts, total_counts, section_counts = Counter(), Counter(), Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")[1:]
+            code_frames = [f for f in frames if not f.startswith("[")]
+            if code_frames and code_frames[-1] not in self._idle_labels:
+                self_counts[code_frames[-1]] += count
+                for f in set(code_frames):
+                    total_counts[f] += count
+            for f in set(f for f in frames if f.startswith("[")):
+                section_counts[f[1:-1]] += count
+
+        def pct(n):
+            return f"{100 * n / total:5.1f}%"
+
+        lines = [
+            f"{self.seconds:.2f}s wall clock, {self.samples} samples every {self.interval_s * 1000:g}ms, "
+            f"{total} thread samples ({len(self._idents)} threads, {pct(sum(self.idle.values())).strip()} idle)",
+            "",
+            "Threads (share of thread samples, samples, idle samples)",
+        ]
+        lines += [f"  {pct(n)}  {n:8d}  {self.idle[name]:8d}  {name}" for name, n in self.threads.most_common()]
+        lines += ["", "Sections (share of thread samples, calls, wall seconds inside)"]
+        for name in sorted(set(self.section_calls) | set(section_counts), key=lambda n: -self.section_seconds[n]):
+            lines.append(f"  {pct(section_counts[name])}  {self.section_calls[name]:8d}  {self.section_seconds[name]:10.2f}s  {name}")
+        lines += ["", f"Top {top} functions by self samples (idle samples excluded)"]
+        lines += [f"  {pct(n)}  {n:8d}  {f}" for f, n in self_counts.most_common(top)]
+        lines += ["", f"Top {top} functions by total samples (self and callees, idle samples excluded)"]
+        lines += [f"  {pct(n)}  {n:8d}  {f}" for f, n in total_counts.most_common(top)]
+        return "\n".join(lines) + "\n"
+
+    def dump(self, prefix, top=30):
+        self.write_folded(prefix + ".folded")
+        with open(prefix + ".txt", "w") as fh:
+            fh.write(self.summary(top=top))
+        print(f"🔥 Wrote profile to {prefix}.folded and {prefix}.txt") if VERBOSE else None
+
+def start(prefix, interval_s=0.005, top=30):
+    """
+    Start sampling the whole process ; at exit, write <prefix>.folded and <prefix>.txt (see module docs).
+    `prefix` usually sits next to the task's metrics file (see `prefix_for`).
+    """
+    global _profiler
+    _profiler = Profiler(interval_s=interval_s)
+    _profiler.start()
+
+    def finish():
+        global _profiler
+        profiler, _profiler = _profiler, None
+        profiler.stop()
+        profiler.dump(prefix, top=top)
+    atexit.register(finish)
+    return _profiler
+
+def prefix_for(metrics_path):
+    """Profile prefix next to a task's metrics file : x.metrics.json -> x.profile"""
+    base = metrics_path[:-len(".metrics.json")] if metrics_path.endswith(".metrics.json") else os.path.splitext(metrics_path)[0]
+    return base + ".profile"
@@ -0,0 +1,166 @@
+"""
+An adaptive (AIMD) token-bucket rate limiter whose state is shared by every process using the same
+state file, so that concurrent pipeline tasks throttle their combined request rate to a service
+instead of each one discovering its limits on its own.
+
+The state (tokens, current rate, back-off deadline) is a few packed doubles in a small file, updated
+under a POSIX lock (fcntl.lockf) : put it in a node-local directory to share a budget between the
+tasks of one node, or on a shared filesystem with working POSIX locks to share it across nodes.
+If the file cannot be opened or locked, the limiter warns and keeps its state in memory instead,
+limiting its own process only.
+
+Each request first takes a token (`acquire`), waiting for the bucket to refill at the current rate.
+A throttled response (429 / 503) halves the rate for every process at once, and a Retry-After header
+pauses them all until it has passed ; each successful response then adds back `increase / rate`, so
+the rate climbs by about `increase` requests/s per second until it reaches `max_rate` again.
+"""
+
+import os
+import sys
+import time
+import fcntl
+import struct
+import threading
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+
+from gbcutils import metrics
+
+VERBOSE = False
+
+# tokens, last refill time, current rate (requests/s), paused until, time of the last rate decrease
+_state_format = "<5d"
+_state_size = struct.calcsize(_state_format)
+throttle_statuses = (429, 503)
+max_retry_after_s = 300
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header (delay in seconds or HTTP date), or None."""
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(max(seconds, 0.0), max_retry_after_s)
+
+class RateLimiter:
+    def __init__(self, path, max_rate, min_rate=None, burst=None, increase=None, decrease=0.5, cooldown_s=2.0, name=None):
+        """
+        Share the request budget stored at `path` (created if missing). The rate starts at, and recovers
+        to, `max_rate` requests/s ; throttling never takes it below `min_rate` (default max_rate / 64).
+        `burst` caps the tokens saved up while idle (default: one second's worth, at least 1).
+        Throttled responses within `cooldown_s` of a decrease (e.g. from other processes, for the same
+        overload) do not decrease the rate again.
+        """
+        self.path = path
+        self.name = name or os.path.splitext(os.path.basename(path))[0]
+        self.max_rate = float(max_rate)
+        self.min_rate = float(min_rate) if min_rate else self.max_rate / 64
+        self.burst = float(burst) if burst else max(1.0, self.max_rate)
+        self.increase = float(increase) if increase else max(self.min_rate, self.max_rate / 20)
+        self.decrease = decrease
+        self.cooldown_s = cooldown_s
+        # POSIX locks are held per process : threads also take a local lock
+        self._thread_lock = threading.Lock()
+        self._fd = None
+        self._local_state = None # used instead of the file if it cannot be locked
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o666)
+            fcntl.lockf(self._fd, fcntl.LOCK_EX)
+            fcntl.lockf(self._fd, fcntl.LOCK_UN)
+        except OSError as e:
+            self._fall_back(e)
+
+    def _fall_back(self, error):
+        """Stop sharing the state through the file : limit this process only, from now on."""
+        print(f"⚠️ {self.name}: cannot share the rate limit through {self.path} ({error}) - limiting this process only", file=sys.stderr)
+        metrics.incr(f"ratelimit.{self.name}.local_fallback")
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _refilled(self, state):
+        """`state` (or a fresh one) with the tokens earned since its last update."""
+        now = time.time()
+        state = list(state) if state else [self.burst, now, self.max_rate, 0.0, 0.0]
+        # this process may be configured with a lower ceiling than the last writer
+        state[2] = min(max(state[2], self.min_rate), self.max_rate)
+        tokens, updated, rate = state[:3]
+        state[0] = min(self.burst, tokens + max(0.0, now - updated) * rate)
+        state[1] = now
+        return state
+
+    @contextmanager
+    def _state(self):
+        """Yield the shared state (as a list), locked, and write it back."""
+        with self._thread_lock:
+            if self._fd is not None:
+                try:
+                    fcntl.lockf(self._fd, fcntl.LOCK_EX)
+                except OSError as e:
+                    self._fall_back(e)
+            if self._fd is None:
+                state = self._refilled(self._local_state)
+                yield state
+                self._local_state = state
+                return
+            try:
+                data = os.pread(self._fd, _state_size, 0)
+                state = self._refilled(struct.unpack(_state_format, data) if len(data) == _state_size else None)
+                yield state
+                os.pwrite(self._fd, struct.pack(_state_format, *state), 0)
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN)
+
+    def acquire(self):
+        """Take one token, waiting for it (and for any shared pause) as needed. Returns the seconds waited."""
+        waited = 0.0
+        while True:
+            with self._state() as state:
+                tokens, now, rate, paused_until = state[:4]
+                if now >= paused_until and tokens >= 1:
+                    state[0] = tokens - 1
+                    break
+                wait = max(paused_until - now, (1 - tokens) / rate)
+            wait = min(wait, 5.0) # re-read the state at least every few seconds
+            time.sleep(wait)
+            waited += wait
+        if waited:
+            metrics.observe(f"ratelimit.{self.name}.wait_s", waited)
+        metrics.incr(f"ratelimit.{self.name}.requests")
+        return waited
+
+    def throttled(self, retry_after=None):
+        """Record a throttled response : decrease the shared rate and pause everyone for `retry_after` seconds."""
+        metrics.incr(f"ratelimit.{self.name}.throttled")
+        with self._state() as state:
+            now = state[1]
+            if now - state[4] >= self.cooldown_s:
+                state[2] = max(self.min_rate, state[2] * self.decrease)
+                state[4] = now
+                state[0] = min(state[0], 0.0) # drop the burst saved up at the old rate
+                metrics.incr(f"ratelimit.{self.name}.decreases")
+                print(f"🐢 {self.name}: throttled, rate now {state[2]:.2f}/s") if VERBOSE else None
+            if retry_after:
+                state[3] = max(state[3], now + retry_after)
+                print(f"⏸️ {self.name}: pausing requests for {retry_after:.1f}s (Retry-After)") if VERBOSE else None
+
+    def succeeded(self):
+        """Record a successful response : increase the shared rate additively, up to `max_rate`."""
+        with self._state() as state:
+            state[2] = min(self.max_rate, state[2] + self.increase / state[2])
+
+    def rate(self):
+        """The current shared rate, in requests/s."""
+        with self._state() as state:
+            return state[2]
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
@@ -1,23 +1,45 @@
 #!/usr/bin/env python3
 
+import os
 import re
-from collections import Counter
+import json
+import pickle
+import hashlib
+from bisect import bisect_left, bisect_right
+from collections import Counter, namedtuple
 from tqdm import tqdm
-import torch
-from nltk.tokenize import sent_tokenize
-from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+from gbcutils import metrics
+from gbcutils import profiling
+from gbcutils import prediction_counts
+
+# torch, transformers and nltk are imported on first use : they dominate start-up time, and are not
+# needed for --help or for code paths that never run the model (e.g. mention extraction only)
 
 VERBOSE = False
 
-def _remove_substring_matches(mentions):
-    aliases = [m[1].lower() for m in mentions]
-    unique_aliases = list(set(aliases))
+def sent_tokenize(text):
+    """Split text into sentences using NLTK."""
+    from nltk.tokenize import sent_tokenize as nltk_sent_tokenize
+    with profiling.section("sentence_split"):
+        sentences = nltk_sent_tokenize(text)
+    metrics.incr("extract.sentences", len(sentences))
+    return sentences
+
+def _substring_aliases(aliases):
+    """Return the set of (lowercased) aliases that are substrings of another alias in the list."""
+    unique_aliases = list(set(a.lower() for a in aliases))
 
-    substr_aliases = []
+    substr_aliases = set()
     for alias1 in unique_aliases:
         for alias2 in unique_aliases:
             if alias1 in alias2 and alias1 != alias2:
-                substr_aliases.append(alias1)
+                substr_aliases.add(alias1)
+
+    return substr_aliases
+
+def _remove_substring_matches(mentions):
+    substr_aliases = _substring_aliases([m[1] for m in mentions])
 
     for alias in substr_aliases:
         mentions = [m for m in mentions if m[1].lower() != alias]
@@ -117,64 +139,316 @@ def _normalize_alias_for_regex(alias: str) -> str:
 
     return escaped
 
-def get_resource_mentions(text, resource_names, case_sensitive_resources=[]):
-    mentions = []
-
-    # precompile regex patterns for each resource alias
-    # This is more efficient than compiling them on-the-fly in the loop
-    compiled_patterns = []
-    for resource in resource_names:
-        resource_name = resource[0]
-        for alias in resource:
-            if resource_name in case_sensitive_resources:
-                alias_norm = _normalize_alias_for_regex(alias)
-                pattern_case_sensitive = re.compile(rf"(?<![A-Za-z]){alias_norm}(?![A-Za-z])")
-                compiled_patterns.append((resource_name, alias, pattern_case_sensitive, True))
-            else:
-                # Use case-insensitive pattern for all other resources
-                alias_norm = _normalize_alias_for_regex(alias.lower())
-                pattern_case_insensitive = re.compile(rf"(?<![A-Za-z]){alias_norm}(?![A-Za-z])")
-                compiled_patterns.append((resource_name, alias, pattern_case_insensitive, False))
+def _alias_pattern(alias, is_case_sensitive):
+    """
+    Regex source matching `alias` as a whole word. Case-insensitive patterns are built from the
+    lowercased alias and expect to be run against lowercased text.
+    """
+    alias_norm = _normalize_alias_for_regex(alias if is_case_sensitive else alias.lower())
+    return rf"(?<![A-Za-z]){alias_norm}(?![A-Za-z])"
+
+# bump when alias normalisation or pattern construction changes : saved matchers are then rebuilt
+matcher_format_version = 1
+# length of the alias prefixes used to pick the patterns worth running on a text
+prefilter_key_length = 3
+_ascii_letters = re.compile(r"[A-Za-z]+")
+
+def matcher_digest(resource_names, case_sensitive_resources=[]):
+    """Fingerprint of the inputs of an `AliasMatcher`, used to tell whether a saved matcher is stale."""
+    payload = json.dumps(
+        [matcher_format_version, [list(r) for r in resource_names], sorted(case_sensitive_resources)],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class AliasMatcher:
+    """
+    The alias patterns of a resource list, with an index to only run those that can match a text.
 
-    # Tokenize the text into sentences and search for resource names
-    sentences = sent_tokenize(text)  # Use NLTK to split into sentences
-    for sentence in sentences:
-        sentence = sentence.replace("\n", " ")
-        s_lowered = sentence.lower()
-        this_sentence_mentions = []
-        for resource_name, alias, pattern, is_case_sensitive in compiled_patterns:
-            if not is_case_sensitive and pattern.search(s_lowered):
-                this_sentence_mentions.append((sentence.strip(), alias, resource_name))
-            elif is_case_sensitive and pattern.search(sentence):
-                this_sentence_mentions.append((sentence.strip(), alias, resource_name))
-
-        if len(this_sentence_mentions) > 1:
-            this_sentence_mentions = _remove_substring_matches(this_sentence_mentions)
-        mentions.extend(this_sentence_mentions)
+    A match starts where no ASCII letter precedes it, so an alias starting with ASCII letters can only
+    match at the start of a run of letters in the text that begins with those letters. Patterns are
+    indexed by the first `prefilter_key_length` letters of their alias (one index for each case mode),
+    and `find_hits` only runs the patterns whose key is a prefix of a letter run of the text, plus the
+    aliases that do not start with an ASCII letter. Patterns are compiled on first use.
 
-    # if a large number of matches are found for one resource, switch to case sensitive mode
-    filtered_mentions = []
-    alias_counts = Counter([m[1] for m in mentions])
+    A matcher is saved with `dump` and loaded with `load_matcher` (see fetch_resource_list.py), so that
+    each classifier task does not have to normalise and index the resource list again.
+    """
+    def __init__(self, entries, digest, index=None, always=None):
+        self.entries = entries # [(resource_name, alias, pattern source, is_case_sensitive)]
+        self.digest = digest
+        if index is None:
+            index, always = self._build_index(entries)
+        self.index = index # [{key: [entry ids]} for case-insensitive patterns, same for case-sensitive ones]
+        self.always = always
+        self._compiled = [None] * len(entries)
+
+    @classmethod
+    def build(cls, resource_names, case_sensitive_resources=[]):
+        entries = []
+        for resource in resource_names:
+            resource_name = resource[0]
+            is_case_sensitive = resource_name in case_sensitive_resources
+            for alias in resource:
+                entries.append((resource_name, alias, _alias_pattern(alias, is_case_sensitive), is_case_sensitive))
+        return cls(entries, matcher_digest(resource_names, case_sensitive_resources))
+
+    @staticmethod
+    def _build_index(entries):
+        index, always = [{}, {}], []
+        for i, (_, alias, _, is_case_sensitive) in enumerate(entries):
+            m = _ascii_letters.match(alias)
+            if m:
+                index[is_case_sensitive].setdefault(m.group().lower()[:prefilter_key_length], []).append(i)
+            else:
+                always.append(i)
+        return index, always
+
+    def _pattern(self, i):
+        pattern = self._compiled[i]
+        if pattern is None:
+            pattern = self._compiled[i] = re.compile(self.entries[i][2])
+        return pattern
+
+    @staticmethod
+    def _prefixes(text):
+        keys = set()
+        for run in _ascii_letters.findall(text):
+            run = run.lower()
+            keys.update(run[:n] for n in range(1, prefilter_key_length + 1))
+        return keys
+
+    def find_hits(self, text):
+        """Return a sorted list of (start, end, alias, resource_name) for every alias match in text."""
+        t_lowered = _lower_aligned(text)
+        keys_lowered = self._prefixes(t_lowered)
+        keys = (keys_lowered, keys_lowered if text.isascii() else self._prefixes(text))
+        candidates = list(self.always)
+        for is_case_sensitive in (False, True):
+            index = self.index[is_case_sensitive]
+            for key in keys[is_case_sensitive]:
+                candidates.extend(index.get(key, ()))
+
+        hits = []
+        for i in candidates:
+            resource_name, alias, _, is_case_sensitive = self.entries[i]
+            haystack = text if is_case_sensitive else t_lowered
+            for m in self._pattern(i).finditer(haystack):
+                hits.append((m.start(), m.end(), alias, resource_name))
+        hits.sort()
+        return hits
+
+    def dump(self, path):
+        with open(path, "w") as fh:
+            json.dump({
+                "format": "alias_matcher",
+                "version": matcher_format_version,
+                "digest": self.digest,
+                "entries": self.entries,
+                "index": self.index,
+                "always": self.always,
+            }, fh, ensure_ascii=False, separators=(",", ":"))
+
+def load_matcher(path, resource_names, case_sensitive_resources=[]):
+    """
+    Load the `AliasMatcher` saved at `path` if it was built from the same resource list, case-sensitive
+    resources and matcher version ; otherwise (or if `path` is missing) build it from `resource_names`.
+    """
+    digest = matcher_digest(resource_names, case_sensitive_resources)
+    if path and os.path.exists(path):
+        with metrics.timer("extract.matcher_load_s"):
+            with open(path) as fh:
+                saved = json.load(fh)
+        if saved.get("format") == "alias_matcher" and saved.get("version") == matcher_format_version and saved.get("digest") == digest:
+            metrics.incr("extract.matcher_loaded")
+            print(f"\t📥 Loaded alias matcher ({len(saved['entries'])} aliases) from {path}") if VERBOSE else None
+            # JSON turns the entry tuples into lists
+            return AliasMatcher([tuple(e) for e in saved["entries"]], digest, index=saved["index"], always=saved["always"])
+        print(f"\t⚠️ Alias matcher {path} is stale - rebuilding it") if VERBOSE else None
+    elif path:
+        print(f"\t⚠️ Alias matcher {path} not found - building it") if VERBOSE else None
+    with metrics.timer("extract.matcher_build_s"):
+        matcher = AliasMatcher.build(resource_names, case_sensitive_resources)
+    metrics.incr("extract.matcher_built")
+    return matcher
+
+# Compact mention record : `sentence_id` indexes into the sentence list returned alongside the mentions,
+# and `start`/`end` give the character span of the matched alias within that sentence
+Mention = namedtuple("Mention", ["sentence_id", "start", "end", "alias", "resource"])
+
+def _lower_aligned(text):
+    """Lowercase text, keeping character offsets aligned with the original."""
+    t_lowered = text.lower()
+    if len(t_lowered) != len(text):
+        # a few characters lowercase to more than one character - leave those untouched
+        t_lowered = "".join(c.lower() if len(c.lower()) == 1 else c for c in text)
+    return t_lowered
+
+def resolve_overlapping_hits(hits):
+    """
+    Resolve overlapping alias matches using their character spans : the longest match wins (the
+    earlier one, between matches of the same length). `hits` is a list of (start, end, alias, resource_name) tuples from a single sentence. Matches
+    sharing exactly the same span are all kept (e.g. the same alias listed for two resources).
+    Returns the surviving hits in span order.
+    """
+    kept = []
+    for hit in sorted(hits, key=lambda h: (h[0] - h[1], h[0])):
+        start, end = hit[0], hit[1]
+        if all((start, end) == (k[0], k[1]) or end <= k[0] or start >= k[1] for k in kept):
+            kept.append(hit)
+    kept.sort()
+    return kept
+
+def _sentence_mentions(sentence_id, hits, offset=0):
+    """Resolve overlaps and keep the first span of each (alias, resource) as a `Mention`."""
+    first_spans = {}
+    for h_start, h_end, alias, resource_name in resolve_overlapping_hits(hits):
+        first_spans.setdefault((alias, resource_name), (h_start - offset, h_end - offset))
+    return [Mention(sentence_id, start, end, alias, resource_name) for (alias, resource_name), (start, end) in first_spans.items()]
+
+def postprocess_mentions(sentences, mentions, case_sensitive_resources=[]):
+    """
+    Post-processing stage shared by the mention extraction modes.
+      - if more than `case_sensitive_threshold` mentions are found for an alias, only keep those
+        where the alias also appears with its exact case in the sentence
+      - remove duplicate mentions (same sentence, alias & resource)
+    Runs in a single pass over `mentions`, compiling at most one pattern per over-threshold alias.
+    """
+    alias_counts = Counter(m.alias for m in mentions)
+    case_sensitive_patterns = {}
     for alias, count in alias_counts.items():
         if count > case_sensitive_threshold and alias not in case_sensitive_resources:
             if VERBOSE:
                 print(f"⚠️ {count} matches found for {alias} - switching to case sensitive mode")
-            pattern_case_sensitive = re.compile(rf"(?<![A-Za-z]){re.escape(alias)}(?![A-Za-z])")
-            for m in mentions:
-                if m[1] == alias and pattern_case_sensitive.search(m[0]):
-                    filtered_mentions.append(m)
-        else:
-            this_alias_mentions = [m for m in mentions if m[1] == alias]
-            filtered_mentions.extend(this_alias_mentions)
+            case_sensitive_patterns[alias] = re.compile(rf"(?<![A-Za-z]){re.escape(alias)}(?![A-Za-z])")
 
-    # Remove duplicates
-    mentions = list(set(filtered_mentions))
-    # Remove empty mentions
-    mentions = [m for m in mentions if m[0]]
+    filtered_mentions, seen = [], set()
+    for m in mentions:
+        key = (m.sentence_id, m.alias, m.resource)
+        if key in seen:
+            continue
+        pattern = case_sensitive_patterns.get(m.alias)
+        if pattern and not pattern.search(sentences[m.sentence_id]):
+            continue
+        seen.add(key)
+        filtered_mentions.append(m)
 
-    return mentions
+    return filtered_mentions
+
+def get_resource_mentions(text, resource_names, case_sensitive_resources=[], matcher=None):
+    # alias patterns for the resource list : pass a `matcher` to reuse them across texts
+    matcher = matcher or AliasMatcher.build(resource_names, case_sensitive_resources)
+
+    # Tokenize the text into sentences and search for resource names
+    sentences, sentence_ids = [], {}
+    mentions = []
+    text_sentences = sent_tokenize(text)  # Use NLTK to split into sentences
+    with profiling.section("alias_match"):
+        for sentence in text_sentences:
+            sentence = sentence.replace("\n", " ").strip()
+            if not sentence:
+                continue
+            hits = matcher.find_hits(sentence)
+            if not hits:
+                continue
+            if sentence not in sentence_ids:
+                sentence_ids[sentence] = len(sentences)
+                sentences.append(sentence)
+            mentions.extend(_sentence_mentions(sentence_ids[sentence], hits))
+
+        mentions = postprocess_mentions(sentences, mentions, case_sensitive_resources=case_sensitive_resources)
+    return mentions_to_pairs(sentences, mentions)
+
+_block_separator = re.compile(r"\n\s*\n")
+
+def _block_bounds(text):
+    """Return (start, end) offsets of the blank-line separated blocks written by the preprocessor."""
+    bounds, start = [], 0
+    for sep in _block_separator.finditer(text):
+        bounds.append((start, sep.start()))
+        start = sep.end()
+    bounds.append((start, len(text)))
+    return bounds
+
+def _sentence_bounds(text, start, end):
+    """Sentence-split text[start:end] and return absolute (start, end) offsets for each sentence."""
+    bounds, cursor = [], start
+    for sentence in sent_tokenize(text[start:end]):
+        s_start = text.find(sentence, cursor, end)
+        if s_start < 0:
+            continue
+        cursor = s_start + len(sentence)
+        bounds.append((s_start, cursor))
+    return bounds
+
+def get_resource_mentions_match_first(text, resource_names, case_sensitive_resources=[], matcher=None):
+    """
+    Match-first variant of `get_resource_mentions`.
+
+    Alias patterns are run over the raw text first, and only the blocks (blank-line separated
+    regions, as written by fetch_and_preprocess_article.py) that contain a hit are sentence-split.
+    Returns a tuple of (sentences, mentions) where `sentences` is a list of unique sentence strings
+    and `mentions` is a list of `Mention` records pointing into it.
+    """
+    matcher = matcher or AliasMatcher.build(resource_names, case_sensitive_resources)
+
+    # 1. find all alias hits on the raw text
+    with profiling.section("alias_match"):
+        hits = matcher.find_hits(text)
+    if not hits:
+        return [], []
+
+    # 2. group hits by enclosing block and sentence-split only those blocks
+    blocks = _block_bounds(text)
+    block_starts = [b[0] for b in blocks]
+    hits_by_block = {}
+    for hit in hits:
+        b_idx = bisect_right(block_starts, hit[0]) - 1
+        hits_by_block.setdefault(b_idx, []).append(hit)
+
+    sentences, sentence_ids = [], {}
+    mentions = []
+    for b_idx, block_hits in hits_by_block.items():
+        s_bounds = _sentence_bounds(text, *blocks[b_idx])
+        s_starts = [s[0] for s in s_bounds]
+        hits_by_sentence = {}
+        for hit in block_hits:
+            s_idx = bisect_right(s_starts, hit[0]) - 1
+            if s_idx < 0 or hit[1] > s_bounds[s_idx][1]:
+                continue # hit falls between sentences, or straddles a sentence boundary
+            hits_by_sentence.setdefault(s_idx, []).append(hit)
+
+        for s_idx, sentence_hits in hits_by_sentence.items():
+            s_start, s_end = s_bounds[s_idx]
+            raw_sentence = text[s_start:s_end].replace("\n", " ")
+            sentence = raw_sentence.strip()
+            if not sentence:
+                continue
+            if sentence not in sentence_ids:
+                sentence_ids[sentence] = len(sentences)
+                sentences.append(sentence)
+            offset = s_start + (len(raw_sentence) - len(raw_sentence.lstrip()))
+            mentions.extend(_sentence_mentions(sentence_ids[sentence], sentence_hits, offset=offset))
+
+    # 3. case sensitivity switch & deduplication
+    mentions = postprocess_mentions(sentences, mentions, case_sensitive_resources=case_sensitive_resources)
+    return sentences, mentions
+
+def mentions_to_pairs(sentences, mentions):
+    """Expand `Mention` records back into the (sentence, alias, resource) tuples used by `classify_mentions`."""
+    return [(sentences[m.sentence_id], m.alias, m.resource) for m in mentions]
+
+def _accelerate_available():
+    try:
+        import accelerate
+        return True
+    except ImportError:
+        return False
 
 def load_model(model_name, num_threads=1):
+    import torch
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
     if torch.cuda.is_available():
         if VERBOSE:
             print("\t🧠 Using CUDA GPU for inference")
@@ -190,37 +464,306 @@ def load_model(model_name, num_threads=1):
         torch.set_num_threads(num_threads)
 
     tokenizer = AutoTokenizer.from_pretrained(model_name)
-    model = AutoModelForSequenceClassification.from_pretrained(model_name).to(device)
+    # load weights straight from the memory-mapped safetensors file, without a random initialisation first
+    # (transformers 4.x needs the optional accelerate package for low_cpu_mem_usage)
+    use_safetensors = True if os.path.exists(os.path.join(model_name, "model.safetensors")) else None
+    low_cpu_mem_usage = {"low_cpu_mem_usage": True} if _accelerate_available() else {}
+    model = AutoModelForSequenceClassification.from_pretrained(
+        model_name, use_safetensors=use_safetensors, **low_cpu_mem_usage
+    ).to(device)
     model.eval()
 
     return (tokenizer, model, device)
 
-def classify_mentions(this_id, candidate_pairs, tokenizer=None, model=None, device=None):
+# token ids for each alias, per tokenizer : aliases repeat across every article in a run
+_alias_token_cache = {}
+
+def _encode_unique(tokenizer, texts, cache=None, offsets=False):
+    """
+    Tokenize (without special tokens) each unique text not already in `cache` with one batch call.
+    With `offsets=True`, cache values are (token_ids, char_offsets) tuples (fast tokenizers only).
+    """
+    cache = {} if cache is None else cache
+    missing = list(dict.fromkeys(t for t in texts if t not in cache))
+    if missing:
+        encoded = tokenizer(missing, add_special_tokens=False, return_offsets_mapping=offsets)
+        if offsets:
+            cache.update(zip(missing, zip(encoded["input_ids"], encoded["offset_mapping"])))
+        else:
+            cache.update(zip(missing, encoded["input_ids"]))
+    return cache
+
+def _truncate_pair_lengths(n1, n2, budget):
+    """Lengths to keep for a pair of sequences, matching the tokenizer's 'longest_first' truncation."""
+    if n1 + n2 <= budget:
+        return n1, n2
+    swap = n1 > n2
+    if swap:
+        n1, n2 = n2, n1
+    n2 = n1 if n1 > budget else max(n1, budget - n1)
+    if n1 + n2 > budget:
+        n1 = budget // 2
+        n2 = n1 + budget % 2
+    return (n2, n1) if swap else (n1, n2)
+
+_alias_locate_patterns = {}
+
+def _locate_alias(sentence, alias):
+    """Return the (start, end) character span of the first match of alias in sentence, or None."""
+    if alias not in _alias_locate_patterns:
+        alias_norm = _normalize_alias_for_regex(alias)
+        _alias_locate_patterns[alias] = re.compile(rf"(?<![A-Za-z]){alias_norm}(?![A-Za-z])", re.IGNORECASE)
+    m = _alias_locate_patterns[alias].search(sentence)
+    return m.span() if m else None
+
+def _window_bounds(offsets, span, size):
+    """Return (lo, hi) token indices of a window of `size` tokens centred on the character span."""
+    n_tokens = len(offsets)
+    if n_tokens <= size:
+        return 0, n_tokens
+    if span is None:
+        return 0, size
+    first = bisect_right([o[1] for o in offsets], span[0])
+    last = bisect_left([o[0] for o in offsets], span[1]) - 1
+    centre = (first + max(first, last)) // 2
+    lo = max(0, min(centre - size // 2, n_tokens - size))
+    return lo, lo + size
+
+def pretokenize_pairs(tokenizer, candidate_pairs, max_length=512, window=None, spans=None):
+    """
+    Build (alias, sentence) model inputs for each (sentence, alias, resource) candidate, tokenizing
+    each unique alias and sentence only once using the tokenizer's batch API.
+
+    Returns a dict of unpadded `input_ids`, `token_type_ids` and `lengths` lists aligned with
+    `candidate_pairs`. Truncation matches `tokenizer(alias, sentence, truncation=True, max_length=max_length)`.
+
+    If `window` is set, inputs are limited to `window` tokens and long sentences are cut to a
+    window centred on the matched alias rather than truncated from the end. `spans` optionally
+    gives the (start, end) character span of the alias in each sentence (e.g. from `Mention`
+    records); otherwise the first match of the alias in the sentence is used.
+    """
+    alias_cache = _alias_token_cache.setdefault(tokenizer.name_or_path, {})
+    _encode_unique(tokenizer, [alias for _, alias, _ in candidate_pairs], cache=alias_cache)
+    sentence_cache = _encode_unique(tokenizer, [sentence for sentence, _, _ in candidate_pairs], offsets=bool(window))
+
+    cls_id, sep_id = tokenizer.cls_token_id, tokenizer.sep_token_id
+    budget = (window or max_length) - 3 # [CLS] alias [SEP] sentence [SEP]
+
+    encoded = {"input_ids": [], "token_type_ids": [], "lengths": []}
+    for i, (sentence, alias, _) in enumerate(candidate_pairs):
+        alias_ids = alias_cache[alias]
+        if window:
+            sentence_ids, offsets = sentence_cache[sentence]
+        else:
+            sentence_ids = sentence_cache[sentence]
+        n_alias, n_sentence = _truncate_pair_lengths(len(alias_ids), len(sentence_ids), budget)
+
+        lo, hi = 0, n_sentence
+        if window and n_sentence < len(sentence_ids):
+            span = spans[i] if spans is not None else _locate_alias(sentence, alias)
+            lo, hi = _window_bounds(offsets, span, n_sentence)
+
+        input_ids = [cls_id] + alias_ids[:n_alias] + [sep_id] + sentence_ids[lo:hi] + [sep_id]
+        encoded["input_ids"].append(input_ids)
+        encoded["token_type_ids"].append([0] * (n_alias + 2) + [1] * (hi - lo + 1))
+        encoded["lengths"].append(len(input_ids))
+
+    return encoded
+
+def pad_batch(tokenizer, input_ids, token_type_ids, max_length=None):
+    """
+    Pad pre-tokenized inputs (as returned by `pretokenize_pairs`) and return them as model-ready tensors.
+    Inputs are padded to `max_length`, or to the longest input in the batch if not given.
+    """
+    import torch
+
+    max_length = max_length or max(len(ids) for ids in input_ids)
+    pad_id = tokenizer.pad_token_id
+    batch = {"input_ids": [], "token_type_ids": [], "attention_mask": []}
+    for ids, types in zip(input_ids, token_type_ids):
+        padding = max_length - len(ids)
+        batch["input_ids"].append(ids + [pad_id] * padding)
+        batch["token_type_ids"].append(types + [0] * padding)
+        batch["attention_mask"].append([1] * len(ids) + [0] * padding)
+
+    return {k: torch.tensor(v) for k, v in batch.items() if k in tokenizer.model_input_names}
+
+def classify_mentions(this_id, candidate_pairs, tokenizer=None, model=None, device=None, window=None, spans=None):
+    """
+    Classify each (sentence, alias, resource) candidate. If `window` is given, each input is limited
+    to a window of that many tokens centred on the alias (see `pretokenize_pairs`).
+    """
+    import torch
+
     predictions = []
 
-    for sentence, alias, resource in tqdm(candidate_pairs, desc="🔍 Classifying"):
-        inputs = tokenizer(alias, sentence, return_tensors="pt", truncation=True, padding="max_length", max_length=512).to(device)
-        with torch.no_grad():
+    max_length = window or 512
+    with metrics.timer("classify.tokenize_s"), profiling.section("tokenize"):
+        encoded = pretokenize_pairs(tokenizer, candidate_pairs, max_length=512, window=window, spans=spans)
+    metrics.incr("classify.candidates", len(candidate_pairs))
+    for i, (sentence, alias, resource) in enumerate(tqdm(candidate_pairs, desc="🔍 Classifying")):
+        inputs = pad_batch(tokenizer, [encoded["input_ids"][i]], [encoded["token_type_ids"][i]], max_length=max_length)
+        inputs = {k: v.to(device) for k, v in inputs.items()}
+        metrics.observe("classify.batch_size", 1, buckets=metrics.size_buckets)
+        with torch.no_grad(), metrics.timer("classify.forward_s"), profiling.section("forward"):
             outputs = model(**inputs)
             probs = torch.nn.functional.softmax(outputs.logits, dim=-1)
             pred = torch.argmax(probs, dim=1).item()
-            if pred == 1:
-                predictions.append({
-                    "prediction": 1,
-                    "id": this_id,
-                    "resource_name": resource,
-                    "matched_alias": alias,
-                    "sentence": sentence,
-                    "confidence": probs[0, 1].item()
-                })
-            else:
-                predictions.append({
-                    "prediction": 0,
-                    "id": this_id,
-                    "resource_name": resource,
-                    "matched_alias": alias,
-                    "sentence": sentence,
-                    "confidence": probs[0, 0].item()
-                })
-
-    return predictions
\ No newline at end of file
+            predictions.append(prediction_record(this_id, sentence, alias, resource, pred, probs[0, pred].item()))
+
+    return predictions
+
+def prediction_record(this_id, sentence, alias, resource, prediction, confidence, routing="scibert"):
+    return {
+        "prediction": prediction,
+        "id": this_id,
+        "resource_name": resource,
+        "matched_alias": alias,
+        "sentence": sentence,
+        "confidence": confidence,
+        "routing": routing
+    }
+
+summary_columns = ['id', 'resource_name', 'matched_alias', 'match_count', 'mean_confidence']
+routing_summary_columns = summary_columns + ['routing'] # when cascade or bypass routing is in use
+
+def summarise_predictions(class_df, min_confidence=0.9):
+    """
+    Collapse a DataFrame of prediction records to one row per (id, resource_name, matched_alias) : the
+    confident positive predictions, their count and mean confidence (the --mentions_out table).
+    """
+    summary_df = (
+        class_df[(class_df['prediction'] == 1) & (class_df['confidence'] >= min_confidence)]
+        .groupby(['id', 'resource_name', 'matched_alias'], as_index=False)
+        .agg({
+            'confidence': 'mean',
+            'prediction': 'count',
+            'sentence': lambda x: " || ".join(list(set(x))),  # unique sentences
+            'routing': lambda x: ",".join(sorted(set(x)))
+        })
+    )
+    summary_df.rename(columns={'confidence': 'mean_confidence', 'sentence':'token_matches', 'prediction': 'match_count'}, inplace=True)
+    return summary_df
+
+cascade_format_version = 1 # bump whenever cascade_features changes : saved cascade models are then rejected
+
+def cascade_features(sentence, alias, span=None, width=8):
+    """
+    Lexical features for the cascade classifier : an alias token plus up to `width` words either
+    side of the matched alias, lowercased and with digits collapsed (so '250 bar' ~ '10 bar').
+    """
+    span = span or _locate_alias(sentence, alias)
+    if span is None:
+        left, right = sentence.split()[:width], []
+    else:
+        left, right = sentence[:span[0]].split()[-width:], sentence[span[1]:].split()[:width]
+    alias_token = "__alias_" + re.sub(r"\W+", "_", alias.lower()) + "__"
+    context = " ".join(left + ["__mention__"] + right).lower()
+    return f"{alias_token} {re.sub(r'[0-9]', '0', context)}"
+
+def load_cascade_model(path):
+    """
+    Load a cascade classifier saved by bin/training/train_cascade_classifier.py. Raises ValueError if
+    it was trained on another version of `cascade_features`.
+    """
+    with open(path, "rb") as fh:
+        cascade = pickle.load(fh)
+    if cascade.get("version") != cascade_format_version:
+        raise ValueError(
+            f"{path} is a version {cascade.get('version')} cascade classifier (expected version {cascade_format_version}) : "
+            "retrain it with bin/training/train_cascade_classifier.py"
+        )
+    if VERBOSE:
+        print(f"\t🪜 Loaded cascade classifier v{cascade['version']} from {path}")
+    return cascade
+
+def classify_mentions_cascade(this_id, candidate_pairs, cascade, tokenizer=None, model=None, device=None,
+                              low=0.05, high=0.95, window=None, spans=None, routing=None, classify_fn=None):
+    """
+    Cheap-first classification : the cascade model scores every candidate, and those with a positive
+    probability >= `high` or <= `low` are decided there. Only the remaining, uncertain candidates are
+    passed to `classify_fn` (default: `classify_mentions`). Predictions are returned in the order of `candidate_pairs`.
+
+    If a `routing` Counter is given, it is updated with the number of candidates decided at each stage.
+    """
+    routing = Counter() if routing is None else routing
+    if not candidate_pairs:
+        return []
+
+    features = [
+        cascade_features(sentence, alias, span=spans[i] if spans else None, width=cascade["width"])
+        for i, (sentence, alias, _) in enumerate(candidate_pairs)
+    ]
+    pipeline = cascade["pipeline"]
+    positive_probs = pipeline.predict_proba(features)[:, list(pipeline.classes_).index(1)]
+
+    predictions = [None] * len(candidate_pairs)
+    uncertain = []
+    for i, p_positive in enumerate(positive_probs):
+        sentence, alias, resource = candidate_pairs[i]
+        if p_positive >= high:
+            predictions[i] = prediction_record(this_id, sentence, alias, resource, 1, float(p_positive), routing="cascade")
+            routing["cascade_positive"] += 1
+        elif p_positive <= low:
+            predictions[i] = prediction_record(this_id, sentence, alias, resource, 0, float(1 - p_positive), routing="cascade")
+            routing["cascade_negative"] += 1
+        else:
+            uncertain.append(i)
+
+    if uncertain:
+        classify_fn = classify_fn or classify_mentions
+        model_predictions = classify_fn(
+            this_id, [candidate_pairs[i] for i in uncertain], tokenizer=tokenizer, model=model, device=device,
+            window=window, spans=[spans[i] for i in uncertain] if spans else None
+        )
+        for i, prediction in zip(uncertain, model_predictions):
+            predictions[i] = prediction
+    routing["scibert"] += len(uncertain)
+
+    return predictions
+
+def load_bypass_rules(resources_json=None, specificity_csv=None, specificity_cutoff=0.99, min_count=20):
+    """
+    Build the rules for skipping the model on mentions that are (almost) always true positives.
+      - `resources_json` : resource list in the data/resource_names.json format - every name of a
+        resource flagged with `"ambiguous": 0` is bypassed
+      - `specificity_csv` : a previous run's resource_specificity_scores.csv - aliases with a
+        specificity >= `specificity_cutoff` over at least `min_count` mentions classified by the model
+        itself are bypassed (model counts only : see gbcutils.prediction_counts)
+    Returns a dict of {"resources": set(resource names), "aliases": set((resource_name, alias))}.
+    """
+    bypass_rules = {"resources": set(), "aliases": set()}
+    if resources_json:
+        with open(resources_json) as fh:
+            resources = json.load(fh)
+        for resource in resources:
+            if resource.get("ambiguous", 1) == 0:
+                bypass_rules["resources"].update(resource["names"])
+    if specificity_csv:
+        for key, (negatives, positives) in prediction_counts.read_model_counts(specificity_csv).items():
+            total = negatives + positives
+            if total >= min_count and positives / total >= specificity_cutoff:
+                bypass_rules["aliases"].add(key)
+
+    if VERBOSE:
+        print(f"\t⏭️ Bypassing the model for {len(bypass_rules['resources'])} unambiguous resource names and {len(bypass_rules['aliases'])} high-specificity aliases")
+    return bypass_rules
+
+def route_bypass(this_id, candidate_pairs, bypass_rules, confidence=1.0, spans=None, routing=None):
+    """
+    Accept candidates matching `bypass_rules` (see `load_bypass_rules`) as positive mentions without
+    running the model. Bypassed predictions get a synthetic `confidence` and `"routing": "bypass"`.
+
+    Returns a tuple of (bypassed predictions, remaining candidate pairs, spans for the remaining pairs).
+    """
+    routing = Counter() if routing is None else routing
+    predictions, remaining_pairs, remaining_spans = [], [], []
+    for i, (sentence, alias, resource) in enumerate(candidate_pairs):
+        if resource in bypass_rules["resources"] or (resource, alias) in bypass_rules["aliases"]:
+            predictions.append(prediction_record(this_id, sentence, alias, resource, 1, confidence, routing="bypass"))
+        else:
+            remaining_pairs.append((sentence, alias, resource))
+            remaining_spans.append(spans[i] if spans else None)
+    routing["bypass"] += len(predictions)
+
+    return predictions, remaining_pairs, (remaining_spans if spans else None)
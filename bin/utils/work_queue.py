@@ -0,0 +1,199 @@
+"""
+A local work queue of PMC IDs in a SQLite file, for dynamic scheduling instead of static equal-size chunks.
+
+query_europepmc.py --work_queue fills the queue (in numeric PMC ID order) ; worker processes
+(stream_classify_articles.py --work_queue) then claim small batches until the queue is empty, so that
+a run's tail is set by its slowest batch rather than its slowest chunk.
+
+A claimed batch is leased to its worker for `lease_s` seconds, and the worker's leases are renewed by
+a heartbeat while it runs. Leases of a worker that dies expire and are claimed again by the others ;
+items leased `max_attempts` times without completing are marked failed (see `retry_failed`).
+A batch is completed together with its results, in one transaction : results of a worker whose
+lease was lost (and reclaimed) are rejected, so every item is counted once.
+
+The queue relies on SQLite locking : keep the file on local disk (or a filesystem with working POSIX
+locks) and run the workers on that machine.
+"""
+
+import sys
+import json
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from gbcutils import metrics
+
+VERBOSE = False
+
+_schema = [
+    """CREATE TABLE IF NOT EXISTS items (
+        item TEXT PRIMARY KEY, seq INTEGER NOT NULL, state TEXT NOT NULL DEFAULT 'pending',
+        worker TEXT, lease_expires REAL, attempts INTEGER NOT NULL DEFAULT 0)""",
+    "CREATE INDEX IF NOT EXISTS items_state ON items (state, seq)",
+    """CREATE TABLE IF NOT EXISTS results (
+        batch INTEGER PRIMARY KEY AUTOINCREMENT, worker TEXT, items INTEGER, finished REAL, payload TEXT)""",
+]
+states = ["pending", "leased", "done", "failed"]
+
+class WorkQueue:
+    def __init__(self, path, lease_s=600, max_attempts=3):
+        self.path = path
+        self.lease_s = lease_s
+        self.max_attempts = max_attempts
+        with self._transaction() as conn:
+            for ddl in _schema:
+                conn.execute(ddl)
+
+    @contextmanager
+    def _transaction(self):
+        # one short-lived connection per call : safe from any thread, and BEGIN IMMEDIATE takes the
+        # write lock up front so two workers never claim the same rows
+        conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+
+    def add(self, items):
+        """Queue `items` (in order) ; items already in the queue are left as they are. Returns the number added."""
+        with self._transaction() as conn:
+            (seq,) = conn.execute("SELECT COALESCE(MAX(seq), -1) + 1 FROM items").fetchone()
+            before = conn.total_changes
+            conn.executemany("INSERT OR IGNORE INTO items (item, seq) VALUES (?, ?)", ((item, seq + i) for i, item in enumerate(items)))
+            return conn.total_changes - before
+
+    def claim(self, worker, batch_size):
+        """Lease up to `batch_size` pending items (or items whose lease expired) to `worker`, in queue order."""
+        now = time.time()
+        with self._transaction() as conn:
+            while True:
+                rows = conn.execute(
+                    "SELECT item, state, attempts FROM items WHERE state = 'pending' OR (state = 'leased' AND lease_expires < ?) ORDER BY seq LIMIT ?",
+                    (now, batch_size),
+                ).fetchall()
+                exhausted = [item for item, _, attempts in rows if attempts >= self.max_attempts]
+                if exhausted:
+                    conn.executemany("UPDATE items SET state = 'failed', worker = NULL, lease_expires = NULL WHERE item = ?", ((i,) for i in exhausted))
+                    metrics.incr("workqueue.failed", len(exhausted))
+                    print(f"⚠️ Giving up on {len(exhausted)} items after {self.max_attempts} attempts: {', '.join(exhausted[:5])}") if VERBOSE else None
+                    continue
+                break
+            batch = [item for item, _, _ in rows]
+            conn.executemany(
+                "UPDATE items SET state = 'leased', worker = ?, lease_expires = ?, attempts = attempts + 1 WHERE item = ?",
+                ((worker, now + self.lease_s, item) for item in batch),
+            )
+        reclaimed = sum(1 for _, state, _ in rows if state == "leased")
+        metrics.incr("workqueue.claims")
+        metrics.incr("workqueue.items_claimed", len(batch))
+        metrics.incr("workqueue.items_reclaimed", reclaimed)
+        print(f"📋 {worker} claimed {len(batch)} items ({reclaimed} from expired leases)") if VERBOSE and batch else None
+        return batch
+
+    def renew(self, worker):
+        """Extend all of `worker`'s leases by `lease_s` from now."""
+        with self._transaction() as conn:
+            conn.execute("UPDATE items SET lease_expires = ? WHERE state = 'leased' AND worker = ?", (time.time() + self.lease_s, worker))
+
+    def complete(self, worker, items, result=None):
+        """
+        Mark `items` done and store `result` (JSON-serialisable) for them, if `worker` still holds all
+        their leases. Returns False, storing nothing, if any lease was lost to another worker.
+        """
+        with self._transaction() as conn:
+            held = conn.execute(
+                f"SELECT COUNT(*) FROM items WHERE state = 'leased' AND worker = ? AND item IN ({','.join('?' * len(items))})",
+                [worker] + list(items),
+            ).fetchone()[0]
+            if held != len(items):
+                metrics.incr("workqueue.leases_lost")
+                print(f"⚠️ {worker} lost the lease on {len(items) - held} of {len(items)} items : discarding its results") if VERBOSE else None
+                return False
+            conn.executemany("UPDATE items SET state = 'done', lease_expires = NULL WHERE item = ?", ((i,) for i in items))
+            if result is not None:
+                conn.execute(
+                    "INSERT INTO results (worker, items, finished, payload) VALUES (?, ?, ?, ?)",
+                    (worker, len(items), time.time(), json.dumps(result, separators=(",", ":"))),
+                )
+        metrics.incr("workqueue.items_done", len(items))
+        return True
+
+    def release(self, worker):
+        """Return all of `worker`'s leased items to the queue (e.g. when the worker fails cleanly)."""
+        with self._transaction() as conn:
+            conn.execute("UPDATE items SET state = 'pending', worker = NULL, lease_expires = NULL WHERE state = 'leased' AND worker = ?", (worker,))
+
+    def retry_failed(self):
+        """Queue failed items again, with their attempts reset. Returns the number requeued."""
+        with self._transaction() as conn:
+            return conn.execute("UPDATE items SET state = 'pending', attempts = 0 WHERE state = 'failed'").rowcount
+
+    def counts(self):
+        """Return {state: number of items}."""
+        with self._transaction() as conn:
+            counts = dict(conn.execute("SELECT state, COUNT(*) FROM items GROUP BY state").fetchall())
+        return {state: counts.get(state, 0) for state in states}
+
+    def _next_expiry(self, worker):
+        with self._transaction() as conn:
+            return conn.execute("SELECT MIN(lease_expires) FROM items WHERE state = 'leased' AND worker != ?", (worker,)).fetchone()[0]
+
+    def batches(self, worker, batch_size, poll_s=10):
+        """
+        Yield batches claimed by `worker` until no items are pending or leased to other workers. When the
+        remaining items are all leased to other workers, wait for them to complete, or for their leases
+        to expire : an empty batch is yielded before each wait, for the caller to finish the work in hand.
+        """
+        while True:
+            batch = self.claim(worker, batch_size)
+            if batch:
+                yield batch
+                continue
+            next_expiry = self._next_expiry(worker)
+            if next_expiry is None:
+                return
+            yield []
+            with metrics.timer("workqueue.idle_s"):
+                time.sleep(min(poll_s, max(0.1, next_expiry - time.time())))
+
+    def results(self):
+        """Yield the stored result of each completed batch, in completion order."""
+        conn = sqlite3.connect(self.path, timeout=60)
+        try:
+            for (payload,) in conn.execute("SELECT payload FROM results ORDER BY batch"):
+                yield json.loads(payload)
+        finally:
+            conn.close()
+
+    @contextmanager
+    def heartbeat(self, worker, interval_s=None):
+        """
+        Renew `worker`'s leases every `interval_s` seconds (a third of the lease) while in the block.
+        A failed renewal (e.g. the queue stayed locked by other workers) is reported and tried again at
+        the next beat : the heartbeat keeps running, so a lease only expires after repeated failures.
+        """
+        interval_s = interval_s or self.lease_s / 3
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(interval_s):
+                try:
+                    self.renew(worker)
+                except Exception as e:
+                    metrics.incr("workqueue.renew_failures")
+                    print(f"⚠️ {worker} could not renew its leases ({e}) - retrying in {interval_s:g}s", file=sys.stderr)
+        thread = threading.Thread(target=beat, daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+
+"""
+Manage a work queue of PMC IDs (see gbcutils.work_queue) shared by stream_classify_articles.py --work_queue workers :
+  create       queue the PMC IDs of one or more id list files (query_europepmc.py --work_queue does this itself)
+  status       print the number of pending, leased, done and failed PMC IDs
+  retry_failed queue the failed PMC IDs again
+  export       write the mentions summary and prediction counts of every completed batch, in the same
+               formats as classify_resource_mentions.py
+"""
+
+import sys
+import json
+import argparse
+
+from gbcutils.work_queue import WorkQueue
+from gbcutils import prediction_counts
+
+parser = argparse.ArgumentParser(description="Manage a PMC ID work queue.")
+parser.add_argument("command", choices=["create", "status", "retry_failed", "export"], help="Action to run on the queue")
+parser.add_argument("--queue", type=str, required=True, help="Work queue SQLite file")
+parser.add_argument("--idlist", type=str, nargs="+", default=[], help="create: files containing lists of PMC IDs")
+parser.add_argument("--mentions_out", type=str, default="resource_mentions_summary.csv", help="export: output file for resource mentions")
+parser.add_argument("--counts_out", type=str, default="prediction_counts.json.gz", help="export: output file for prediction counts")
+parser.add_argument("--verbose", action="store_true", help="Enable verbose output")
+args = parser.parse_args()
+
+wq = WorkQueue(args.queue)
+
+if args.command == "create":
+    if not args.idlist:
+        parser.error("create requires --idlist")
+    for path in args.idlist:
+        with open(path) as fh:
+            added = wq.add(line.strip() for line in fh if line.strip())
+        print(f"📋 Queued {added} PMC IDs from {path}") if args.verbose else None
+    print(json.dumps(wq.counts()))
+
+elif args.command == "status":
+    print(json.dumps(wq.counts()))
+
+elif args.command == "retry_failed":
+    print(f"🔁 Requeued {wq.retry_failed()} failed PMC IDs")
+
+elif args.command == "export":
+    import pandas as pd
+    from gbcutils.scibert_classify import summary_columns
+
+    mention_rows, counts, batches = [], {}, 0
+    for result in wq.results():
+        mention_rows.extend(result["mentions"])
+        prediction_counts.merge_into(counts, prediction_counts.from_rows(result["counts"]))
+        batches += 1
+
+    summary_df = pd.DataFrame(mention_rows, columns=summary_columns).sort_values(['id', 'resource_name', 'matched_alias'])
+    summary_df.to_csv(args.mentions_out, index=False)
+    prediction_counts.dump(counts, args.counts_out)
+
+    status = wq.counts()
+    print(f"🏁 Exported {len(summary_df)} mentions from {batches} batches ({status['done']} PMC IDs done)")
+    if status["pending"] or status["leased"] or status["failed"]:
+        print(f"⚠️ Queue not finished : {status}", file=sys.stderr)
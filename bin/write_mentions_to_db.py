@@ -6,17 +6,20 @@ For each resource mention classification in a CSV file, write the mentions to th
 This includes creating Publication and ResourceMention objects in the GBC database using the
 GlobalBioData Python API (https://globalbiodata.github.io/gbc-publication-analysis/), and
 metadata from Europe PMC, saved in sharded JSONL files.
+
+With --bulk, nothing is written to the database : the publication and mention rows are saved to a
+load file instead, for bulk_load_mentions.py to load every chunk in one go. Publications are then
+written as a reduced record, without affiliations or grants (see gbcutils.bulk_load).
 """
 
 import argparse
 import json
 import os
+import time
 from pprint import pprint
-import pandas as pd
 
-from gbcutils.db import get_gbc_connection
 from gbcutils.metadata import get_article_metadata, sort_ids_by_shard
-import globalbiodata as gbc
+from gbcutils import metrics, bulk_load, profiling
 
 
 parser = argparse.ArgumentParser()
@@ -29,12 +32,25 @@ parser.add_argument("--db-credentials", help="Path to DB credentials JSON")
 parser.add_argument("--dry-run", action="store_true", help="If set, do not write to DB")
 parser.add_argument("--test", action="store_true", help="Use test database instead of production")
 parser.add_argument("--debug", action="store_true", help="Enable debug mode when writing to DB")
+parser.add_argument("--bulk", action="store_true", help="Write a load file for bulk_load_mentions.py instead of writing to the DB")
+parser.add_argument("--load-file", help="Load file to write with --bulk (default: <classifications name>.load.json.gz in the working directory)")
+parser.add_argument("--profile", action="store_true", help="Sample the run and write a collapsed-stack flamegraph (.profile.folded) and hotspot summary (.profile.txt) next to the metrics file")
+parser.add_argument("--metrics-out", help="JSON file to write task metrics to (default: <classifications name>.db_write.metrics.json in the working directory)")
 args = parser.parse_args()
 
+metrics_path = args.metrics_out or os.path.splitext(os.path.basename(args.classifications))[0] + ".db_write.metrics.json"
+if args.profile:
+    profiling.start(profiling.prefix_for(metrics_path))
+
+# imported after argument parsing to keep --help fast
+import pandas as pd
+if not args.bulk:
+    import globalbiodata as gbc
+
 # Load classifications data
 classifications_df = pd.read_csv(args.classifications)
-# Sort by shard grouping
-sorted_ids = sort_ids_by_shard(classifications_df['id'], shards=args.shards)
+# Sort by shard grouping (unique ids : .loc repeats every row of an id once per id given)
+sorted_ids = sort_ids_by_shard(classifications_df['id'].unique(), shards=args.shards)
 classifications_df = classifications_df.set_index('id').loc[sorted_ids].reset_index()
 
 print(f"[INFO] Loaded {len(classifications_df)} classifications from {args.classifications}")
@@ -54,28 +70,39 @@ resources_metadata = { # map names to ids : easy lookup for DB write
 
 # Create GCB version object
 version_info = json.load(open(args.version_json))
-gbc_version = gbc.Version(version_info)
+gbc_version = gbc.Version(version_info) if not args.bulk else None
 
 
-# Connect to the database
-# Load DB credentials
-db_creds = json.load(open(args.db_credentials))
-if not db_creds:
-    raise ValueError("DB credentials are required for writing to the database.")
+# Connect to the database (not needed for a dry run, or to write a load file)
+gcp_connector, db_engine, db_conn = None, None, None
+if not args.dry_run and not args.bulk:
+    from gbcutils.gbc_db import get_gbc_connection
 
-# Get DB connection
-gcp_connector, db_engine, db_conn = get_gbc_connection(
-    test=args.test,
-    readonly=False,
-    sqluser=db_creds['user'],
-    sqlpass=db_creds['pass']
-)
+    # Load DB credentials
+    db_creds = json.load(open(args.db_credentials))
+    if not db_creds:
+        raise ValueError("DB credentials are required for writing to the database.")
+
+    # Get DB connection
+    gcp_connector, db_engine, db_conn = get_gbc_connection(
+        test=args.test,
+        readonly=False,
+        sqluser=db_creds['user'],
+        sqlpass=db_creds['pass']
+    )
 
 # Parse classifications and prepare data for DB insertion
+metrics.define_rate("db.rows_per_s", "db.rows", "db.write_s")
+publications, mentions = {}, [] # --bulk : rows for the load file
+reduced = {} # --bulk : publications with affiliations / grants the load file leaves out
+if args.bulk:
+    print("[WARNING] --bulk writes a reduced publication record : affiliations and grants are not written to the database")
 try:
     previous_publication = None
     x, batch_size = 1, 1
+    write_start = time.perf_counter()
     for row in classifications_df.itertuples(index=False):
+        metrics.incr("db.rows_read")
         article_id = row.id
         resource = row.resource_name
         matched_alias = row.matched_alias
@@ -86,14 +113,27 @@ try:
         article_metadata = get_article_metadata(article_id, basepath=args.metadata_dir, shards=args.shards)
         if not article_metadata:
             print(f"[WARNING] No metadata found for article ID {article_id}. Skipping.")
+            metrics.incr("db.rows_skipped")
             continue
         if not article_metadata.get('title') or not article_metadata.get('authorList') or article_metadata.get('citedByCount') is None:
             print(f"[WARNING] Incomplete metadata for article ID {article_id}. Skipping.")
+            metrics.incr("db.rows_skipped")
             continue
 
         resource_id = resources_metadata.get(resource)
         if not resource_id:
             print(f"[WARNING] No resource ID found for resource {resource}. Skipping.")
+            metrics.incr("db.rows_skipped")
+            continue
+
+        if args.bulk:
+            pmc_id = article_metadata.get('pmcid') or article_id
+            if pmc_id not in publications:
+                publications[pmc_id] = bulk_load.publication_row(article_metadata)
+                for field in bulk_load.reduced_fields(article_metadata):
+                    reduced[field] = reduced.get(field, 0) + 1
+            mentions.append(bulk_load.mention_row(pmc_id, resource_id, matched_alias, match_count, mean_confidence))
+            metrics.incr("db.rows")
             continue
 
         mentions_data = {
@@ -105,6 +145,7 @@ try:
             "mean_confidence": mean_confidence,
         }
 
+        metrics.incr("db.rows")
         if args.dry_run:
             print(f"[DRY RUN] Would insert: \n{mentions_data.__str__()}")
         else:
@@ -118,19 +159,32 @@ try:
                 pprint(article_metadata) if args.debug else None
                 gbc_publication = gbc.new_publication_from_EuropePMC_result(article_metadata, google_maps_api_key=os.environ.get('GOOGLE_MAPS_API_KEY'))
                 # gbc_publication.write(conn=db_conn, debug=args.debug)
-                gbc_publication.write(engine=db_engine, debug=args.debug)
+                with profiling.section("db_write"):
+                    gbc_publication.write(engine=db_engine, debug=args.debug)
+                metrics.incr("db.publications_written")
 
             print("[INFO] working with publication: ", gbc_publication) if args.debug else None
             mentions_data["publication"] = gbc_publication
 
             gbc_mention = gbc.ResourceMention(mentions_data)
-            gbc_mention.write(conn=db_conn, debug=args.debug)
+            with metrics.timer("db.mention_write_s"), profiling.section("db_write"):
+                gbc_mention.write(conn=db_conn, debug=args.debug)
+            metrics.incr("db.mentions_written")
             previous_publication = gbc_publication
 
             if x % batch_size == 0:
                 print("📥 Committing transaction...") if args.debug else None
-                db_conn.commit()
+                with metrics.timer("db.commit_s"), profiling.section("db_write"):
+                    db_conn.commit()
             x += 1
+    if args.bulk:
+        load_file = args.load_file or os.path.splitext(os.path.basename(args.classifications))[0] + ".load.json.gz"
+        bulk_load.dump_load_file(load_file, version_info, list(publications.values()), mentions)
+        print(f"[INFO] Wrote {len(publications)} publications and {len(mentions)} mentions to {load_file}")
+        for field, n in reduced.items():
+            print(f"[WARNING] {n} of {len(publications)} publications have {field} that bulk mode does not write")
+            metrics.incr(f"db.bulk_publications_without_{field}", n)
+    metrics.observe("db.write_s", time.perf_counter() - write_start)
 
 finally:
     # Clean shutdown
@@ -147,4 +201,5 @@ finally:
     try:
         gcp_connector.close()
     except Exception:
-        pass
\ No newline at end of file
+        pass
+    metrics.dump(metrics_path, task="write_mentions_to_db")
\ No newline at end of file
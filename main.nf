@@ -2,7 +2,11 @@ nextflow.enable.dsl=2
 
 include { FETCH_RESOURCE_LIST         } from './modules/FetchResourceList.nf'
 include { WRITE_TO_DB                 } from './modules/WriteMentionsToDB.nf'
+include { BULK_LOAD_MENTIONS          } from './modules/BulkLoadMentions.nf'
+include { MERGE_PREDICTION_COUNTS     } from './modules/MergePredictionCounts.nf'
 include { RESOURCE_SPECIFICITY_SCORES } from './modules/ResourceSpecificityScores.nf'
+include { STREAM_CLASSIFY_ARTICLES    } from './modules/StreamClassifyArticles.nf'
+include { AGGREGATE_METRICS           } from './modules/AggregateMetrics.nf'
 
 include { PREPARE_TEXTS  } from './subworkflows/PrepareTexts.nf'
 include { CLASSIFY_TEXTS } from './subworkflows/ClassifyTexts.nf'
@@ -11,7 +15,8 @@ include { CLASSIFY_TEXTS } from './subworkflows/ClassifyTexts.nf'
 // Run the workflow
 workflow {
     main:
-        resources_json = FETCH_RESOURCE_LIST(params.aliases_json)
+        resource_list = FETCH_RESOURCE_LIST(params.aliases_json)
+        resources_json = resource_list.resource_list
 
         // This version of the subworkflow fetches EuropePMC full text articles and preprocesses them.
         // Replace with your own data source as required.
@@ -19,21 +24,41 @@ workflow {
 		// texts.text_dirs | view { "PREPARED TEXTS: TEXT_DIRS: $it" }
         texts.metadata_dir | view { "PREPARED TEXTS: METADATA DIR: $it" }
 
-        // fan out chunks and classify each batch of texts
-        classified_texts = CLASSIFY_TEXTS(texts.text_dirs, resources_json)
+        // fan out chunks and classify each batch of texts, or with classify_mode = 'streaming',
+        // fetch, preprocess and classify each chunk in a single task
+        if (params.classify_mode == 'streaming') {
+            classified_texts = STREAM_CLASSIFY_ARTICLES(texts.idlists, resources_json, resource_list.matcher)
+        } else {
+            classified_texts = CLASSIFY_TEXTS(texts.text_dirs, resources_json, resource_list.matcher)
+        }
         classified_texts.classifications | view { "CLASSIFIED TEXTS: CLASSIFICATIONS: $it" }
         classified_texts.resource_counts | view { "CLASSIFIED TEXTS: RESOURCE_COUNTS: $it" }
 
-        // Write each classification to DB (separately per chunk)
-        WRITE_TO_DB(classified_texts.classifications, texts.metadata_dir, resources_json)
+        // Write each classification to DB (separately per chunk), or with db_write_mode = 'bulk',
+        // write a load file per chunk and load them all in a single job
+        db_writes = WRITE_TO_DB(classified_texts.classifications, texts.metadata_dir, resources_json)
+        db_metrics = db_writes.metrics
+        if (params.db_write_mode == 'bulk') {
+            bulk_load = BULK_LOAD_MENTIONS(db_writes.load_files.collect())
+            db_metrics = db_metrics.mix(bulk_load.metrics)
+        }
 
-        // Collect all resource counts and merge/collate
+        // Merge resource counts in batches as chunks finish (a tree-reduce : the final step only
+        // merges one partial count file per batch), then score the merged counts
         classified_texts.resource_counts
         | map { _meta, file -> file }   // drop meta
         // | view { "RESOURCE COUNTS FILES (a): $it" }
+        | buffer(size: params.counts_merge_fanin, remainder: true)
+        | MERGE_PREDICTION_COUNTS
         | collect
         | set { resource_counts_files }
 
         resource_counts_files | view { "RESOURCE COUNTS FILES: $it" }
         RESOURCE_SPECIFICITY_SCORES(resource_counts_files)
+
+        // Merge the per-task metrics files of every stage and chunk
+        texts.metrics
+        | mix(classified_texts.metrics, db_metrics)
+        | collect
+        | AGGREGATE_METRICS
 }
@@ -0,0 +1,18 @@
+// Merges the per-task metrics JSON files of a run into a single summary (wrapper for aggregate_metrics.py)
+
+process AGGREGATE_METRICS {
+    tag "aggregate_metrics"
+    label 'process_tiny'
+    // debug true
+
+    input:
+    path metrics_files
+
+    output:
+    path("run_metrics.json"), emit: run_metrics
+
+    script:
+    """
+    aggregate_metrics.py ${metrics_files.join(' ')} --out run_metrics.json ${task.ext.args ?: ''}
+    """
+}
@@ -0,0 +1,18 @@
+// Bulk loads the per-chunk mention load files into the database in one job (wrapper for bulk_load_mentions.py)
+
+process BULK_LOAD_MENTIONS {
+    tag "bulk_load_mentions"
+    label 'process_single'
+    // debug true
+
+    input:
+    path load_files
+
+    output:
+    path("*.metrics.json"), emit: metrics
+
+    script:
+    """
+    bulk_load_mentions.py ${load_files.join(' ')} ${task.ext.args ?: ''}
+    """
+}
@@ -1,4 +1,5 @@
 // Fetches and preprocesses XML articles from Europe PMC given a list of article IDs (wrapper for fetch_and_preprocess_article.py)
+// The output directory holds the chunk's articles packed into a single indexed articles.jsonl.gz (see gbcutils/article_pack.py)
 
 process FETCH_AND_PREPROCESS_ARTICLE {
     tag "fetch_and_preprocess_article.chunk_${meta.chunk}"
@@ -10,6 +11,7 @@ process FETCH_AND_PREPROCESS_ARTICLE {
 
     output:
     tuple val(meta), path(outdir), emit: results_dir
+    path("*.metrics.json"), emit: metrics
 
     script:
     outdir = "article_texts.${meta.chunk}"
@@ -10,9 +10,10 @@ process FETCH_RESOURCE_LIST {
 
     output:
     path("resource_list.json"), emit: resource_list
+    path("resource_list.matcher.json"), emit: matcher
 
     script:
     """
-    fetch_resource_list.py --out resource_list.json --aliases ${aliases_json} ${task.ext.args}
+    fetch_resource_list.py --out resource_list.json --aliases ${aliases_json} --matcher_out resource_list.matcher.json --case_sensitive_resources '${params.case_sensitive_resources}' ${task.ext.args}
     """
 }
\ No newline at end of file
@@ -0,0 +1,18 @@
+// Merges a batch of prediction count files into one (wrapper for merge_prediction_counts.py)
+
+process MERGE_PREDICTION_COUNTS {
+    tag "merge_prediction_counts"
+    label 'process_tiny'
+    // debug true
+
+    input:
+    path counts_files
+
+    output:
+    path("prediction_counts.merged.*.json.gz"), emit: counts
+
+    script:
+    """
+    merge_prediction_counts.py ${counts_files.join(' ')} --out prediction_counts.merged.${task.index}.json.gz ${task.ext.args ?: ''}
+    """
+}
@@ -11,6 +11,8 @@ process QUERY_EUROPEPMC {
     output:
     path("epmc_results/metadata/"), emit: metadata_dir
     path("epmc_results/pmc_idlist.chunk_*.txt"), emit: idlists
+    path("epmc_results/pmc_ids.pmcset"), emit: pmcid_set
+    path("epmc_results/*.metrics.json"), emit: metrics
 
     script:
     """
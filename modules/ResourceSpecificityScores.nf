@@ -10,9 +10,10 @@ process RESOURCE_SPECIFICITY_SCORES {
 
     output:
     path("resource_specificity_scores.csv"), emit: scores_csv
+    path("prediction_counts.json.gz"), emit: counts
 
     script:
     """
-    resource_specificity_scores.py ${resource_counts_files.join(' ')}
+    resource_specificity_scores.py ${resource_counts_files.join(' ')} --counts_out prediction_counts.json.gz ${task.ext.args ?: ''}
     """
-}
\ No newline at end of file
+}
@@ -8,15 +8,17 @@ process SCIBERT_RESOURCE_CLASSIFIER {
     input:
     tuple val(meta), path(input_dir)
     path(resources)
+    path(matcher)
 
     output:
     tuple val(meta), path(mentions_out), emit: classifications
     tuple val(meta), path(counts_out), emit: resource_counts
+    path("*.metrics.json"), emit: metrics
 
     script:
     mentions_out = "resource_mentions_summary.${meta.chunk}.csv"
-    counts_out = "prediction_counts.${meta.chunk}.pkl"
+    counts_out = "prediction_counts.${meta.chunk}.json.gz"
     """
-    classify_resource_mentions.py --indir ${input_dir} --resources ${resources} --mentions_out ${mentions_out} --counts_out ${counts_out} ${task.ext.args}
+    classify_resource_mentions.py --indir ${input_dir} --resources ${resources} --matcher ${matcher} --mentions_out ${mentions_out} --counts_out ${counts_out} ${task.ext.args}
     """
 }
\ No newline at end of file
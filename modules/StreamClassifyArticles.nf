@@ -0,0 +1,24 @@
+// Fetches, preprocesses and classifies a chunk of articles in one streaming task, without intermediate text files (wrapper for stream_classify_articles.py)
+
+process STREAM_CLASSIFY_ARTICLES {
+    tag "stream_classify_articles.chunk_${meta.chunk}"
+    label 'process_gpu'
+    // debug true
+
+    input:
+    tuple val(meta), val(idlist)
+    path(resources)
+    path(matcher)
+
+    output:
+    tuple val(meta), path(mentions_out), emit: classifications
+    tuple val(meta), path(counts_out), emit: resource_counts
+    path("*.metrics.json"), emit: metrics
+
+    script:
+    mentions_out = "resource_mentions_summary.${meta.chunk}.csv"
+    counts_out = "prediction_counts.${meta.chunk}.json.gz"
+    """
+    stream_classify_articles.py --idlist ${idlist} --resources ${resources} --matcher ${matcher} --mentions_out ${mentions_out} --counts_out ${counts_out} ${task.ext.args}
+    """
+}
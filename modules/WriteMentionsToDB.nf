@@ -10,8 +10,9 @@ process WRITE_TO_DB {
     path(texts_metadata_dir)
     path(resources_json)
 
-    // output:
-    // tuple val(meta), path("resource_mentions_summary.csv"), emit: classifications
+    output:
+    path("*.metrics.json"), emit: metrics
+    path("*.load.json.gz"), optional: true, emit: load_files // with --bulk (params.db_write_mode = 'bulk')
 
     script:
     """
@@ -4,15 +4,17 @@ workflow CLASSIFY_TEXTS {
     take:
         meta_text_ch // this is a tuple of (meta, text_dir)
         resources
+        matcher // alias matcher saved alongside the resource list
 
     main:
-        classifier = SCIBERT_RESOURCE_CLASSIFIER(meta_text_ch, resources)
+        classifier = SCIBERT_RESOURCE_CLASSIFIER(meta_text_ch, resources, matcher)
 
     emit:
         classifications = classifier.classifications
         resource_counts = classifier.resource_counts
+        metrics = classifier.metrics
 }
 
 workflow {
-    CLASSIFY_TEXTS(params.meta_text_ch, params.resource_list)
+    CLASSIFY_TEXTS(params.meta_text_ch, params.resource_list, params.resource_matcher)
 }
\ No newline at end of file
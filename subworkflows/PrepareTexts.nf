@@ -20,11 +20,21 @@ workflow PREPARE_TEXTS {
         }
 		| set {idlist_chunks}
 
-        article_text_dirs = FETCH_AND_PREPROCESS_ARTICLE(idlist_chunks)
+        // in streaming mode, articles are fetched by the classifier itself (STREAM_CLASSIFY_ARTICLES)
+        if (params.classify_mode == 'streaming') {
+            text_dirs = Channel.empty()
+            prepare_metrics = query.metrics
+        } else {
+            preprocessed = FETCH_AND_PREPROCESS_ARTICLE(idlist_chunks)
+            text_dirs = preprocessed.results_dir
+            prepare_metrics = query.metrics.mix(preprocessed.metrics)
+        }
 
     emit:
-        text_dirs = article_text_dirs
+        text_dirs = text_dirs
+        idlists = idlist_chunks
         metadata_dir = query.metadata_dir
+        metrics = prepare_metrics
 }
 
 workflow {
@@ -0,0 +1,17 @@
+"""
+Shared setup for the unit tests : make `gbcutils` importable from the checkout (bin/utils), as the
+pipeline's conda environment and the benchmark suite do.
+"""
+
+import os
+import sys
+import tempfile
+
+utils_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bin", "utils")
+
+try:
+    import gbcutils  # noqa: F401
+except ImportError:
+    link_dir = tempfile.mkdtemp(prefix="gbcutils_")
+    os.symlink(utils_dir, os.path.join(link_dir, "gbcutils"))
+    sys.path.insert(0, link_dir)
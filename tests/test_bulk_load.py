@@ -0,0 +1,141 @@
+"""
+`BulkLoader` against a SQLite stand-in : load files are staged and upserted the way
+bulk_load_mentions.py does it, one connection per load.
+"""
+
+import sqlite3
+
+import pytest
+
+from gbcutils import bulk_load
+
+VERSION = {"name": "2026-10", "date": "2026-10-01", "user": "gbc"}
+
+def _meta(pmcid, title, cited_by=0):
+    return {"pmcid": pmcid, "pmid": pmcid[3:], "title": title, "firstPublicationDate": "2024-01-01",
+            "authorString": "Doe J, Roe R.", "citedByCount": cited_by, "keywordList": {"keyword": ["genomics"]}}
+
+def _load_file(path, publications, mentions):
+    bulk_load.dump_load_file(
+        str(path), VERSION, [bulk_load.publication_row(meta) for meta in publications],
+        [bulk_load.mention_row(*m) for m in mentions],
+    )
+    return str(path)
+
+@pytest.fixture
+def load_files(tmp_path):
+    first = _load_file(tmp_path / "chunk_1.load.json.gz",
+        [_meta("PMC1", "First"), _meta("PMC2", "Second")],
+        [("PMC1", 10, "ENA", 2, 0.97), ("PMC1", 20, "UniProt", 1, 0.93), ("PMC2", 10, "European Nucleotide Archive", 3, 0.99)])
+    second = _load_file(tmp_path / "chunk_2.load.json.gz",
+        [_meta("PMC3", "Third")],
+        [("PMC3", 20, "UniProtKB", 4, 0.95)])
+    return [first, second]
+
+def _bulk_load(db_path, paths, create_tables=True):
+    conn, dialect, close = bulk_load.connect(db_url=f"sqlite:///{db_path}")
+    try:
+        loader = bulk_load.BulkLoader(conn, dialect, batch_size=2)
+        if create_tables:
+            loader.create_target_tables()
+        loader.check_schema()
+        loader.create_staging_tables()
+        for path in paths:
+            loader.stage(bulk_load.read_load_file(path))
+        loader.upsert()
+        loader.commit()
+    finally:
+        close()
+
+def _rows(db_path, sql):
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute(sql).fetchall()
+
+def _mentions(db_path):
+    return _rows(db_path, """
+        SELECT m.id, p.pmc_id, m.resource_id, v.name, m.matched_alias, m.match_count, m.mean_confidence
+        FROM resource_mention m JOIN publication p ON p.id = m.publication_id JOIN version v ON v.id = m.version_id
+        ORDER BY m.id""")
+
+def test_stages_and_upserts_two_files(tmp_path, load_files):
+    db_path = str(tmp_path / "gbc.db")
+    _bulk_load(db_path, load_files)
+    assert _rows(db_path, "SELECT name, date, user FROM version") == [("2026-10", "2026-10-01", "gbc")]
+    assert _rows(db_path, "SELECT pmc_id, publication_title, citation_count FROM publication ORDER BY pmc_id") == [
+        ("PMC1", "First", 0), ("PMC2", "Second", 0), ("PMC3", "Third", 0)
+    ]
+    assert [m[1:] for m in _mentions(db_path)] == [
+        ("PMC1", 10, "2026-10", "ENA", 2, 0.97),
+        ("PMC1", 20, "2026-10", "UniProt", 1, 0.93),
+        ("PMC2", 10, "2026-10", "European Nucleotide Archive", 3, 0.99),
+        ("PMC3", 20, "2026-10", "UniProtKB", 4, 0.95),
+    ]
+
+def test_reload_is_idempotent(tmp_path, load_files):
+    db_path = str(tmp_path / "gbc.db")
+    _bulk_load(db_path, load_files)
+    publications, mentions = _rows(db_path, "SELECT * FROM publication ORDER BY id"), _mentions(db_path)
+    _bulk_load(db_path, load_files)
+    assert _rows(db_path, "SELECT * FROM publication ORDER BY id") == publications
+    assert _mentions(db_path) == mentions
+    assert _rows(db_path, "SELECT COUNT(*) FROM version") == [(1,)]
+
+def test_reload_updates_in_place(tmp_path, load_files):
+    db_path = str(tmp_path / "gbc.db")
+    _bulk_load(db_path, load_files)
+    publication_ids = _rows(db_path, "SELECT id, pmc_id FROM publication ORDER BY id")
+    mention_ids = [m[0] for m in _mentions(db_path)]
+
+    changed = _load_file(tmp_path / "chunk_1.rerun.load.json.gz",
+        [_meta("PMC1", "First (corrected)", cited_by=7)],
+        [("PMC1", 10, "ENA", 5, 0.91)])
+    _bulk_load(db_path, [changed])
+
+    assert _rows(db_path, "SELECT id, pmc_id FROM publication ORDER BY id") == publication_ids
+    assert _rows(db_path, "SELECT publication_title, citation_count FROM publication WHERE pmc_id = 'PMC1'") == [("First (corrected)", 7)]
+    mentions = _mentions(db_path)
+    assert [m[0] for m in mentions] == mention_ids
+    assert mentions[0][1:] == ("PMC1", 10, "2026-10", "ENA", 5, 0.91)
+    assert mentions[1][1:] == ("PMC1", 20, "2026-10", "UniProt", 1, 0.93) # not in the new file : untouched
+
+def test_check_schema_accepts_stand_in(tmp_path):
+    conn, dialect, close = bulk_load.connect(db_url=f"sqlite:///{tmp_path / 'gbc.db'}")
+    try:
+        loader = bulk_load.BulkLoader(conn, dialect)
+        loader.create_target_tables()
+        loader.check_schema()
+    finally:
+        close()
+
+def test_check_schema_rejects_missing_unique_key(tmp_path, load_files):
+    db_path = str(tmp_path / "gbc.db")
+    conn, dialect, close = bulk_load.connect(db_url=f"sqlite:///{db_path}")
+    try:
+        loader = bulk_load.BulkLoader(conn, dialect)
+        loader.create_target_tables()
+        # publication without UNIQUE (pmc_id) : upserts would insert duplicates instead of updating
+        conn.execute("DROP TABLE publication")
+        conn.execute("""CREATE TABLE publication (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, pmc_id VARCHAR(32) NOT NULL, pubmed_id VARCHAR(32), publication_title TEXT,
+            publication_date VARCHAR(32), authors TEXT, citation_count INTEGER, keywords TEXT)""")
+        conn.commit()
+        with pytest.raises(ValueError, match=r"table publication has no unique key on \(pmc_id\)"):
+            loader.check_schema()
+    finally:
+        close()
+    # and the load stops before staging anything
+    with pytest.raises(ValueError, match="refusing to bulk load"):
+        _bulk_load(db_path, load_files, create_tables=False)
+    assert _rows(db_path, "SELECT COUNT(*) FROM publication") == [(0,)]
+
+def test_check_schema_rejects_missing_columns(tmp_path):
+    conn, dialect, close = bulk_load.connect(db_url=f"sqlite:///{tmp_path / 'gbc.db'}")
+    try:
+        conn.execute("CREATE TABLE version (id INTEGER PRIMARY KEY, name VARCHAR(255), UNIQUE (name))")
+        with pytest.raises(ValueError) as e:
+            bulk_load.BulkLoader(conn, dialect).check_schema()
+    finally:
+        close()
+    assert "table version has no column(s) date, user" in str(e.value)
+    assert "table publication does not exist" in str(e.value)
+    assert "table resource_mention does not exist" in str(e.value)
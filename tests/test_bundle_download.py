@@ -0,0 +1,148 @@
+"""
+`_download_gz_with_retry` against a local HTTP server that misbehaves on purpose : truncated bodies,
+corrupt gzip data, Range headers ignored and 416 answers. Each test scripts the server's responses
+in order, then checks the downloaded file and the requests the client made.
+"""
+
+import os
+import gzip
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from gbcutils import europepmc as epmc
+from gbcutils import metrics
+
+CHUNK_SIZE = 4096
+PAYLOAD = gzip.compress(random.Random(0).randbytes(200_000))
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        server.ranges.append(self.headers.get("Range"))
+        behaviour = server.script.pop(0) if server.script else "full"
+        if behaviour == "416":
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{len(server.body)}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if behaviour == "range" and self.headers.get("Range"):
+            first = int(self.headers["Range"].split("=")[1].rstrip("-"))
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {first}-{len(server.body) - 1}/{len(server.body)}")
+            body = server.body[first:]
+        else:
+            self.send_response(200)
+            body = server.body
+        if behaviour == "corrupt":
+            middle = len(body) // 2
+            body = body[:middle] + bytes(b ^ 0xFF for b in body[middle:middle + 64]) + body[middle + 64:]
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if behaviour == "truncate":
+            # announce the full length, send half of it and hang up
+            self.wfile.write(body[:len(body) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    httpd.body, httpd.script, httpd.ranges = PAYLOAD, [], []
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    httpd.url = f"http://127.0.0.1:{httpd.server_address[1]}/PMC1_PMC2.xml.gz"
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+@pytest.fixture(autouse=True)
+def no_waiting(monkeypatch):
+    # skip the jitter and back-off between attempts
+    monkeypatch.setattr(epmc.time, "sleep", lambda seconds: None)
+    metrics.reset()
+
+def _download(server, tmp_path, *script, max_attempts=6):
+    server.script.extend(script)
+    dest = str(tmp_path / "PMC1_PMC2.xml.gz")
+    return dest, epmc._download_gz_with_retry(server.url, dest, max_attempts=max_attempts, chunk_size=CHUNK_SIZE)
+
+def _counters():
+    return metrics.snapshot()["counters"]
+
+def _resumed_from(range_header):
+    """Offset of a 'bytes=<first>-' Range header : the whole chunks received before the connection dropped."""
+    first = int(range_header.split("=")[1].rstrip("-"))
+    assert 0 < first <= len(PAYLOAD) // 2 and first % CHUNK_SIZE == 0
+    return first
+
+def test_clean_download(server, tmp_path):
+    dest, result = _download(server, tmp_path, "full")
+    assert result == dest
+    assert open(dest, "rb").read() == PAYLOAD
+    assert server.ranges == [None]
+    assert not os.path.exists(dest + ".part")
+    assert _counters()["bundle.downloads"] == 1
+
+def test_truncated_body_resumes_with_range(server, tmp_path):
+    dest, _ = _download(server, tmp_path, "truncate", "range")
+    assert open(dest, "rb").read() == PAYLOAD
+    assert server.ranges[0] is None and len(server.ranges) == 2
+    _resumed_from(server.ranges[1])
+    assert _counters()["bundle.download_resumes"] == 1
+    assert _counters()["bundle.bytes_downloaded"] == len(PAYLOAD)
+
+def test_corrupt_gzip_restarts_from_zero(server, tmp_path):
+    dest, _ = _download(server, tmp_path, "corrupt", "full")
+    assert open(dest, "rb").read() == PAYLOAD
+    assert server.ranges == [None, None]
+    assert _counters()["bundle.download_failures"] == 1
+
+def test_range_ignored_restarts_from_zero(server, tmp_path):
+    # the server answers the resume request with the whole file (200, not 206)
+    dest, _ = _download(server, tmp_path, "truncate", "full")
+    assert open(dest, "rb").read() == PAYLOAD
+    assert server.ranges[0] is None and len(server.ranges) == 2
+    _resumed_from(server.ranges[1])
+    assert "bundle.download_resumes" not in _counters()
+
+def test_range_not_satisfiable_restarts_from_zero(server, tmp_path):
+    # a partial file left by an earlier run, that the server will not resume
+    dest = str(tmp_path / "PMC1_PMC2.xml.gz")
+    with open(dest + ".part", "wb") as fh:
+        fh.write(PAYLOAD[:len(PAYLOAD) // 3])
+    _download(server, tmp_path, "416", "full")
+    assert open(dest, "rb").read() == PAYLOAD
+    assert server.ranges == [f"bytes={len(PAYLOAD) // 3}-", None]
+
+def test_corrupt_partial_file_is_discarded(server, tmp_path):
+    dest = str(tmp_path / "PMC1_PMC2.xml.gz")
+    with open(dest + ".part", "wb") as fh:
+        fh.write(b"not gzip at all")
+    _download(server, tmp_path, "full")
+    assert open(dest, "rb").read() == PAYLOAD
+    assert server.ranges == [None]
+
+def test_gives_up_and_keeps_partial_file(server, tmp_path):
+    with pytest.raises(Exception):
+        _download(server, tmp_path, "truncate", "truncate", max_attempts=2)
+    dest = str(tmp_path / "PMC1_PMC2.xml.gz")
+    assert not os.path.exists(dest)
+    assert len(server.ranges) == 2
+    # the partial file is kept, and the next call resumes from its end
+    have = os.path.getsize(dest + ".part")
+    assert have == _resumed_from(server.ranges[1])
+    server.ranges.clear()
+    _download(server, tmp_path, "range")
+    assert open(dest, "rb").read() == PAYLOAD
+    assert server.ranges == [f"bytes={have}-"]
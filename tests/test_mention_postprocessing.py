@@ -0,0 +1,172 @@
+"""
+Pins the output of mention extraction (`get_resource_mentions`, `get_resource_mentions_match_first`)
+and of its shared post-processing stage (`resolve_overlapping_hits`, `postprocess_mentions`).
+
+The expected mentions in BASELINE_CASES are the output of `get_resource_mentions` as it was before
+overlaps were resolved by span, and the current code must still produce them. INTENDED_DIFFERENCES
+lists the inputs where the output deliberately changed, with the old and new output and the reason.
+
+Sentence splitting is replaced by a plain regex split : the NLTK model is not under test here, and
+the expected outputs were recorded with the same splitter.
+"""
+
+import re
+
+import pytest
+
+from gbcutils import scibert_classify as sc
+from gbcutils.scibert_classify import Mention
+
+RESOURCES = [
+    ["ENA", "European Nucleotide Archive", "Nucleotide Archive"],
+    ["Ensembl", "ENSEMBL"],
+    ["Ensembl Genomes"],
+    ["UniProt"],
+    ["UniProtKB"],
+    ["PDB", "Protein Data Bank"],
+    ["GEO", "Gene Expression Omnibus"],
+    ["Gene Ontology"],
+    ["OLS", "Ontology Lookup Service"],
+]
+CASE_SENSITIVE = ["GEO"]
+
+@pytest.fixture(autouse=True)
+def regex_sentences(monkeypatch):
+    monkeypatch.setattr(sc, "sent_tokenize", lambda text: [s for s in re.split(r"(?<=[.!?])\s+", text) if s])
+
+def _mentions(text):
+    return sorted(sc.get_resource_mentions(text, RESOURCES, case_sensitive_resources=CASE_SENSITIVE))
+
+def _match_first_mentions(text):
+    sentences, mentions = sc.get_resource_mentions_match_first(text, RESOURCES, case_sensitive_resources=CASE_SENSITIVE)
+    return sorted(sc.mentions_to_pairs(sentences, mentions))
+
+# (text, expected (sentence, alias, resource) mentions, sorted)
+BASELINE_CASES = [
+    ("No resources are named in this sentence.", []),
+    (
+        "Reads were deposited in the European Nucleotide Archive.",
+        [("Reads were deposited in the European Nucleotide Archive.", "European Nucleotide Archive", "ENA")],
+    ),
+    (
+        "Reads were deposited in the European Nucleotide Archive (ENA).",
+        [
+            ("Reads were deposited in the European Nucleotide Archive (ENA).", "ENA", "ENA"),
+            ("Reads were deposited in the European Nucleotide Archive (ENA).", "European Nucleotide Archive", "ENA"),
+        ],
+    ),
+    (
+        "Gene models were taken from Ensembl Genomes.",
+        [("Gene models were taken from Ensembl Genomes.", "Ensembl Genomes", "Ensembl Genomes")],
+    ),
+    (
+        "We used Ensembl. We used Ensembl.",
+        [("We used Ensembl.", "ENSEMBL", "Ensembl"), ("We used Ensembl.", "Ensembl", "Ensembl")],
+    ),
+    (
+        "Structures came from the PDB. Sequences came from UniProtKB.",
+        [("Sequences came from UniProtKB.", "UniProtKB", "UniProtKB"), ("Structures came from the PDB.", "PDB", "PDB")],
+    ),
+    (
+        "Archived in the European\nNucleotide   Archive.",
+        [("Archived in the European Nucleotide   Archive.", "European Nucleotide Archive", "ENA")],
+    ),
+    (
+        "Data from GEO and the Gene Expression Omnibus.",
+        [
+            ("Data from GEO and the Gene Expression Omnibus.", "GEO", "GEO"),
+            ("Data from GEO and the Gene Expression Omnibus.", "Gene Expression Omnibus", "GEO"),
+        ],
+    ),
+    ("The geo and geology surveys.", []),
+    ("See the protein data bank entry 1ABC.", [("See the protein data bank entry 1ABC.", "Protein Data Bank", "PDB")]),
+]
+
+@pytest.mark.parametrize("text,expected", BASELINE_CASES)
+def test_get_resource_mentions_baseline(text, expected):
+    assert _mentions(text) == sorted(expected)
+
+@pytest.mark.parametrize("text,expected", BASELINE_CASES)
+def test_match_first_agrees(text, expected):
+    assert _match_first_mentions(text) == sorted(expected)
+
+def test_case_sensitive_switch_baseline():
+    # over `case_sensitive_threshold` mentions of an alias : only sentences with its exact case are kept
+    text = " ".join(f"Record {i} is in uniprot." for i in range(sc.case_sensitive_threshold)) + " Record X is in UniProt."
+    assert _mentions(text) == [("Record X is in UniProt.", "UniProt", "UniProt")]
+
+def test_case_sensitive_switch_below_threshold_baseline():
+    text = " ".join(f"Record {i} is in uniprot." for i in range(sc.case_sensitive_threshold))
+    assert len(_mentions(text)) == sc.case_sensitive_threshold
+
+# (text, mentions before span-based resolution, mentions now, reason)
+INTENDED_DIFFERENCES = [
+    (
+        # The shorter alias also appears on its own. The old code dropped an alias from a sentence
+        # whenever its string was contained in another alias matched in that sentence, wherever the
+        # two matches were ; the standalone "Ensembl" is a real mention of a different resource.
+        "We used Ensembl Genomes and Ensembl.",
+        [("We used Ensembl Genomes and Ensembl.", "Ensembl Genomes", "Ensembl Genomes")],
+        [
+            ("We used Ensembl Genomes and Ensembl.", "ENSEMBL", "Ensembl"),
+            ("We used Ensembl Genomes and Ensembl.", "Ensembl", "Ensembl"),
+            ("We used Ensembl Genomes and Ensembl.", "Ensembl Genomes", "Ensembl Genomes"),
+        ],
+    ),
+    (
+        # Same rule, same resource : "Nucleotide Archive" is matched again on its own.
+        "Both the European Nucleotide Archive and the Nucleotide Archive mirror.",
+        [("Both the European Nucleotide Archive and the Nucleotide Archive mirror.", "European Nucleotide Archive", "ENA")],
+        [
+            ("Both the European Nucleotide Archive and the Nucleotide Archive mirror.", "European Nucleotide Archive", "ENA"),
+            ("Both the European Nucleotide Archive and the Nucleotide Archive mirror.", "Nucleotide Archive", "ENA"),
+        ],
+    ),
+    (
+        # The alias patterns match whole words, so "UniProt" never matched inside "UniProtKB" : the old
+        # code still dropped it, only because the alias strings are substrings of each other.
+        "UniProt and UniProtKB entries.",
+        [("UniProt and UniProtKB entries.", "UniProtKB", "UniProtKB")],
+        [("UniProt and UniProtKB entries.", "UniProt", "UniProt"), ("UniProt and UniProtKB entries.", "UniProtKB", "UniProtKB")],
+    ),
+    (
+        # Partially overlapping matches (neither alias contains the other) were both kept. The shared
+        # words name one resource at most, so only the longest match is kept : the classifier would
+        # otherwise be asked about two resources for the same words.
+        "Terms were browsed with the Gene Ontology Lookup Service.",
+        [
+            ("Terms were browsed with the Gene Ontology Lookup Service.", "Gene Ontology", "Gene Ontology"),
+            ("Terms were browsed with the Gene Ontology Lookup Service.", "Ontology Lookup Service", "OLS"),
+        ],
+        [("Terms were browsed with the Gene Ontology Lookup Service.", "Ontology Lookup Service", "OLS")],
+    ),
+]
+
+@pytest.mark.parametrize("text,before,after", INTENDED_DIFFERENCES)
+def test_intended_differences(text, before, after):
+    assert sorted(before) != sorted(after)
+    assert _mentions(text) == sorted(after)
+    assert _match_first_mentions(text) == sorted(after)
+
+def test_resolve_overlapping_hits_longest_wins():
+    hits = [(0, 7, "Ensembl", "Ensembl"), (0, 15, "Ensembl Genomes", "Ensembl Genomes"), (20, 27, "Ensembl", "Ensembl")]
+    assert sc.resolve_overlapping_hits(hits) == [(0, 15, "Ensembl Genomes", "Ensembl Genomes"), (20, 27, "Ensembl", "Ensembl")]
+
+def test_resolve_overlapping_hits_keeps_identical_spans():
+    hits = [(4, 7, "ENA", "ENA"), (4, 7, "ENA", "European Nucleotide Archive")]
+    assert sc.resolve_overlapping_hits(hits) == sorted(hits)
+
+def test_resolve_overlapping_hits_tie_keeps_first():
+    hits = [(5, 15, "b", "B"), (0, 10, "a", "A")]
+    assert sc.resolve_overlapping_hits(hits) == [(0, 10, "a", "A")]
+
+def test_postprocess_mentions_deduplicates():
+    sentences = ["We used Ensembl."]
+    mentions = [Mention(0, 8, 15, "Ensembl", "Ensembl"), Mention(0, 8, 15, "Ensembl", "Ensembl")]
+    assert sc.postprocess_mentions(sentences, mentions) == mentions[:1]
+
+def test_postprocess_mentions_case_sensitive_exempt():
+    # resources searched case-sensitively already are not filtered again
+    sentences = [f"Sample {i} in GEO." for i in range(sc.case_sensitive_threshold + 1)]
+    mentions = [Mention(i, 13, 16, "GEO", "GEO") for i in range(len(sentences))]
+    assert sc.postprocess_mentions(sentences, mentions, case_sensitive_resources=["GEO"]) == mentions
@@ -0,0 +1,75 @@
+"""
+Prediction counts by routing, the specificity scores derived from them, and the bypass rules read back
+from those scores on the next run.
+"""
+
+import csv
+import gzip
+import json
+
+from gbcutils import prediction_counts
+from gbcutils.scibert_classify import load_bypass_rules
+
+def _write_scores(path, counts, previous=None):
+    with open(path, "w", newline="") as fh:
+        writer = csv.writer(fh, lineterminator="\n")
+        writer.writerow(prediction_counts.score_columns)
+        writer.writerows(prediction_counts.specificity_scores(counts, previous=previous))
+    return str(path)
+
+def _scores(path):
+    with open(path, newline="") as fh:
+        return {(row["resource_name"], row["matched_alias"]): row for row in csv.DictReader(fh)}
+
+def _run(aliases_bypassed, n=30):
+    """Counts of one run : n mentions of ENA (all positive) and of GO (mixed), ENA bypassed if asked."""
+    rows = [("ENA", "ENA", 1, "bypass" if ("ENA", "ENA") in aliases_bypassed else "scibert")] * n
+    rows += [("GO", "GO", i % 2, "scibert") for i in range(n)]
+    rows += [("Bgee", "Bgee", 1, "bypass")] * 5
+    return prediction_counts.count_predictions(rows)
+
+def test_counts_by_routing():
+    counts = prediction_counts.count_predictions([("ENA", "ENA", 1, "bypass"), ("ENA", "ENA", 0, "scibert"), ("ENA", "ENA", 1)])
+    assert counts == {("ENA", "ENA", "bypass"): [0, 1], ("ENA", "ENA", "scibert"): [1, 1]}
+
+def test_dump_load_roundtrip(tmp_path):
+    counts = _run(set())
+    prediction_counts.dump(counts, str(tmp_path / "counts.json.gz"), chunks=3)
+    assert prediction_counts.load(str(tmp_path / "counts.json.gz")) == (counts, 3)
+
+def test_load_version_1(tmp_path):
+    path = str(tmp_path / "v1.json.gz")
+    with gzip.open(path, "wt") as fh:
+        json.dump({"format": "prediction_counts", "version": 1, "chunks": 2, "counts": [["ENA", "ENA", 1, 4]]}, fh)
+    assert prediction_counts.load(path) == ({("ENA", "ENA", "scibert"): [1, 4]}, 2)
+
+def test_scores_publish_every_route():
+    rows = {row[:2]: row for row in prediction_counts.specificity_scores(_run({("ENA", "ENA")}))}
+    # bypassed resources are published, with no model score
+    assert rows[("Bgee", "Bgee")] == ("Bgee", "Bgee", 0, 5, 1.0, 0, 0, None)
+    assert rows[("ENA", "ENA")][2:] == (0, 30, 1.0, 0, 0, None)
+    assert rows[("GO", "GO")][2:] == (15, 15, 0.5, 15, 15, 0.5)
+
+def test_bypass_does_not_confirm_itself(tmp_path):
+    counts = prediction_counts.count_predictions([("ENA", "ENA", 1, "bypass")] * 30)
+    rules = load_bypass_rules(specificity_csv=_write_scores(tmp_path / "scores.csv", counts))
+    assert rules["aliases"] == set()
+
+def test_bypass_is_stable_across_runs(tmp_path):
+    # run 1 : no bypass, ENA qualifies on model predictions
+    scores = _write_scores(tmp_path / "run1.csv", _run(set()))
+    rules = load_bypass_rules(specificity_csv=scores)
+    assert rules["aliases"] == {("ENA", "ENA")}
+    # runs 2 and 3 : ENA is bypassed, and keeps the model counts of the scores the run was classified with
+    for run in (2, 3):
+        counts = _run(rules["aliases"])
+        scores = _write_scores(tmp_path / f"run{run}.csv", counts, previous=prediction_counts.read_model_counts(scores))
+        assert _scores(scores)[("ENA", "ENA")]["model_positives"] == "30"
+        rules = load_bypass_rules(specificity_csv=scores)
+        assert rules["aliases"] == {("ENA", "ENA")}
+
+def test_read_model_counts_from_older_scores(tmp_path):
+    path = tmp_path / "old.csv"
+    path.write_text("resource_name,matched_alias,negatives,positives,specificity\nENA,ENA,0,25,1.0\n")
+    assert prediction_counts.read_model_counts(str(path)) == {("ENA", "ENA"): (0, 25)}
+    assert load_bypass_rules(specificity_csv=str(path))["aliases"] == {("ENA", "ENA")}
@@ -0,0 +1,120 @@
+"""
+`WorkQueue` leases with two workers on a temporary SQLite file : claims, lease expiry and reclaim,
+the `max_attempts` limit, results rejected after a lost lease, and the heartbeat. Leases are a
+fraction of a second long, and the tests wait for them to expire.
+"""
+
+import time
+
+import pytest
+
+from gbcutils import metrics
+from gbcutils.work_queue import WorkQueue
+
+LEASE_S = 0.2
+ITEMS = [f"PMC{i}" for i in range(1, 6)]
+
+@pytest.fixture
+def queue(tmp_path):
+    metrics.reset()
+    wq = WorkQueue(str(tmp_path / "work_queue.sqlite"), lease_s=LEASE_S, max_attempts=2)
+    wq.add(ITEMS)
+    return wq
+
+def _expire():
+    time.sleep(LEASE_S * 1.5)
+
+def _counters():
+    return metrics.snapshot()["counters"]
+
+def test_claims_are_ordered_and_disjoint(queue):
+    assert queue.add(ITEMS[:2] + ["PMC9"]) == 1
+    assert queue.claim("w1", 2) == ["PMC1", "PMC2"]
+    assert queue.claim("w2", 2) == ["PMC3", "PMC4"]
+    assert queue.claim("w1", 10) == ["PMC5", "PMC9"]
+    assert queue.claim("w2", 10) == []
+    assert queue.counts() == {"pending": 0, "leased": 6, "done": 0, "failed": 0}
+
+def test_expired_lease_is_reclaimed(queue):
+    assert queue.claim("w1", 2) == ["PMC1", "PMC2"]
+    assert queue.claim("w2", 2) == ["PMC3", "PMC4"] # w1's lease still holds
+    _expire()
+    # expired leases come first, in queue order
+    assert queue.claim("w2", 3) == ["PMC1", "PMC2", "PMC3"]
+    assert _counters()["workqueue.items_reclaimed"] == 3
+
+def test_results_rejected_after_lost_lease(queue):
+    batch = queue.claim("w1", 2)
+    _expire()
+    assert queue.claim("w2", 2) == batch
+    assert queue.complete("w1", batch, result={"worker": "w1"}) is False
+    assert queue.complete("w2", batch, result={"worker": "w2"}) is True
+    assert list(queue.results()) == [{"worker": "w2"}]
+    assert queue.counts()["done"] == 2
+    assert _counters()["workqueue.leases_lost"] == 1
+
+def test_partly_lost_batch_is_rejected(queue):
+    batch = queue.claim("w1", 2)
+    _expire()
+    assert queue.claim("w2", 1) == batch[:1]
+    # w1 still holds the second item (expired, but not reclaimed) : the batch is rejected as a whole
+    assert queue.complete("w1", batch, result={"worker": "w1"}) is False
+    assert list(queue.results()) == []
+    assert queue.counts() == {"pending": 3, "leased": 2, "done": 0, "failed": 0}
+
+def test_max_attempts_marks_items_failed(queue):
+    batch = queue.claim("w1", 2)
+    _expire()
+    assert queue.claim("w2", 2) == batch # second attempt
+    _expire()
+    # a third claim gives up on them, and moves on to the next items
+    assert queue.claim("w1", 2) == ["PMC3", "PMC4"]
+    assert queue.counts() == {"pending": 1, "leased": 2, "done": 0, "failed": 2}
+    assert _counters()["workqueue.failed"] == 2
+    assert queue.complete("w2", batch) is False
+
+    assert queue.retry_failed() == 2
+    assert queue.claim("w2", 10) == ["PMC1", "PMC2", "PMC5"]
+
+def test_release_requeues(queue):
+    queue.claim("w1", 2)
+    queue.release("w1")
+    assert queue.claim("w2", 2) == ["PMC1", "PMC2"]
+
+def test_heartbeat_keeps_leases(queue):
+    batch = queue.claim("w1", 2)
+    with queue.heartbeat("w1", interval_s=LEASE_S / 4):
+        time.sleep(LEASE_S * 3)
+        assert queue.claim("w2", 2) == ["PMC3", "PMC4"]
+    assert queue.complete("w1", batch) is True
+
+def test_heartbeat_survives_renew_failures(queue, monkeypatch):
+    batch = queue.claim("w1", 2)
+    renew, failures = queue.renew, []
+
+    def flaky_renew(worker):
+        if len(failures) < 2:
+            failures.append(worker)
+            raise RuntimeError("database is locked")
+        renew(worker)
+    monkeypatch.setattr(queue, "renew", flaky_renew)
+
+    with queue.heartbeat("w1", interval_s=LEASE_S / 8):
+        time.sleep(LEASE_S * 3)
+    assert len(failures) == 2
+    assert _counters()["workqueue.renew_failures"] == 2
+    assert queue.claim("w2", 2) == ["PMC3", "PMC4"]
+    assert queue.complete("w1", batch) is True
+
+def test_batches_wait_for_other_workers(queue):
+    queue.claim("w1", 4)
+    batches = queue.batches("w2", 2, poll_s=LEASE_S / 4)
+    assert next(batches) == ["PMC5"]
+    # the rest is leased to w1 : an empty batch before each wait, until its lease expires
+    assert next(batches) == []
+    start = time.time()
+    batch = next(batches)
+    while not batch:
+        batch = next(batches)
+    assert batch == ["PMC1", "PMC2"]
+    assert time.time() - start < LEASE_S * 2